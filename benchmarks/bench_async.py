@@ -0,0 +1,103 @@
+"""Load test of /modify_point in sync and async mode against local ES and Auth0 stand-ins.
+
+Every request resolves a token that isn't cached (AUTH_CACHE_TTL=0) and has its rights
+checked against the point, the async mode overlaps those two round trips.
+
+    python -m benchmarks.bench_async --requests 400 --concurrency 32 --es-latency 0.005 --auth0-latency 0.02
+"""
+import argparse
+import logging
+import os
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from flask import Flask
+from werkzeug.serving import make_server
+
+from koronawirus_backend import koronawirus
+from koronawirus_backend.points import points
+
+from . import data, stub_auth0, stub_es
+
+
+def make_app(connection_string, domain, index, async_mode, spill_dir):
+    os.environ.update({'AUTH0_DOMAIN': domain, 'AUTH0_AUDIENCE': '', 'ES_CONNECTION_STRING': connection_string,
+                       'INDEX_NAME': index, 'AUTH_CACHE_TTL': '0', 'ASYNC_MODE': str(async_mode).lower(),
+                       'AUDIT_SPILL_DIR': spill_dir})
+    from koronawirus_backend.config import DefaultConfig
+    app = Flask(__name__)
+    koronawirus.configure_app(app, DefaultConfig())
+    koronawirus.configure_json(app)
+    koronawirus.configure_elasticsearch(app)
+    koronawirus.configure_async(app)
+    koronawirus.configure_audit(app)
+    koronawirus.configure_auth(app)
+    app.extensions['identity'].protocol = 'http'
+    if 'aio' in app.extensions:
+        app.extensions['aio'].auth0_protocol = 'http'
+    app.register_blueprint(points)
+    return app
+
+
+def load(url, jobs, concurrency):
+    local = threading.local()
+
+    def call(job):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        point_id, owner = job
+        start = time.perf_counter()
+        response = local.session.post(url + '/modify_point', json={'id': point_id, 'waiting_time': 'short'},
+                                      headers={'Authorization': 'Bearer {}:user'.format(owner)})
+        response.raise_for_status()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        latencies = sorted(pool.map(call, jobs))
+    return time.perf_counter() - start, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--points', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--es-latency', type=float, default=0.005)
+    parser.add_argument('--auth0-latency', type=float, default=0.02)
+    parser.add_argument('--index', default='points')
+    args = parser.parse_args()
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    store = stub_es.Store()
+    data.seed(store, args.index, args.points)
+    es_server, connection_string = stub_es.serve(store, latency=args.es_latency)
+    auth0_server, domain = stub_auth0.serve(latency=args.auth0_latency)
+    jobs = [(doc_id, source['owned_by'])
+            for doc_id, source in list(store.indices[args.index].items())[:args.requests]]
+    try:
+        for async_mode in (False, True):
+            with tempfile.TemporaryDirectory() as spill_dir:
+                app = make_app(connection_string, domain, args.index, async_mode, spill_dir)
+                server = make_server('127.0.0.1', 0, app, threaded=True)
+                threading.Thread(target=server.serve_forever, daemon=True).start()
+                try:
+                    url = 'http://{}:{}'.format(*server.server_address)
+                    load(url, jobs[:args.concurrency], args.concurrency)
+                    elapsed, latencies = load(url, jobs, args.concurrency)
+                finally:
+                    server.shutdown()
+            print('{:5} {:7.1f} req/s  p50 {:6.1f} ms  p95 {:6.1f} ms'.format(
+                'async' if async_mode else 'sync', len(jobs) / elapsed,
+                statistics.median(latencies) * 1000, latencies[int(len(latencies) * 0.95)] * 1000))
+    finally:
+        es_server.shutdown()
+        auth0_server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
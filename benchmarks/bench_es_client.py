@@ -0,0 +1,56 @@
+"""Compares a per-request Elasticsearch client with the pooled, app-scoped one.
+
+    python -m benchmarks.bench_es_client --requests 2000
+"""
+import argparse
+import statistics
+import time
+
+from koronawirus_backend.connections import ElasticsearchRegistry
+from koronawirus_backend.elastic import Elasticsearch
+
+from .stub_es import Store, serve
+
+
+def seed(store, index):
+    store.index(index, 'point-1', {
+        "name": "Szpital", "operator": "NFZ", "address": "Warszawa", "location": {"lat": "52.2", "lon": "21.0"},
+        "type": "hospital", "opening_hours": "24/7", "phone": "112", "prepare_instruction": "",
+        "owned_by": "someone", "last_modified_timestamp": "1585000000", "waiting_time": "short"})
+
+
+def measure(make_wrapper, requests):
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        make_wrapper().get_point(point_id='point-1')
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(name, timings):
+    timings = sorted(timings)
+    print('{:<12} mean {:7.3f} ms  p50 {:7.3f} ms  p99 {:7.3f} ms'.format(
+        name, statistics.mean(timings) * 1000, timings[len(timings) // 2] * 1000,
+        timings[int(len(timings) * 0.99) - 1] * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--index', default='points')
+    args = parser.parse_args()
+
+    store = Store()
+    seed(store, args.index)
+    server, connection_string = serve(store)
+    try:
+        registry = ElasticsearchRegistry(connection_string)
+        report('per-request', measure(lambda: Elasticsearch(connection_string, index=args.index), args.requests))
+        report('pooled', measure(lambda: Elasticsearch(es=registry.client(), index=args.index), args.requests))
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
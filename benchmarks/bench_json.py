@@ -0,0 +1,58 @@
+"""JSON cost of a 9000 point /get_points response, parsing the ES response and rendering the API one.
+
+    python -m benchmarks.bench_json --points 9000 --repeat 20
+"""
+import argparse
+import json
+import time
+
+from elasticsearch.serializer import JSONSerializer
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from koronawirus_backend.elastic import hit_to_dict
+from koronawirus_backend.serialization import ElasticsearchSerializer, JSONProvider
+
+from . import data
+
+
+def best_of(f, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--points', type=int, default=9000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    hits = [{'_index': 'points', '_type': '_doc', '_id': doc_id, '_score': 1.0, '_source': source}
+            for doc_id, source in data.generate_points(args.points)]
+    full = json.dumps({'took': 12, 'timed_out': False,
+                       '_shards': {'total': 1, 'successful': 1, 'skipped': 0, 'failed': 0},
+                       'hits': {'total': {'value': len(hits), 'relation': 'eq'}, 'max_score': 1.0, 'hits': hits}})
+    filtered = json.dumps({'hits': {'total': {'value': len(hits)},
+                                    'hits': [{'_id': hit['_id'], '_source': hit['_source']} for hit in hits]}})
+    payload = {'points': [hit_to_dict(hit) for hit in hits]}
+
+    print('ES response {:.0f} kB, with filter_path {:.0f} kB'.format(len(full) / 1024, len(filtered) / 1024))
+    for label, serializer in (('stdlib', JSONSerializer()), ('orjson', ElasticsearchSerializer())):
+        print('parse  {:7} full {:7.2f} ms  filtered {:7.2f} ms'.format(
+            label, best_of(lambda: serializer.loads(full), args.repeat),
+            best_of(lambda: serializer.loads(filtered), args.repeat)))
+
+    app = Flask(__name__)
+    for label, provider in (('stdlib', DefaultJSONProvider(app)), ('orjson', JSONProvider(app))):
+        with app.app_context():
+            print('render {:7} {:7.2f} ms  ({:.0f} kB)'.format(
+                label, best_of(lambda: provider.response(payload), args.repeat),
+                len(provider.response(payload).get_data()) / 1024))
+
+
+if __name__ == '__main__':
+    main()
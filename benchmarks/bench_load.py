@@ -0,0 +1,225 @@
+"""Load test of the main endpoints against local Elasticsearch and Auth0 stand-ins.
+
+The stub cluster is seeded with deterministic points spread across Poland, then every
+scenario is driven at the given concurrency through a threaded werkzeug server and its
+p50/p95/p99 latency, throughput and the process RSS are reported. Results can be saved
+as a baseline and later runs compared against it, failing with exit status 1 when a
+scenario's p95 or throughput regressed by more than the tolerance.
+
+    python -m benchmarks.bench_load --points 20000 --requests 500 --concurrency 16
+    python -m benchmarks.bench_load --save-baseline benchmarks/baseline.json
+    python -m benchmarks.bench_load --baseline benchmarks/baseline.json --tolerance 0.3
+    python -m benchmarks.bench_load --env NEAREST_INDEX_ENABLED=true --scenario get_nearest
+
+The stand-ins run in the benchmarked process, so absolute numbers include their cost and
+only runs made on the same machine with the same parameters are comparable.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from werkzeug.serving import make_server
+
+from koronawirus_backend import koronawirus
+
+from . import data, stub_auth0, stub_es
+
+
+def make_app(connection_string, domain, index, spill_dir, env=None):
+    # There are no stand-ins for S3, RabbitMQ or the dashboard's database.
+    os.environ.update({'AUTH0_DOMAIN': domain, 'AUTH0_AUDIENCE': '', 'ES_CONNECTION_STRING': connection_string,
+                       'INDEX_NAME': index, 'AUDIT_SPILL_DIR': spill_dir, 'IMAGES_ENABLED': 'false',
+                       'DASHBOARD_ENABLED': 'false'})
+    os.environ.update(env or {})
+    from koronawirus_backend.config import DefaultConfig
+    app = koronawirus.create_app(DefaultConfig())
+    app.extensions['identity'].protocol = 'http'
+    if 'aio' in app.extensions:
+        app.extensions['aio'].auth0_protocol = 'http'
+    return app
+
+
+def random_box(rnd, span):
+    lat, lon = rnd.choice(data.CITIES)
+    return {'top_right': {'lat': lat + span, 'lon': lon + span * 1.6},
+            'bottom_left': {'lat': lat - span, 'lon': lon - span * 1.6}}
+
+
+def random_location(rnd):
+    box = data.POLAND
+    return {'lat': rnd.uniform(box['bottom_left']['lat'], box['top_right']['lat']),
+            'lon': rnd.uniform(box['bottom_left']['lon'], box['top_right']['lon'])}
+
+
+def scenarios(points, rnd):
+    """Request generators by scenario name, each returning (path, json body, bearer token or None)."""
+    def get_points():
+        return '/get_points', random_box(rnd, 0.1), None
+
+    def get_points_columns():
+        return '/get_points', dict(random_box(rnd, 0.1), format='columns'), None
+
+    def get_nearest():
+        return '/get_nearest', {'location': random_location(rnd)}, None
+
+    def search_points():
+        # Searches from the map are limited to its viewport.
+        return '/search_points', dict(random_box(rnd, 0.5), phrase='Punkt {}'.format(rnd.randrange(len(points))),
+                                      point_type=rnd.choice(data.TYPES)), None
+
+    def modify_point():
+        point_id, owner = rnd.choice(points)
+        return '/modify_point', {'id': point_id, 'waiting_time': rnd.choice(data.WAITING_TIMES)}, owner + ':user'
+
+    def set_availability():
+        point_id, _ = rnd.choice(points)
+        return '/set_availability', {'id': point_id, 'availability': rnd.choice(data.WAITING_TIMES)}, None
+
+    return {'get_points': get_points, 'get_points_columns': get_points_columns, 'get_nearest': get_nearest,
+            'search_points': search_points, 'modify_point': modify_point, 'set_availability': set_availability}
+
+
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        # Peak rather than current RSS where /proc isn't available, in KiB on Linux and bytes on macOS.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def percentile(latencies, fraction):
+    return latencies[min(int(len(latencies) * fraction), len(latencies) - 1)]
+
+
+def drive(url, jobs, concurrency):
+    """Sends the jobs from `concurrency` threads, returns (elapsed seconds, sorted latencies, errors)."""
+    local = threading.local()
+
+    def call(job):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        path, body, token = job
+        headers = {'Authorization': 'Bearer ' + token} if token else {}
+        start = time.perf_counter()
+        response = local.session.post(url + path, json=body, headers=headers)
+        return time.perf_counter() - start, response.status_code >= 400
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(call, jobs))
+    elapsed = time.perf_counter() - start
+    return elapsed, sorted(latency for latency, _ in results), sum(error for _, error in results)
+
+
+def run_scenario(url, generate, requests_count, concurrency, warmup, repeat=1):
+    """Runs the scenario `repeat` times and keeps the fastest run, which is the least disturbed by noise."""
+    drive(url, [generate() for _ in range(warmup)], concurrency)
+    runs = []
+    for _ in range(repeat):
+        elapsed, latencies, errors = drive(url, [generate() for _ in range(requests_count)], concurrency)
+        runs.append({'requests': requests_count, 'errors': errors, 'throughput': requests_count / elapsed,
+                     'p50_ms': statistics.median(latencies) * 1000, 'p95_ms': percentile(latencies, 0.95) * 1000,
+                     'p99_ms': percentile(latencies, 0.99) * 1000, 'rss_mb': rss_mb()})
+    return max(runs, key=lambda run: run['throughput'])
+
+
+def compare(results, baseline, tolerance):
+    """Returns a description of every scenario that got slower than the baseline allows."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append('{}: p95 {:.1f} ms, baseline {:.1f} ms'.format(name, result['p95_ms'], base['p95_ms']))
+        if result['throughput'] < base['throughput'] * (1 - tolerance):
+            regressions.append('{}: {:.1f} req/s, baseline {:.1f} req/s'.format(
+                name, result['throughput'], base['throughput']))
+        if result['errors'] > base['errors']:
+            regressions.append('{}: {} errors, baseline {}'.format(name, result['errors'], base['errors']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--points', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per scenario, the fastest is reported")
+    parser.add_argument('--es-latency', type=float, default=0.002)
+    parser.add_argument('--auth0-latency', type=float, default=0.02)
+    parser.add_argument('--scenario', action='append', help="Run only these scenarios, all by default")
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help="Extra app configuration, e.g. RESPONSE_CACHE_TTL=5")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--index', default='points')
+    parser.add_argument('--baseline', help="Compare against this baseline file")
+    parser.add_argument('--tolerance', type=float, default=0.3)
+    parser.add_argument('--save-baseline', help="Write the results to this baseline file")
+    args = parser.parse_args()
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    env = dict(item.split('=', 1) for item in args.env)
+
+    store = stub_es.Store()
+    data.seed(store, args.index, args.points, seed=args.seed)
+    es_server, connection_string = stub_es.serve(store, latency=args.es_latency)
+    auth0_server, domain = stub_auth0.serve(latency=args.auth0_latency)
+    points = [(doc_id, source['owned_by']) for doc_id, source in store.indices[args.index].items()]
+    generators = scenarios(points, random.Random(args.seed))
+    names = args.scenario or list(generators)
+    parameters = {'points': args.points, 'requests': args.requests, 'concurrency': args.concurrency,
+                  'repeat': args.repeat, 'es_latency': args.es_latency, 'auth0_latency': args.auth0_latency,
+                  'env': env}
+
+    results = {}
+    rss_before = rss_mb()
+    try:
+        with tempfile.TemporaryDirectory() as spill_dir:
+            app = make_app(connection_string, domain, args.index, spill_dir, env)
+            server = make_server('127.0.0.1', 0, app, threaded=True)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            try:
+                url = 'http://{}:{}'.format(*server.server_address)
+                for name in names:
+                    results[name] = result = run_scenario(url, generators[name], args.requests, args.concurrency,
+                                                          args.warmup, args.repeat)
+                    print('{:18} {:7.1f} req/s  p50 {:6.1f} ms  p95 {:6.1f} ms  p99 {:6.1f} ms  '
+                          'errors {:3}  rss {:6.1f} MB (+{:.1f})'.format(
+                              name, result['throughput'], result['p50_ms'], result['p95_ms'], result['p99_ms'],
+                              result['errors'], result['rss_mb'], result['rss_mb'] - rss_before))
+            finally:
+                server.shutdown()
+    finally:
+        es_server.shutdown()
+        auth0_server.shutdown()
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as baseline:
+            json.dump({'parameters': parameters, 'results': results}, baseline, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            baseline = json.load(baseline)
+        if baseline['parameters'] != parameters:
+            print('Baseline was recorded with {}, results may not be comparable'.format(baseline['parameters']))
+        regressions = compare(results, baseline['results'], args.tolerance)
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
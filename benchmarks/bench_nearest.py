@@ -0,0 +1,55 @@
+"""Compares /get_nearest answered by Elasticsearch with the in-process spatial index.
+
+    python -m benchmarks.bench_nearest --points 5000 --queries 200
+"""
+import argparse
+import random
+import time
+
+from koronawirus_backend.connections import ElasticsearchRegistry
+from koronawirus_backend.elastic import Elasticsearch
+from koronawirus_backend.spatial import NearestIndex
+
+from . import data
+from .stub_es import Store, serve
+
+
+def run(get_nearest, locations):
+    start = time.perf_counter()
+    results = [get_nearest(location=location) for location in locations]
+    return (time.perf_counter() - start) / len(locations), results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--points', type=int, default=5000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--index', default='points')
+    args = parser.parse_args()
+
+    store = Store()
+    data.seed(store, args.index, args.points)
+    server, connection_string = serve(store)
+    try:
+        registry = ElasticsearchRegistry(connection_string)
+        es = Elasticsearch(es=registry.client(), index=args.index)
+        nearest_index = NearestIndex(lambda: es)
+        start = time.perf_counter()
+        nearest_index.refresh(full=True)
+        print('index build   {:8.1f} ms for {} points'.format((time.perf_counter() - start) * 1000, args.points))
+
+        rnd = random.Random(1)
+        locations = [{'lat': rnd.uniform(49.0, 54.8), 'lon': rnd.uniform(14.1, 24.1)} for _ in range(args.queries)]
+        es_time, es_results = run(es.get_nearest, locations)
+        index_time, index_results = run(nearest_index.get_nearest, locations)
+        agree = sum(a['hospital']['id'] == b['hospital']['id'] and a['transport']['id'] == b['transport']['id']
+                    for a, b in zip(es_results, index_results))
+        print('elasticsearch {:8.3f} ms/query'.format(es_time * 1000))
+        print('memory index  {:8.3f} ms/query'.format(index_time * 1000))
+        print('same answer   {}/{}'.format(agree, len(locations)))
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
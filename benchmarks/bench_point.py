@@ -0,0 +1,46 @@
+"""Per-hit cost of turning search hits into API output, for a full 9000 hit /get_points response.
+
+    python -m benchmarks.bench_point --hits 9000 --repeat 20
+"""
+import argparse
+import time
+
+from koronawirus_backend.elastic import hit_to_dict, Point
+
+from . import data
+
+
+def via_point(hits):
+    return [Point.from_dict(hit).to_dict(with_id=True) for hit in hits]
+
+
+def direct(hits):
+    return [hit_to_dict(hit) for hit in hits]
+
+
+def best_of(convert, hits, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        convert(hits)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--hits', type=int, default=9000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    hits = [{'_index': 'points', '_id': doc_id, '_score': 1.0, '_source': source}
+            for doc_id, source in data.generate_points(args.hits)]
+    assert via_point(hits) == direct(hits)
+    for label, convert in (('Point.from_dict', via_point), ('hit_to_dict', direct)):
+        elapsed = best_of(convert, hits, args.repeat)
+        print('{:16} {:7.2f} ms per response, {:5.2f} us per hit'.format(
+            label, elapsed * 1000, elapsed / len(hits) * 1e6))
+
+
+if __name__ == '__main__':
+    main()
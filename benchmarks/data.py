@@ -0,0 +1,34 @@
+"""Deterministic, roughly realistic point data spread across Poland."""
+import random
+
+
+POLAND = {'top_right': {'lat': 54.84, 'lon': 24.15}, 'bottom_left': {'lat': 49.0, 'lon': 14.12}}
+CITIES = [(52.23, 21.01), (50.06, 19.94), (51.11, 17.03), (52.41, 16.93), (54.35, 18.65), (51.76, 19.46),
+          (53.13, 23.16), (50.26, 19.02), (51.25, 22.57), (53.43, 14.55)]
+TYPES = ['hospital', 'transport']
+WAITING_TIMES = ['short', 'moderate', 'long']
+
+
+def generate_points(count, seed=0):
+    """Yields (doc_id, source) pairs, most of them clustered around big cities."""
+    rnd = random.Random(seed)
+    for i in range(count):
+        if rnd.random() < 0.7:
+            lat, lon = rnd.choice(CITIES)
+            lat, lon = lat + rnd.gauss(0, 0.15), lon + rnd.gauss(0, 0.25)
+        else:
+            lat = rnd.uniform(POLAND['bottom_left']['lat'], POLAND['top_right']['lat'])
+            lon = rnd.uniform(POLAND['bottom_left']['lon'], POLAND['top_right']['lon'])
+        yield 'point-{}'.format(i), {
+            "name": "Punkt {}".format(i), "operator": "NFZ", "address": "ul. Testowa {}".format(i),
+            "location": {"lat": str(round(lat, 6)), "lon": str(round(lon, 6))},
+            "type": rnd.choice(TYPES), "opening_hours": "8-20", "phone": "+48 22 000 00 00",
+            "prepare_instruction": "Zabierz dowód osobisty. " * rnd.randint(1, 20),
+            "owned_by": "user-{}".format(rnd.randint(0, 200)),
+            "last_modified_timestamp": str(1585000000 + rnd.randint(0, 10 ** 6)),
+            "waiting_time": rnd.choice(WAITING_TIMES)}
+
+
+def seed(store, index, count, seed=0):
+    for doc_id, source in generate_points(count, seed=seed):
+        store.index(index, doc_id, dict(source, point_id=doc_id))
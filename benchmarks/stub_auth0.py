@@ -0,0 +1,50 @@
+"""Auth0 `/userinfo` stand-in: every bearer token is valid and `<sub>:<role>` encodes its user."""
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from koronawirus_backend.identity import APP_METADATA_KEY
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops connections under load, showing up as 1s SYN retries.
+    request_queue_size = 128
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    latency = 0
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        auth = self.headers.get('Authorization', '')
+        if self.path != '/userinfo' or not auth.startswith('Bearer ') or auth == 'Bearer ':
+            status, payload = 401, {"error": "unauthorized"}
+        else:
+            sub, _, role = auth[len('Bearer '):].partition(':')
+            status, payload = 200, {"sub": sub, APP_METADATA_KEY: {"role": role or "user"}}
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def serve(host='127.0.0.1', port=0, latency=0):
+    """Starts the stub in a daemon thread and returns (server, domain)."""
+    handler = type('BoundHandler', (Handler,), {'latency': latency})
+    server = Server((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, '{}:{}'.format(*server.server_address)
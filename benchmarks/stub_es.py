@@ -0,0 +1,432 @@
+"""Minimal in-process Elasticsearch stand-in used by the benchmarks.
+
+Only the handful of endpoints the backend talks to are implemented and only the
+query shapes the backend produces are understood.
+"""
+import fnmatch
+import functools
+import heapq
+import json
+import math
+import re
+import socket
+import threading
+import time
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+INFO = {"name": "stub", "cluster_name": "stub", "version": {"number": "7.17.0", "build_flavor": "default"},
+        "tagline": "You Know, for Search"}
+
+SHARDS = {"total": 1, "successful": 1, "skipped": 0, "failed": 0}
+
+# Side of the grid cells bounding box and nearest point queries are answered from, in degrees.
+GRID_CELL = 1.0
+KM_PER_DEGREE = 111.19
+
+
+class Store:
+    def __init__(self):
+        self.indices = {}
+        self.scrolls = {}
+        self.seq_no = 0
+        self.seq_nos = {}
+        self.settings = {}
+        self.grid = {}
+        self.cells = {}
+        self.lock = threading.Lock()
+
+    def _locate(self, index, doc_id, source):
+        """Keeps the document's grid cell in sync, so box queries don't scan the whole index."""
+        old = self.cells.setdefault(index, {}).pop(doc_id, None)
+        grid = self.grid.setdefault(index, {})
+        if old is not None:
+            grid[old].discard(doc_id)
+        location = (source or {}).get('location')
+        if location:
+            cell = grid_cell(location['lat'], location['lon'])
+            self.cells[index][doc_id] = cell
+            grid.setdefault(cell, set()).add(doc_id)
+
+    def _candidates(self, index, query):
+        """Ids of the documents that can match the query's bounding box filter, None when it has none."""
+        query = (query or {}).get('function_score', {}).get('query', query)
+        filters = (query or {}).get('bool', {}).get('filter', [])
+        for clause in filters if isinstance(filters, list) else [filters]:
+            if 'geo_bounding_box' in clause:
+                box = clause['geo_bounding_box']['location']
+                top, left = grid_cell(box['top_left']['lat'], box['top_left']['lon'])
+                bottom, right = grid_cell(box['bottom_right']['lat'], box['bottom_right']['lon'])
+                grid = self.grid.get(index, {})
+                return [doc_id for lat in range(bottom, top + 1) for lon in range(left, right + 1)
+                        for doc_id in list(grid.get((lat, lon), ()))]
+        return None
+
+    def index(self, index, doc_id, source):
+        with self.lock:
+            docs = self.indices.setdefault(index, {})
+            result = 'updated' if doc_id in docs else 'created'
+            docs[doc_id] = source
+            self._locate(index, doc_id, source)
+            self.seq_no += 1
+            self.seq_nos[(index, doc_id)] = self.seq_no
+        return {"_index": index, "_id": doc_id, "result": result, "_seq_no": self.seq_no, "_primary_term": 1}
+
+    def get(self, index, doc_id):
+        source = self.indices.get(index, {}).get(doc_id)
+        if source is None:
+            return None
+        return {"_index": index, "_id": doc_id, "found": True, "_source": source,
+                "_seq_no": self.seq_nos[(index, doc_id)], "_primary_term": 1}
+
+    def update(self, index, doc_id, body, if_seq_no=None):
+        """Partial update, returns None on a version conflict."""
+        with self.lock:
+            source = self.indices.get(index, {}).get(doc_id)
+            if source is None or (if_seq_no is not None and int(if_seq_no) != self.seq_nos[(index, doc_id)]):
+                return None
+            source = dict(source, **body.get('doc', {}))
+            self.indices[index][doc_id] = source
+            self._locate(index, doc_id, source)
+            self.seq_no += 1
+            self.seq_nos[(index, doc_id)] = self.seq_no
+        return {"_index": index, "_id": doc_id, "result": "updated", "_seq_no": self.seq_no, "_primary_term": 1,
+                "get": {"found": True, "_source": source}}
+
+    def bulk(self, lines):
+        items = []
+        lines = iter(lines)
+        for header in lines:
+            op, meta = next(iter(header.items()))
+            body = next(lines) if op != 'delete' else None
+            doc_id = meta.get('_id') or uuid.uuid4().hex
+            if op == 'update':
+                result = self.update(meta['_index'], doc_id, body)
+                status = 200 if result is not None else 404
+            elif op == 'delete':
+                with self.lock:
+                    self.indices.get(meta['_index'], {}).pop(doc_id, None)
+                    self._locate(meta['_index'], doc_id, None)
+                result, status = {"_id": doc_id, "result": "deleted"}, 200
+            else:
+                result, status = self.index(meta['_index'], doc_id, body), 201
+            items.append({op: dict(result or {"_id": doc_id}, status=status)})
+        return {"took": 1, "errors": any(item[op]['status'] >= 300 for item in items for op in item), "items": items}
+
+    def _nearest(self, index, query, origin, size):
+        """Hits sorted by distance from `origin`, collected from rings of grid cells growing around it
+        until no cell further out can hold anything closer than the `size` nearest found so far.
+        The total is the number of hits looked at rather than of all matches."""
+        docs, grid = self.indices.get(index, {}), self.grid.get(index, {})
+        cells = list(grid)
+        if not cells:
+            return []
+        lat0, lon0 = grid_cell(origin['lat'], origin['lon'])
+        max_ring = max(max(abs(lat - lat0), abs(lon - lon0)) for lat, lon in cells)
+        # Shortest a degree of longitude gets anywhere in the index, bounding the distance to the next ring.
+        km_per_cell = GRID_CELL * KM_PER_DEGREE * math.cos(math.radians(
+            min(90.0, max(max(abs(lat), abs(lat + 1)) for lat, _ in cells) * GRID_CELL)))
+        found = []
+        for ring in range(max_ring + 1):
+            for lat in range(lat0 - ring, lat0 + ring + 1):
+                for lon in range(lon0 - ring, lon0 + ring + 1):
+                    if max(abs(lat - lat0), abs(lon - lon0)) != ring:
+                        continue
+                    for doc_id in list(grid.get((lat, lon), ())):
+                        source = docs.get(doc_id)
+                        if source is not None and matches(source, query):
+                            found.append({"_index": index, "_id": doc_id, "_score": None, "_source": source,
+                                          "sort": [distance_km(origin, source['location'])]})
+            if len(found) >= size and heapq.nsmallest(size, (hit['sort'][0] for hit in found))[-1] <= \
+                    ring * km_per_cell:
+                break
+        return found
+
+    def search(self, index, body, scroll=False):
+        size = body.get('size', 10)
+        patterns = index.split(',')
+        sort = body.get('sort') or [{}]
+        geo_sort = sort[0].get('_geo_distance') if isinstance(sort[0], dict) else None
+        if geo_sort and len(sort) == 1 and geo_sort.get('order', 'asc') == 'asc' and not scroll and \
+                'search_after' not in body and index in self.grid:
+            hits = self._nearest(index, body.get('query'), geo_sort['location'], size)
+            return {"took": 1, "timed_out": False, "_shards": SHARDS,
+                    "hits": {"total": {"value": len(hits), "relation": "gte"},
+                             "hits": heapq.nsmallest(size, hits, key=lambda hit: hit['sort'][0])}}
+        hits = []
+        for name, docs in list(self.indices.items()):
+            if any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns):
+                candidates = self._candidates(name, body.get('query'))
+                items = list(docs.items()) if candidates is None else \
+                    [(doc_id, docs.get(doc_id)) for doc_id in candidates]
+                hits.extend({"_index": name, "_id": doc_id, "_score": 1.0, "_source": source}
+                            for doc_id, source in items if source is not None and matches(source, body.get('query')))
+        total = len(hits)
+        aggregations = {name: aggregate(hits, agg) for name, agg in (body.get('aggs') or {}).items()}
+        function_score = (body.get('query') or {}).get('function_score')
+        if function_score and not body.get('sort'):
+            for hit in hits:
+                hit['_score'] = function_score_value(hit, function_score)
+            hits.sort(key=lambda hit: -hit['_score'])
+        if body.get('sort'):
+            orders = []
+            for hit in hits:
+                hit['sort'] = []
+            for sort in body['sort']:
+                field, spec = next(iter(sort.items())) if isinstance(sort, dict) else (sort, 'asc')
+                orders.append(spec if isinstance(spec, str) else spec.get('order', 'asc'))
+                for hit in hits:
+                    hit['sort'].append(sort_value(hit, field, spec))
+            key = functools.cmp_to_key(lambda a, b: compare_sort(a['sort'], b['sort'], orders))
+            if 'search_after' in body:
+                hits = [hit for hit in hits if compare_sort(hit['sort'], body['search_after'], orders) > 0]
+            if scroll or size >= len(hits):
+                hits.sort(key=key)
+            else:
+                hits = heapq.nsmallest(size, hits, key=key)
+        if isinstance(body.get('_source'), list):
+            for hit in hits:
+                hit['_source'] = {field: value for field, value in hit['_source'].items() if field in body['_source']}
+        response = {"took": 1, "timed_out": False, "_shards": SHARDS,
+                    "hits": {"total": {"value": total, "relation": "eq"}, "hits": hits[:size]}}
+        if aggregations:
+            response['aggregations'] = aggregations
+        if scroll:
+            scroll_id = uuid.uuid4().hex
+            self.scrolls[scroll_id] = (hits[size:], size)
+            response['_scroll_id'] = scroll_id
+        return response
+
+    def scroll(self, scroll_id):
+        remaining, size = self.scrolls.get(scroll_id, ([], 0))
+        self.scrolls[scroll_id] = (remaining[size:], size)
+        return {"_scroll_id": scroll_id, "took": 1, "timed_out": False, "_shards": SHARDS,
+                "hits": {"total": {"value": len(remaining), "relation": "eq"}, "hits": remaining[:size]}}
+
+
+def function_score_value(hit, function_score):
+    """Product of the functions, with random_score hashing the seed and its field (the id without one) into [0, 1)."""
+    score = 1.0
+    for function in function_score['functions']:
+        if 'filter' in function and not matches(hit['_source'], function['filter']):
+            continue
+        if 'random_score' in function:
+            field = function['random_score'].get('field')
+            value = hit['_source'].get(field) if field else hit['_id']
+            digest = zlib.crc32('{}:{}'.format(function['random_score'].get('seed'), value).encode())
+            score *= digest / 2 ** 32
+        score *= function.get('weight', 1)
+    return score
+
+
+def aggregate(hits, agg):
+    """Supports the geotile_grid, geo_centroid and terms aggregations."""
+    if 'geotile_grid' in agg:
+        grid = agg['geotile_grid']
+        tiles = {}
+        for hit in hits:
+            tiles.setdefault(geotile(hit['_source'][grid['field']], grid['precision']), []).append(hit)
+        buckets = sorted(tiles.items(), key=lambda tile: -len(tile[1]))[:grid.get('size', 10000)]
+        return {"buckets": [dict({name: aggregate(tile_hits, sub) for name, sub in agg.get('aggs', {}).items()},
+                                 key=key, doc_count=len(tile_hits)) for key, tile_hits in buckets]}
+    if 'geo_centroid' in agg:
+        locations = [hit['_source'][agg['geo_centroid']['field']] for hit in hits]
+        return {"location": {"lat": sum(float(location['lat']) for location in locations) / len(locations),
+                             "lon": sum(float(location['lon']) for location in locations) / len(locations)},
+                "count": len(locations)}
+    field = agg['terms']['field'].replace('.keyword', '')
+    counts = {}
+    for hit in hits:
+        counts[hit['_source'].get(field)] = counts.get(hit['_source'].get(field), 0) + 1
+    return {"buckets": [{"key": key, "doc_count": count}
+                        for key, count in sorted(counts.items(), key=lambda item: -item[1])]}
+
+
+def geotile(location, precision):
+    tiles = 2 ** precision
+    lat = math.radians(float(location['lat']))
+    x = int((float(location['lon']) + 180) / 360 * tiles)
+    y = int((1 - math.asinh(math.tan(lat)) / math.pi) / 2 * tiles)
+    return '{}/{}/{}'.format(precision, x, y)
+
+
+def grid_cell(lat, lon):
+    return math.floor(float(lat) / GRID_CELL), math.floor(float(lon) / GRID_CELL)
+
+
+def sort_value(hit, field, spec):
+    if field == '_geo_distance':
+        return distance_km(spec['location'], hit['_source']['location'])
+    if field in ('_id', '_score'):
+        return hit[field]
+    return hit['_source'].get(field.replace('.keyword', ''))
+
+
+def compare_sort(left, right, orders):
+    for a, b, order in zip(left, right, orders):
+        if a != b:
+            # Missing values sort last in either order.
+            if a is None or b is None:
+                return 1 if a is None else -1
+            result = -1 if a < b else 1
+            return result if order == 'asc' else -result
+    return 0
+
+
+def distance_km(origin, location):
+    lat1, lon1 = math.radians(float(origin['lat'])), math.radians(float(origin['lon']))
+    lat2, lon2 = math.radians(float(location['lat'])), math.radians(float(location['lon']))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0087714 * math.asin(math.sqrt(a))
+
+
+def _in_box(location, box):
+    lat, lon = float(location['lat']), float(location['lon'])
+    return float(box['bottom_right']['lat']) <= lat <= float(box['top_left']['lat']) and \
+        float(box['top_left']['lon']) <= lon <= float(box['bottom_right']['lon'])
+
+
+def matches(source, query):
+    if not query or 'match_all' in query:
+        return True
+    if 'function_score' in query:
+        return matches(source, query['function_score'].get('query'))
+    if 'bool' in query:
+        clauses = []
+        for key in ('must', 'filter'):
+            value = query['bool'].get(key, [])
+            clauses.extend(value if isinstance(value, list) else [value])
+        return all(matches(source, clause) for clause in clauses)
+    if 'term' in query:
+        field, value = next(iter(query['term'].items()))
+        value = value['value'] if isinstance(value, dict) else value
+        return source.get(field.replace('.keyword', '')) == value
+    if 'multi_match' in query:
+        # Every word has to match, so a phrase shared by all documents doesn't match the whole index.
+        words = set(' '.join(str(source.get(field.split('^')[0], ''))
+                             for field in query['multi_match']['fields']).lower().split())
+        return words.issuperset(query['multi_match']['query'].lower().split())
+    if 'geo_bounding_box' in query:
+        return _in_box(source['location'], query['geo_bounding_box']['location'])
+    if 'geo_distance' in query:
+        limit = float(query['geo_distance']['distance'].replace('km', ''))
+        return distance_km(query['geo_distance']['location'], source['location']) <= limit
+    if 'range' in query:
+        field, bounds = next(iter(query['range'].items()))
+        value = str(source.get(field.replace('.keyword', '')))
+        return all(value >= str(bound) if op == 'gte' else value <= str(bound) for op, bound in bounds.items()
+                   if op in ('gte', 'lte'))
+    return True
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops connections under load, showing up as 1s SYN retries.
+    request_queue_size = 128
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    store = None
+    latency = 0
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, *args):
+        pass
+
+    def _body(self):
+        return json.loads(self.raw_body) if self.raw_body else {}
+
+    def _ndjson_body(self):
+        return [json.loads(line) for line in self.raw_body.splitlines() if line.strip()]
+
+    def _send(self, payload, status=200):
+        if self.latency:
+            time.sleep(self.latency)
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('X-Elastic-Product', 'Elasticsearch')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _route(self, method):
+        # Always drain the body, keep-alive connections are reused for the next request.
+        length = int(self.headers.get('Content-Length') or 0)
+        self.raw_body = self.rfile.read(length) if length else b''
+        path, _, query_string = self.path.partition('?')
+        if path == '/':
+            return self._send(INFO)
+        if path == '/_search/scroll':
+            if method == 'DELETE':
+                return self._send({"succeeded": True, "num_freed": 1})
+            return self._send(self.store.scroll(self._body()['scroll_id']))
+        if path == '/_msearch':
+            lines = self._ndjson_body()
+            return self._send({"took": 1, "responses": [self.store.search(header['index'], body)
+                                                        for header, body in zip(lines[::2], lines[1::2])]})
+        if path == '/_bulk':
+            return self._send(self.store.bulk(self._ndjson_body()))
+        match = re.fullmatch(r'/([^/]+)/_mget', path)
+        if match:
+            index = match.group(1)
+            return self._send({"docs": [self.store.get(index, doc_id) or {"_id": doc_id, "found": False}
+                                        for doc_id in self._body()['ids']]})
+        match = re.fullmatch(r'/([^/]+)/_settings(?:/[^/]+)?', path)
+        if match:
+            settings = self.store.settings.setdefault(match.group(1), {})
+            if method == 'PUT':
+                settings.update(self._body()['index'])
+                return self._send({"acknowledged": True})
+            return self._send({match.group(1): {"settings": {"index": settings}}})
+        match = re.fullmatch(r'/([^/]+)/_refresh', path)
+        if match:
+            return self._send({"_shards": SHARDS})
+        match = re.fullmatch(r'/([^/]+)/_search', path)
+        if match:
+            return self._send(self.store.search(match.group(1), self._body(), scroll='scroll=' in query_string))
+        match = re.fullmatch(r'/([^/]+)/_update/([^/]+)', path)
+        if match:
+            params = dict(param.split('=', 1) for param in query_string.split('&') if '=' in param)
+            updated = self.store.update(match.group(1), match.group(2), self._body(), params.get('if_seq_no'))
+            if updated is None:
+                return self._send({"error": {"type": "version_conflict_engine_exception"}, "status": 409},
+                                  status=409)
+            return self._send(updated)
+        match = re.fullmatch(r'/([^/]+)/_doc(?:/([^/]+))?', path)
+        if match:
+            index, doc_id = match.groups()
+            if method == 'GET':
+                found = self.store.get(index, doc_id)
+                return self._send(found) if found else self._send({"found": False}, status=404)
+            return self._send(self.store.index(index, doc_id or uuid.uuid4().hex, self._body()), status=201)
+        return self._send({"error": "unsupported " + path}, status=400)
+
+    def do_GET(self):
+        self._route('GET')
+
+    def do_POST(self):
+        self._route('POST')
+
+    def do_PUT(self):
+        self._route('PUT')
+
+    def do_DELETE(self):
+        self._route('DELETE')
+
+
+def serve(store=None, host='127.0.0.1', port=0, latency=0):
+    """Starts the stub in a daemon thread and returns (server, connection string).
+
+    `latency` seconds are added to every response, standing in for a remote cluster.
+    """
+    handler = type('BoundHandler', (Handler,), {'store': store or Store(), 'latency': latency})
+    server = Server((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, 'http://{}:{}'.format(*server.server_address)
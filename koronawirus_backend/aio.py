@@ -0,0 +1,99 @@
+import asyncio
+import os
+import threading
+
+import aiohttp
+from elasticsearch import AsyncElasticsearch
+from elasticsearch.exceptions import NotFoundError
+
+from .identity import IdentityError, user_from_claims
+from .serialization import ElasticsearchSerializer
+
+
+class AsyncRuntime:
+    """Per-process event loop running on a background thread.
+
+    Request threads hand coroutines to `run` and block until they finish, so independent
+    calls to Elasticsearch and Auth0 made for one request overlap instead of running in
+    series. The AsyncElasticsearch client and the aiohttp session are created on the loop
+    and shared by every request of the process.
+    """
+    def __init__(self, connection_string, index, maxsize=25, timeout=10, auth0_domain=None, auth0_protocol='https'):
+        self.connection_string = connection_string
+        self.index = index
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.auth0_domain = auth0_domain
+        self.auth0_protocol = auth0_protocol
+        self._loop = None
+        self._es = None
+        self._http = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config['ES_CONNECTION_STRING'], config['INDEX_NAME'], maxsize=config['ES_MAXSIZE'],
+                   timeout=config['ES_TIMEOUT'], auth0_domain=config['AUTH0_DOMAIN'])
+
+    def loop(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    # The parent's loop thread doesn't exist in a forked child.
+                    self._loop = asyncio.new_event_loop()
+                    self._es = None
+                    self._http = None
+                    threading.Thread(target=self._loop.run_forever, daemon=True).start()
+                    self._pid = os.getpid()
+        return self._loop
+
+    def run(self, coro, timeout=None):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop()).result(timeout)
+
+    def es(self):
+        if self._es is None:
+            self._es = AsyncElasticsearch([self.connection_string], maxsize=self.maxsize, timeout=self.timeout,
+                                          serializer=ElasticsearchSerializer())
+        return self._es
+
+    def http(self):
+        if self._http is None:
+            self._http = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._http
+
+    async def userinfo(self, token):
+        url = '{}://{}/userinfo'.format(self.auth0_protocol, self.auth0_domain)
+        async with self.http().get(url, headers={'Authorization': 'Bearer ' + token}) as response:
+            if response.status != 200:
+                raise IdentityError("userinfo returned {}".format(response.status))
+            return user_from_claims(await response.json())
+
+    async def get_document(self, point_id):
+        try:
+            return await self.es().get(index=self.index, id=point_id)
+        except NotFoundError:
+            return None
+
+    async def resolve_with_documents(self, identity, token, point_ids):
+        """Resolves the token while the points are read, returns (user, {point_id: document})."""
+        user, *documents = await asyncio.gather(identity.resolve_async(token, self),
+                                                *(self.get_document(point_id) for point_id in point_ids))
+        return user, {point_id: document for point_id, document in zip(point_ids, documents) if document is not None}
+
+    async def _close(self):
+        if self._es is not None:
+            await self._es.close()
+        if self._http is not None:
+            await self._http.close()
+
+    def close(self):
+        if self._pid == os.getpid():
+            self.run(self._close(), timeout=5)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._pid = None
+
+
+def init_app(app):
+    if app.config['ASYNC_MODE']:
+        app.extensions['aio'] = AsyncRuntime.from_config(app.config)
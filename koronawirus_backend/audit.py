@@ -0,0 +1,184 @@
+import atexit
+import glob
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from elasticsearch import helpers
+from elasticsearch.exceptions import TransportError
+
+
+logger = logging.getLogger(__name__)
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def document_id(index, document):
+    """Content hash, so a batch that is sent again overwrites the documents that made it the first time."""
+    return hashlib.sha1(json.dumps([index, document], sort_keys=True).encode()).hexdigest()
+
+
+class AuditLogPipeline:
+    """Ships audit log documents to Elasticsearch in the background.
+
+    Documents are queued by `submit` and sent with bulk requests of up to `batch_size`
+    documents, at least every `flush_interval` seconds. Failed batches are retried with
+    exponential backoff and then spilled as NDJSON to `spill_dir`, from where they are
+    replayed once Elasticsearch accepts writes again. A full queue spills directly.
+    """
+    def __init__(self, client_factory, spill_dir=None, max_queue=10000, batch_size=500, flush_interval=2,
+                 max_retries=4, backoff=0.5):
+        self.client_factory = client_factory
+        self.spill_dir = spill_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._spill_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _ensure_worker(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue(maxsize=self._queue.maxsize)
+                    self._pid = os.getpid()
+                    threading.Thread(target=self._run, daemon=True).start()
+                    atexit.register(self.close)
+
+    def submit(self, index, document):
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((index, document))
+        except queue.Full:
+            self._spill([(index, document)])
+
+    def _take(self):
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._take()
+            try:
+                if not batch or self._ship(batch):
+                    self._replay()
+            except Exception:
+                logger.exception("Audit log pipeline failed")
+
+    def _ship(self, batch, retries=None):
+        actions = [{'_op_type': 'index', '_index': index, '_id': document_id(index, document), '_source': document}
+                   for index, document in batch]
+        retries = self.max_retries if retries is None else retries
+        for attempt in range(retries + 1):
+            try:
+                helpers.bulk(self.client_factory(), actions)
+                return True
+            except (TransportError, helpers.BulkIndexError):
+                if attempt < retries:
+                    time.sleep(self.backoff * 2 ** attempt)
+        self._spill(batch)
+        return False
+
+    def _spill_path(self, pid=None):
+        return os.path.join(self.spill_dir, 'audit-{}.ndjson'.format(pid or os.getpid()))
+
+    def _spill(self, batch):
+        if not self.spill_dir:
+            logger.error("Dropping %d audit log documents", len(batch))
+            return
+        with self._spill_lock:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            with open(self._spill_path(), 'a') as spill:
+                for index, document in batch:
+                    spill.write(json.dumps({'index': index, 'document': document}) + '\n')
+
+    def _spilled(self):
+        """Spill files no live process is writing to or replaying, including replays cut short by a crash."""
+        for path in glob.glob(os.path.join(self.spill_dir, 'audit-*.ndjson*')):
+            name = os.path.basename(path)
+            spilled, _, replayed_by = name.partition('.replaying-')
+            if not spilled.endswith('.ndjson'):
+                continue
+            # Replays only run on this process's worker thread, a file it's marked with is left from a crash.
+            owner = int(replayed_by) if replayed_by else int(spilled[len('audit-'):-len('.ndjson')])
+            if owner == os.getpid() or not pid_alive(owner):
+                yield path, os.path.join(self.spill_dir, spilled)
+
+    def _replay(self):
+        if not self.spill_dir:
+            return
+        for path, spilled in self._spilled():
+            replaying = '{}.replaying-{}'.format(spilled, os.getpid())
+            with self._spill_lock:
+                try:
+                    if path != replaying:
+                        os.rename(path, replaying)
+                except FileNotFoundError:
+                    continue
+            with open(replaying) as spill:
+                entries = (json.loads(line) for line in spill)
+                self._replay_entries((entry['index'], entry['document']) for entry in entries)
+            os.remove(replaying)
+
+    def _replay_entries(self, entries):
+        healthy = True
+        batch = []
+        for entry in entries:
+            batch.append(entry)
+            if len(batch) == self.batch_size:
+                # Once Elasticsearch fails again the rest goes straight back to the spill file.
+                if healthy:
+                    healthy = self._ship(batch, retries=0)
+                else:
+                    self._spill(batch)
+                batch = []
+        if batch:
+            if healthy:
+                self._ship(batch, retries=0)
+            else:
+                self._spill(batch)
+
+    def close(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self._ship(batch, retries=1)
+
+
+def init_app(app):
+    if app.config['AUDIT_ASYNC']:
+        registry = app.extensions['elasticsearch']
+        app.extensions['audit'] = AuditLogPipeline(
+            registry.client, spill_dir=app.config['AUDIT_SPILL_DIR'], max_queue=app.config['AUDIT_QUEUE_SIZE'],
+            batch_size=app.config['AUDIT_BATCH_SIZE'], flush_interval=app.config['AUDIT_FLUSH_INTERVAL'])
@@ -1,9 +1,10 @@
 from auth0.v3 import Auth0Error
-from auth0.v3.authentication import Users
-from flask import current_app, Flask, jsonify, redirect, render_template, request
+from flask import abort, current_app, Flask, g, jsonify, redirect, render_template, request
 from functools import wraps
 
-from .elastic import Elasticsearch
+from .connections import get_document
+from .identity import IdentityError
+from .tracing import span
 
 
 # Error handler
@@ -42,43 +43,66 @@ def get_token_auth_header():
     return token
 
 
+def requested_point_id(kwargs):
+    """Id of the point a request acts on, from the URL or the JSON body."""
+    if 'point_id' in kwargs:
+        return kwargs['point_id']
+    return (request.get_json(silent=True) or {}).get('id')
+
+
+def resolve_user(token, point_id=None):
+    """Resolves the token to a user.
+
+    With the async runtime the point the view is going to read is fetched while the token
+    is being resolved and kept for the rest of the request.
+    """
+    identity = current_app.extensions['identity']
+    runtime = current_app.extensions.get('aio')
+    if runtime is None:
+        with span('auth'):
+            return identity.resolve(token)
+    with span('auth', prefetched=point_id):
+        user, documents = runtime.run(runtime.resolve_with_documents(identity, token, [point_id] if point_id else []))
+    g.setdefault('documents', {}).update(documents)
+    return user
+
+
 def requires_auth(f):
     @wraps(f)
     def decorated(*args, **kwargs):
         try:
-            app_metadata_key = 'https://koronapoints.netlify.com/app_metadata'
-            a0_users = Users(current_app.config['AUTH0_DOMAIN'])
-            a0_user = a0_users.userinfo(get_token_auth_header())
-            user = {'sub': a0_user.get('sub')}
-            if a0_user.get(app_metadata_key):
-                user['role'] = a0_user.get(app_metadata_key).get('role')
-        except Auth0Error:
+            point_id = requested_point_id(kwargs) if getattr(f, 'reads_point', False) else None
+            user = resolve_user(get_token_auth_header(), point_id=point_id)
+        except (Auth0Error, IdentityError):
             return redirect('login')
         return f(*args, **kwargs, user=user)
 
     return decorated
 
 
+def can_modify(user, point_id):
+    """Moderators may modify any point, other users only the ones they own."""
+    if user.get('role') == 'moderator':
+        return True
+    return get_document(point_id)['_source'].get('owned_by') == user['sub']
+
+
 def check_rights(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        if kwargs['user'].get('role') == 'moderator':
+        if can_modify(kwargs['user'], requested_point_id(kwargs)):
             return f(*args, **kwargs)
-        es = Elasticsearch(current_app.config['ES_CONNECTION_STRING'], index=current_app.config['INDEX_NAME'])
-        req_json = request.json
-        point = es.get_full_point(point_id=req_json['id'])
-        if point['owned_by'] == kwargs['user']['sub']:
-            return f(*args, **kwargs)
-        raise Exception("Not allowed")
+        abort(403)
 
+    decorated.reads_point = True
     return decorated
 
 
 def moderator(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        if kwargs['user']['role'] == 'moderator':
+        if kwargs['user'].get('role') == 'moderator':
             return f(*args, **kwargs)
-        raise Exception("Not allowed")
+        abort(403)
 
     return decorated
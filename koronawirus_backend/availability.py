@@ -0,0 +1,87 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from .connections import get_elastic
+
+
+logger = logging.getLogger(__name__)
+
+
+class AvailabilityBuffer:
+    """Coalesces anonymous waiting time reports.
+
+    Reports are kept per point for `window` seconds, then every point is set to the most
+    reported waiting time (the latest report wins ties) with a single bulk request. At most
+    `max_points` points are buffered; a report for another point flushes the buffer first.
+    """
+    def __init__(self, es_factory, window=5, max_points=10000, user_sub='anonymous', on_flush=None):
+        self.es_factory = es_factory
+        self.on_flush = on_flush
+        self.window = window
+        self.max_points = max_points
+        self.user_sub = user_sub
+        self._reports = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pid = None
+
+    def _ensure_worker(self):
+        # Threads don't survive fork, every worker process starts its own flusher.
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reports = {}
+                    self._pid = os.getpid()
+                    threading.Thread(target=self._run, daemon=True).start()
+                    atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            time.sleep(self.window)
+            try:
+                self.flush()
+            except Exception:
+                # Reports of a failed flush are lost, which is acceptable for crowd-sourced estimates.
+                logger.exception("Flushing availability reports failed")
+
+    def report(self, point_id, availability):
+        self._ensure_worker()
+        with self._lock:
+            full = point_id not in self._reports and len(self._reports) >= self.max_points
+        if full:
+            self.flush()
+        with self._lock:
+            reports = self._reports.get(point_id)
+            if reports is None:
+                reports = self._reports[point_id] = [Counter(), None]
+            reports[0][availability] += 1
+            reports[1] = availability
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                buffered, self._reports = self._reports, {}
+            if not buffered:
+                return
+            waiting_times = {}
+            for point_id, (counts, latest) in buffered.items():
+                top = max(counts.values())
+                waiting_times[point_id] = latest if counts[latest] == top else counts.most_common(1)[0][0]
+            self.es_factory().set_waiting_times(waiting_times, user_sub=self.user_sub,
+                                                reports={point_id: dict(counts)
+                                                         for point_id, (counts, _) in buffered.items()})
+            if self.on_flush is not None:
+                self.on_flush()
+
+
+def init_app(app):
+    if app.config['AVAILABILITY_WINDOW'] > 0:
+        response_cache = app.extensions.get('response_cache')
+        app.extensions['availability'] = AvailabilityBuffer(
+            lambda: get_elastic(app), window=app.config['AVAILABILITY_WINDOW'],
+            max_points=app.config['AVAILABILITY_MAX_POINTS'],
+            on_flush=response_cache.invalidate if response_cache is not None else None)
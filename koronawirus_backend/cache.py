@@ -0,0 +1,96 @@
+import threading
+import time
+from collections import OrderedDict
+
+from .serialization import dumps, loads
+
+
+class LocalCache:
+    """Thread-safe in-process cache with a per-entry TTL and LRU eviction."""
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                expires_at, value = self._entries[key]
+            except KeyError:
+                return None
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def incr(self, key):
+        """Increments a counter that never expires and isn't subject to eviction."""
+        with self._lock:
+            value = self._counters.get(key, 0) + 1
+            self._counters[key] = value
+            return value
+
+    def get_counter(self, key):
+        return self._counters.get(key, 0)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisCache:
+    """Cache shared between worker processes. Values have to be JSON serialisable."""
+    def __init__(self, url, prefix='koronawirus:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("redis package is required to use a shared cache backend")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return None if value is None else loads(value)
+
+    def set(self, key, value, ttl):
+        if ttl <= 0:
+            return
+        self.client.set(self.prefix + key, dumps(value), ex=max(1, int(ttl)))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def incr(self, key):
+        return self.client.incr(self.prefix + key)
+
+    def get_counter(self, key):
+        return int(self.client.get(self.prefix + key) or 0)
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+
+def create_cache(redis_url=None, maxsize=1024, prefix='koronawirus:'):
+    if redis_url:
+        return RedisCache(redis_url, prefix=prefix)
+    return LocalCache(maxsize=maxsize)
@@ -0,0 +1,250 @@
+import csv
+import json
+import sys
+import time
+
+import click
+from dotenv import find_dotenv, load_dotenv
+from elasticsearch import Elasticsearch as ES
+from elasticsearch import helpers
+
+from . import constants, mappings
+from .elastic import Elasticsearch, LOG_ID_FIELD, new_id, Point, POINT_ID_FIELD
+from .serialization import ElasticsearchSerializer
+
+
+FORMATS = ['csv', 'geojson', 'ndjson']
+CSV_FIELDS = ['id', 'name', 'operator', 'address', 'opening_hours', 'lat', 'lon', 'type', 'phone',
+              'prepare_instruction', 'waiting_time', 'owned_by', 'last_modified_timestamp']
+
+
+def guess_format(filename):
+    extension = filename.rsplit('.', 1)[-1].lower()
+    if extension == 'csv':
+        return 'csv'
+    if extension in ('json', 'geojson'):
+        return 'geojson'
+    return 'ndjson'
+
+
+def to_document(record):
+    """Builds (doc_id, index body) from a flat record or a document as stored in the index."""
+    location = record.get('location') or {}
+    point = Point(name=record.get('name'), operator=record.get('operator'), address=record.get('address'),
+                  opening_hours=record.get('opening_hours'), lat=location.get('lat', record.get('lat')),
+                  lon=location.get('lon', record.get('lon')), point_type=record.get('type', record.get('point_type')),
+                  phone=record.get('phone'), prepare_instruction=record.get('prepare_instruction'),
+                  owned_by=record.get('owned_by'), waiting_time=record.get('waiting_time'),
+                  last_modified_timestamp=record.get('last_modified_timestamp') or None)
+    body = point.to_index()
+    if record.get('images'):
+        body['images'] = record['images']
+    return record.get('id') or record.get('_id') or None, body
+
+
+def read_csv(stream):
+    return csv.DictReader(stream)
+
+
+def read_ndjson(stream):
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_geojson(stream):
+    """Yields a record per feature. Streams with ijson when it's installed, loads the whole file otherwise."""
+    try:
+        import ijson
+    except ImportError:
+        features = json.load(stream)['features']
+    else:
+        features = ijson.items(stream, 'features.item', use_float=True)
+    for feature in features:
+        record = dict(feature.get('properties') or {})
+        lon, lat = feature['geometry']['coordinates'][:2]
+        record['lat'], record['lon'] = lat, lon
+        if 'id' in feature:
+            record.setdefault('id', feature['id'])
+        yield record
+
+
+READERS = {'csv': read_csv, 'geojson': read_geojson, 'ndjson': read_ndjson}
+
+
+def to_actions(records, index):
+    for record in records:
+        doc_id, body = to_document(record)
+        doc_id = doc_id or new_id()
+        body[POINT_ID_FIELD] = doc_id
+        yield {'_index': index, '_id': doc_id, '_source': body}
+
+
+def write_ndjson(hits, stream):
+    for hit in hits:
+        record = dict(hit['_source'], id=hit['_id'])
+        stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+        yield hit
+
+
+def write_csv(hits, stream):
+    writer = csv.DictWriter(stream, fieldnames=CSV_FIELDS, extrasaction='ignore')
+    writer.writeheader()
+    for hit in hits:
+        source = hit['_source']
+        record = dict(source, id=hit['_id'], lat=source['location']['lat'], lon=source['location']['lon'])
+        writer.writerow(record)
+        yield hit
+
+
+def write_geojson(hits, stream):
+    stream.write('{"type": "FeatureCollection", "features": [\n')
+    separator = ''
+    for hit in hits:
+        properties = dict(hit['_source'])
+        location = properties.pop('location')
+        feature = {"type": "Feature", "id": hit['_id'], "properties": properties,
+                   "geometry": {"type": "Point", "coordinates": [float(location['lon']), float(location['lat'])]}}
+        stream.write(separator + json.dumps(feature, ensure_ascii=False))
+        separator = ',\n'
+        yield hit
+    stream.write('\n]}\n')
+
+
+WRITERS = {'csv': write_csv, 'geojson': write_geojson, 'ndjson': write_ndjson}
+
+
+class Progress:
+    """Reports the document rate to stderr every `every` documents and once done."""
+    def __init__(self, label, every=10000):
+        self.label = label
+        self.every = every
+        self.count = 0
+        self.started = time.monotonic()
+
+    def rate(self):
+        return self.count / max(time.monotonic() - self.started, 1e-9)
+
+    def report(self):
+        click.echo('{} {} documents, {:.0f} docs/sec'.format(self.label, self.count, self.rate()), err=True)
+
+    def tick(self):
+        self.count += 1
+        if self.count % self.every == 0:
+            self.report()
+
+
+def bulk_load(es, index, actions, chunk_size=500, thread_count=4, disable_refresh=True):
+    """Loads actions with parallel_bulk, yielding (ok, item) per document.
+
+    Periodic refreshes are switched off for the duration of the load and the previous
+    refresh interval is restored afterwards.
+    """
+    previous = None
+    if disable_refresh:
+        settings = es.indices.get_settings(index=index, name='index.refresh_interval')
+        # Keyed by the concrete index, not the alias the load writes through.
+        previous = next(iter(settings.values()), {}).get('settings', {}).get('index', {}).get('refresh_interval')
+        es.indices.put_settings(index=index, body={"index": {"refresh_interval": "-1"}})
+    try:
+        yield from helpers.parallel_bulk(es, actions, thread_count=thread_count, chunk_size=chunk_size,
+                                         queue_size=thread_count, raise_on_error=False)
+    finally:
+        if disable_refresh:
+            es.indices.put_settings(index=index, body={"index": {"refresh_interval": previous}})
+            es.indices.refresh(index=index)
+
+
+@click.group()
+@click.option('--es', 'connection_string', envvar=constants.ES_CONNECTION_STRING, required=True,
+              help='Elasticsearch connection string, defaults to $ES_CONNECTION_STRING.')
+@click.option('--index', envvar=constants.INDEX_NAME, required=True,
+              help='Points index, defaults to $INDEX_NAME.')
+@click.pass_context
+def cli(ctx, connection_string, index):
+    ctx.obj = {'es': ES([connection_string], timeout=60, serializer=ElasticsearchSerializer()), 'index': index}
+
+
+@cli.command('import')
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--format', 'file_format', type=click.Choice(FORMATS), help='Guessed from the file extension.')
+@click.option('--chunk-size', default=500, show_default=True)
+@click.option('--threads', default=4, show_default=True)
+@click.option('--keep-refresh', is_flag=True, help='Keep periodic refreshes enabled during the load.')
+@click.pass_obj
+def import_points(obj, source, file_format, chunk_size, threads, keep_refresh):
+    """Streams points from a CSV, GeoJSON or NDJSON file into the index."""
+    records = READERS[file_format or guess_format(source.name)](source)
+    progress = Progress('Imported')
+    failed = 0
+    for ok, item in bulk_load(obj['es'], obj['index'], to_actions(records, obj['index']), chunk_size=chunk_size,
+                              thread_count=threads, disable_refresh=not keep_refresh):
+        if not ok:
+            failed += 1
+            click.echo('Failed: {}'.format(json.dumps(item)), err=True)
+        progress.tick()
+    progress.report()
+    if failed:
+        click.echo('{} documents failed'.format(failed), err=True)
+        sys.exit(1)
+
+
+@cli.command('export')
+@click.argument('target', type=click.File('w', encoding='utf-8'), default='-')
+@click.option('--format', 'file_format', type=click.Choice(FORMATS), help='Guessed from the file extension.')
+@click.option('--size', default=1000, show_default=True, help='Documents fetched per scroll page.')
+@click.pass_obj
+def export_points(obj, target, file_format, size):
+    """Streams every point from the index into a CSV, GeoJSON or NDJSON file (stdout by default)."""
+    hits = Elasticsearch(es=obj['es'], index=obj['index']).scan_points(size=size)
+    progress = Progress('Exported')
+    for _ in WRITERS[file_format or guess_format(target.name)](hits, target):
+        progress.tick()
+    progress.report()
+
+
+@cli.command('put-templates')
+@click.option('--points-refresh-interval', default='1s', show_default=True)
+@click.option('--logs-refresh-interval', default='30s', show_default=True)
+@click.option('--replicas', default=1, show_default=True)
+@click.pass_obj
+def put_templates(obj, points_refresh_interval, logs_refresh_interval, replicas):
+    """Installs the points and log index templates."""
+    mappings.put_templates(obj['es'], obj['index'], points_refresh_interval, logs_refresh_interval, replicas)
+    click.echo('Templates for {} installed'.format(obj['index']), err=True)
+
+
+@cli.command('create-index')
+@click.pass_obj
+def create_index(obj):
+    """Creates the first versioned points index behind the alias."""
+    index = mappings.create(obj['es'], obj['index'])
+    if index is None:
+        click.echo('{} already exists'.format(obj['index']), err=True)
+    else:
+        click.echo('Created {} behind {}'.format(index, obj['index']), err=True)
+
+
+@cli.command('add-id-fields')
+@click.pass_obj
+def add_id_fields(obj):
+    """Sets the id copies listings sort on in documents written before they existed."""
+    mappings.add_id_field(obj['es'], obj['index'], POINT_ID_FIELD, mappings.POINT_PROPERTIES)
+    click.echo('Added {} to {}'.format(POINT_ID_FIELD, obj['index']), err=True)
+    mappings.add_id_field(obj['es'], obj['index'] + '_*', LOG_ID_FIELD, mappings.LOG_PROPERTIES)
+    click.echo('Added {} to {}_*'.format(LOG_ID_FIELD, obj['index']), err=True)
+
+
+@cli.command('reindex')
+@click.option('--delete-old', is_flag=True, help='Delete the previous index once the alias is swapped.')
+@click.pass_obj
+def reindex(obj, delete_old):
+    """Copies the points into a new versioned index with the current template and swaps the alias."""
+    started = time.monotonic()
+    index = mappings.reindex(obj['es'], obj['index'], delete_old=delete_old)
+    click.echo('{} now points at {} ({:.1f}s)'.format(obj['index'], index, time.monotonic() - started), err=True)
+
+
+def main():
+    load_dotenv(find_dotenv(usecwd=True))
+    cli()
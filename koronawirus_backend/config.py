@@ -1,3 +1,5 @@
+import os
+import tempfile
 from dotenv import load_dotenv, find_dotenv
 from os import environ as env
 from . import constants
@@ -21,15 +23,62 @@ class BaseConfig:
         self.AUTH0_AUDIENCE = env.get(constants.AUTH0_AUDIENCE)
         if self.AUTH0_AUDIENCE == '':
             self.AUTH0_AUDIENCE = self.AUTH0_BASE_URL + '/userinfo'
+        # `jwt` verifies tokens locally: roles need an Auth0 rule adding the app_metadata claim to
+        # access tokens, and Auth0 blocking isn't seen, bans go through IdentityResolver.ban.
+        self.AUTH_MODE = env.get(constants.AUTH_MODE, 'userinfo')
+        self.AUTH_CACHE_SIZE = int(env.get(constants.AUTH_CACHE_SIZE, 10000))
+        self.AUTH_CACHE_TTL = int(env.get(constants.AUTH_CACHE_TTL, 300))
+        self.AUTH_JWKS_TTL = int(env.get(constants.AUTH_JWKS_TTL, 3600))
+        self.CACHE_REDIS_URL = env.get(constants.CACHE_REDIS_URL)
+        self.RESPONSE_CACHE_TTL = int(env.get(constants.RESPONSE_CACHE_TTL, 0))
+        self.RESPONSE_CACHE_SIZE = int(env.get(constants.RESPONSE_CACHE_SIZE, 2048))
 
         self.STORE_PROPERTY = env.get(constants.S3_BUCKET)
         self.ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
-        self.MAX_CONTENT_LENGTH = 10 * 1024 * 1024
+        self.MAX_CONTENT_LENGTH = int(env.get(constants.MAX_CONTENT_LENGTH, 10 * 1024 * 1024))
+        self.S3_PART_SIZE = int(env.get(constants.S3_PART_SIZE, 8 * 1024 * 1024))
+        self.S3_MAX_CONCURRENCY = int(env.get(constants.S3_MAX_CONCURRENCY, 4))
+        self.S3_MAX_POOL_CONNECTIONS = int(env.get(constants.S3_MAX_POOL_CONNECTIONS, 10))
+        # Without it no storage or image queue is set up, e.g. to benchmark the points endpoints.
+        self.IMAGES_ENABLED = env.get(constants.IMAGES_ENABLED, 'true').lower() == 'true'
+        self.IMAGE_ASYNC = env.get(constants.IMAGE_ASYNC, 'false').lower() == 'true'
+        self.IMAGE_SPOOL_DIR = env.get(constants.IMAGE_SPOOL_DIR,
+                                       os.path.join(tempfile.gettempdir(), 'koronawirus_image_spool'))
+        self.IMAGE_WORKERS = int(env.get(constants.IMAGE_WORKERS, 4))
+        self.IMAGE_MAX_PENDING = int(env.get(constants.IMAGE_MAX_PENDING, 32))
+        self.IMAGE_KNOWN_HASHES_FILE = env.get(constants.IMAGE_KNOWN_HASHES_FILE)
 
         self.SECRET_KEY = env.get(constants.SECRET_KEY)
         self.ES_CONNECTION_STRING = env.get(constants.ES_CONNECTION_STRING)
+        self.ES_MAXSIZE = int(env.get(constants.ES_MAXSIZE, 25))
+        self.ES_TIMEOUT = float(env.get(constants.ES_TIMEOUT, 10))
+        self.ES_MAX_RETRIES = int(env.get(constants.ES_MAX_RETRIES, 3))
+        self.ES_RETRY_ON_TIMEOUT = env.get(constants.ES_RETRY_ON_TIMEOUT, 'true').lower() == 'true'
+        self.ASYNC_MODE = env.get(constants.ASYNC_MODE, 'false').lower() == 'true'
         self.INDEX_NAME = env.get(constants.INDEX_NAME)
+        self.TILE_MAX_POINTS = int(env.get(constants.TILE_MAX_POINTS, 2000))
+        self.POINTS_BUDGET = int(env.get(constants.POINTS_BUDGET, 9000))
+        self.TILE_MAX_AGE = int(env.get(constants.TILE_MAX_AGE, 60))
+        self.CLUSTER_MAX_POINTS = int(env.get(constants.CLUSTER_MAX_POINTS, 300))
+        self.CLUSTER_PRECISION_OFFSET = int(env.get(constants.CLUSTER_PRECISION_OFFSET, 2))
+        self.NEAREST_INDEX_ENABLED = env.get(constants.NEAREST_INDEX_ENABLED, 'false').lower() == 'true'
+        self.NEAREST_INDEX_MAX_STALENESS = int(env.get(constants.NEAREST_INDEX_MAX_STALENESS, 30))
+        self.NEAREST_INDEX_FULL_REFRESH = int(env.get(constants.NEAREST_INDEX_FULL_REFRESH, 600))
+        self.AVAILABILITY_WINDOW = float(env.get(constants.AVAILABILITY_WINDOW, 0))
+        self.AVAILABILITY_MAX_POINTS = int(env.get(constants.AVAILABILITY_MAX_POINTS, 10000))
+        self.AUDIT_ASYNC = env.get(constants.AUDIT_ASYNC, 'true').lower() == 'true'
+        self.AUDIT_SPILL_DIR = env.get(constants.AUDIT_SPILL_DIR,
+                                       os.path.join(tempfile.gettempdir(), 'koronawirus_audit_spill'))
+        self.AUDIT_QUEUE_SIZE = int(env.get(constants.AUDIT_QUEUE_SIZE, 10000))
+        self.AUDIT_BATCH_SIZE = int(env.get(constants.AUDIT_BATCH_SIZE, 500))
+        self.AUDIT_FLUSH_INTERVAL = float(env.get(constants.AUDIT_FLUSH_INTERVAL, 2))
         self.QUEUE_NAME = env.get(constants.IMAGE_RESIZER_QUEUE)
+        self.RABBITMQ_URL = env.get(constants.RABBITMQ_URL)
+        self.QUEUE_OUTBOX_SIZE = int(env.get(constants.QUEUE_OUTBOX_SIZE, 10000))
+        self.QUEUE_BATCH_SIZE = int(env.get(constants.QUEUE_BATCH_SIZE, 100))
+        self.DASHBOARD_ENABLED = env.get(constants.DASHBOARD_ENABLED, 'true').lower() == 'true'
+        self.TRACING_ENABLED = env.get(constants.TRACING_ENABLED, 'false').lower() == 'true'
+        self.TRACING_EXPORT_PATH = env.get(constants.TRACING_EXPORT_PATH)
 
 
 class DefaultConfig(BaseConfig):
@@ -0,0 +1,72 @@
+import os
+import threading
+
+from elasticsearch import Elasticsearch as ES
+from flask import current_app, g
+
+from .elastic import Elasticsearch
+from .serialization import ElasticsearchSerializer
+from .tracing import trace_client
+
+
+class ElasticsearchRegistry:
+    """Holds one pooled Elasticsearch client per process.
+
+    The client is created lazily and re-created when the process id changes, so
+    a registry built in the gunicorn master is safe to use in pre-forked workers.
+    """
+    def __init__(self, connection_string, maxsize=10, timeout=10, max_retries=3, retry_on_timeout=True):
+        self.connection_string = connection_string
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_on_timeout = retry_on_timeout
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config['ES_CONNECTION_STRING'], maxsize=config['ES_MAXSIZE'], timeout=config['ES_TIMEOUT'],
+                   max_retries=config['ES_MAX_RETRIES'], retry_on_timeout=config['ES_RETRY_ON_TIMEOUT'])
+
+    def client(self):
+        pid = os.getpid()
+        if self._client is None or self._pid != pid:
+            with self._lock:
+                if self._client is None or self._pid != pid:
+                    # Connections inherited from the parent process must not be reused after fork.
+                    self._client = ES([self.connection_string], maxsize=self.maxsize, timeout=self.timeout,
+                                      max_retries=self.max_retries, retry_on_timeout=self.retry_on_timeout,
+                                      serializer=ElasticsearchSerializer())
+                    self._pid = pid
+        return self._client
+
+    def close(self):
+        with self._lock:
+            if self._client is not None and self._pid == os.getpid():
+                self._client.transport.close()
+            self._client = None
+            self._pid = None
+
+
+def init_app(app):
+    app.extensions['elasticsearch'] = ElasticsearchRegistry.from_config(app.config)
+
+
+def get_elastic(app=None):
+    """Returns an Elasticsearch wrapper bound to the app's pooled client."""
+    app = app or current_app
+    registry = app.extensions['elasticsearch']
+    return Elasticsearch(es=trace_client(registry.client(), 'es', app), index=app.config['INDEX_NAME'],
+                         audit=app.extensions.get('audit'))
+
+
+def get_document(point_id, app=None):
+    """Raw point document, read at most once per request."""
+    documents = g.setdefault('documents', {})
+    if point_id not in documents:
+        app = app or current_app
+        client = trace_client(app.extensions['elasticsearch'].client(), 'es', app)
+        documents[point_id] = client.get(index=app.config['INDEX_NAME'], id=point_id)
+    return documents[point_id]
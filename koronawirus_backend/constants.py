@@ -11,3 +11,46 @@ ES_CONNECTION_STRING = 'ES_CONNECTION_STRING'
 INDEX_NAME = 'INDEX_NAME'
 IMAGE_RESIZER_QUEUE = 'IMAGE_RESIZER_QUEUE'
 DASHBOARD_CONFIG_FILE_PATH = 'DASHBOARD_CONFIG_FILE_PATH'
+DASHBOARD_ENABLED = 'DASHBOARD_ENABLED'
+ES_MAXSIZE = 'ES_MAXSIZE'
+ES_TIMEOUT = 'ES_TIMEOUT'
+ES_MAX_RETRIES = 'ES_MAX_RETRIES'
+ES_RETRY_ON_TIMEOUT = 'ES_RETRY_ON_TIMEOUT'
+ASYNC_MODE = 'ASYNC_MODE'
+AUTH_MODE = 'AUTH_MODE'
+AUTH_CACHE_SIZE = 'AUTH_CACHE_SIZE'
+AUTH_CACHE_TTL = 'AUTH_CACHE_TTL'
+AUTH_JWKS_TTL = 'AUTH_JWKS_TTL'
+CACHE_REDIS_URL = 'CACHE_REDIS_URL'
+TILE_MAX_POINTS = 'TILE_MAX_POINTS'
+POINTS_BUDGET = 'POINTS_BUDGET'
+TILE_MAX_AGE = 'TILE_MAX_AGE'
+CLUSTER_MAX_POINTS = 'CLUSTER_MAX_POINTS'
+CLUSTER_PRECISION_OFFSET = 'CLUSTER_PRECISION_OFFSET'
+NEAREST_INDEX_ENABLED = 'NEAREST_INDEX_ENABLED'
+NEAREST_INDEX_MAX_STALENESS = 'NEAREST_INDEX_MAX_STALENESS'
+NEAREST_INDEX_FULL_REFRESH = 'NEAREST_INDEX_FULL_REFRESH'
+AVAILABILITY_WINDOW = 'AVAILABILITY_WINDOW'
+AVAILABILITY_MAX_POINTS = 'AVAILABILITY_MAX_POINTS'
+AUDIT_ASYNC = 'AUDIT_ASYNC'
+AUDIT_SPILL_DIR = 'AUDIT_SPILL_DIR'
+AUDIT_QUEUE_SIZE = 'AUDIT_QUEUE_SIZE'
+AUDIT_BATCH_SIZE = 'AUDIT_BATCH_SIZE'
+AUDIT_FLUSH_INTERVAL = 'AUDIT_FLUSH_INTERVAL'
+RESPONSE_CACHE_TTL = 'RESPONSE_CACHE_TTL'
+RESPONSE_CACHE_SIZE = 'RESPONSE_CACHE_SIZE'
+IMAGES_ENABLED = 'IMAGES_ENABLED'
+IMAGE_ASYNC = 'IMAGE_ASYNC'
+IMAGE_SPOOL_DIR = 'IMAGE_SPOOL_DIR'
+IMAGE_WORKERS = 'IMAGE_WORKERS'
+IMAGE_MAX_PENDING = 'IMAGE_MAX_PENDING'
+MAX_CONTENT_LENGTH = 'MAX_CONTENT_LENGTH'
+S3_PART_SIZE = 'S3_PART_SIZE'
+S3_MAX_CONCURRENCY = 'S3_MAX_CONCURRENCY'
+S3_MAX_POOL_CONNECTIONS = 'S3_MAX_POOL_CONNECTIONS'
+IMAGE_KNOWN_HASHES_FILE = 'IMAGE_KNOWN_HASHES_FILE'
+RABBITMQ_URL = 'RABBITMQ_URL'
+QUEUE_OUTBOX_SIZE = 'QUEUE_OUTBOX_SIZE'
+QUEUE_BATCH_SIZE = 'QUEUE_BATCH_SIZE'
+TRACING_ENABLED = 'TRACING_ENABLED'
+TRACING_EXPORT_PATH = 'TRACING_EXPORT_PATH'
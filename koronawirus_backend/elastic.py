@@ -1,12 +1,46 @@
+import base64
+import json
+import logging
+import uuid
 from datetime import datetime
 from elasticsearch import Elasticsearch as ES
+from elasticsearch import helpers
+from elasticsearch.exceptions import ConflictError
+
+
+logger = logging.getLogger(__name__)
+
+# Fields the map needs to draw a marker, the rest is fetched with /get_point once it's clicked.
+MARKER_FIELDS = ['type', 'location', 'waiting_time', 'last_modified_timestamp']
+# Point attributes stored under a different name in the document.
+DOCUMENT_FIELDS = {'lat': 'location', 'lon': 'location', 'point_type': 'type'}
+LOG_TIMESTAMP_FORMAT = "%Y/%m/%d %H:%M:%S"
+# Only the parts of a search response the listings read, less for ES to render and for us to parse.
+HITS_FILTER_PATH = ['hits.total.value', 'hits.hits._id', 'hits.hits._source', 'aggregations']
+# Fields a client may project point listings to, named as in `Point.to_dict`.
+POINT_FIELDS = ['name', 'operator', 'address', 'location', 'type', 'opening_hours', 'phone', 'prepare_instruction',
+                'last_modified_timestamp', 'waiting_time']
+# Relative chance of a point type to be kept when a listing is sampled down to its budget.
+POINT_TYPE_PRIORITY = {'hospital': 2, 'transport': 1}
+# Fixed, so a sampled map shows the same markers while it's panned and zoomed.
+SAMPLE_SEED = 7
+# Keyword copies of the document id that sorted listings break ties on, sorting on `_id` needs fielddata.
+POINT_ID_FIELD = 'point_id'
+LOG_ID_FIELD = 'log_id'
 
 
 class NotDefined:
     pass
 
 
+class NotOwnerError(PermissionError):
+    pass
+
+
 class Point:
+    __slots__ = ('name', 'operator', 'address', 'opening_hours', 'lat', 'lon', 'point_type', 'phone',
+                 'prepare_instruction', 'owned_by', 'waiting_time', 'doc_id', 'last_modified_timestamp')
+
     def __init__(self, name, operator, address, opening_hours, lat, lon, point_type, phone, prepare_instruction,
                  owned_by, waiting_time, doc_id=None, last_modified_timestamp=None):
         self.waiting_time = waiting_time
@@ -66,21 +100,84 @@ class Point:
         body['owned_by'] = self.owned_by
         return body
 
+    def to_partial(self, changed):
+        """Returns only the document fields touched by `changed` (as returned by `modify`)."""
+        body = self.to_index()
+        partial = {field: body[field] for field in {DOCUMENT_FIELDS.get(name, name) for name in changed}}
+        partial['last_modified_timestamp'] = self.last_modified_timestamp
+        return partial
+
     def modify(self, name, operator, address, lat, lon, point_type, opening_hours, phone,
                prepare_instruction, owned_by, waiting_time):
-        params = locals()
-        params.pop('self')
         changed = dict()
-        for param in params.keys():
-            if type(params[param]) is not NotDefined:
-                if getattr(self, param) != params[param]:
-                    changed[param] = {'old_value': getattr(self, param),
-                                      'new_value': params[param]}
-                setattr(self, param, params[param])
+        for param, value in (('name', name), ('operator', operator), ('address', address), ('lat', lat),
+                             ('lon', lon), ('point_type', point_type), ('opening_hours', opening_hours),
+                             ('phone', phone), ('prepare_instruction', prepare_instruction),
+                             ('owned_by', owned_by), ('waiting_time', waiting_time)):
+            if type(value) is not NotDefined:
+                old_value = getattr(self, param)
+                if old_value != value:
+                    changed[param] = {'old_value': old_value, 'new_value': value}
+                setattr(self, param, value)
         self.last_modified_timestamp = datetime.utcnow().strftime("%s")
         return changed
 
 
+def hit_to_dict(hit):
+    """Same output as `Point.from_dict(hit).to_dict(with_id=True)` without building a Point."""
+    source = hit['_source']
+    location = source['location']
+    return {
+        "name": source['name'],
+        "operator": source['operator'],
+        "address": source['address'],
+        "location": {
+            "lat": str(location['lat']),
+            "lon": str(location['lon'])
+        },
+        "type": source['type'],
+        "opening_hours": source['opening_hours'],
+        "phone": source['phone'],
+        "prepare_instruction": source['prepare_instruction'],
+        "last_modified_timestamp": source['last_modified_timestamp'],
+        "waiting_time": source['waiting_time'],
+        "id": hit['_id']
+    }
+
+
+def hit_to_marker(hit):
+    marker = hit['_source']
+    marker['id'] = hit['_id']
+    return marker
+
+
+def hits_to_columns(hits):
+    """Markers as parallel arrays, a fraction of the size of a list of objects to encode and parse."""
+    columns = {'ids': [], 'lats': [], 'lons': [], 'types': [], 'waiting_times': []}
+    for hit in hits:
+        source = hit['_source']
+        columns['ids'].append(hit['_id'])
+        columns['lats'].append(float(source['location']['lat']))
+        columns['lons'].append(float(source['location']['lon']))
+        columns['types'].append(source['type'])
+        columns['waiting_times'].append(source.get('waiting_time'))
+    return columns
+
+
+def sampled(query):
+    """Scores the query's hits by type priority times a seeded random number, so the top `size` of
+    them are a stable sample favouring the higher priority types.
+
+    The random number is derived from the point id copy, which unlike `_seq_no` doesn't change when
+    the point is modified and is unique across shards.
+    """
+    functions = [{"random_score": {"seed": SAMPLE_SEED, "field": POINT_ID_FIELD}}]
+    functions.extend({"filter": {"term": {"type": point_type}}, "weight": weight}
+                     for point_type, weight in POINT_TYPE_PRIORITY.items())
+    return {"function_score": {"query": query, "functions": functions, "score_mode": "multiply",
+                               "boost_mode": "replace"}}
+
+
 def add_to_or_create_list(location, name, query):
     try:
         location[name]
@@ -89,12 +186,38 @@ def add_to_or_create_list(location, name, query):
     location[name].append(query)
 
 
+def new_id():
+    return uuid.uuid4().hex
+
+
+def encode_cursor(sort_values):
+    return base64.urlsafe_b64encode(json.dumps(sort_values).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Raises ValueError for anything that isn't a cursor returned by `encode_cursor`."""
+    try:
+        sort_values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(sort_values, list):
+        raise ValueError("Invalid cursor")
+    return sort_values
+
+
+def log_document(user_sub, doc_id, name, changed):
+    return {"modified_by": user_sub, "doc_id": doc_id, "changes": changed,
+            "timestamp": datetime.utcnow().strftime(LOG_TIMESTAMP_FORMAT), "name": name, LOG_ID_FIELD: new_id()}
+
+
 class Elasticsearch:
-    def __init__(self, connection_string, index='hospitals'):
-        self.es = ES([connection_string])
+    def __init__(self, connection_string=None, index='hospitals', es=None, audit=None):
+        self.es = es if es is not None else ES([connection_string])
         self.index = index
+        self.audit = audit
 
-    def search_points(self, phrase, point_type=None, top_right=None, bottom_left=None, water=None, fire=None):
+    def search_points(self, phrase, point_type=None, top_right=None, bottom_left=None, water=None, fire=None,
+                      size=10, cursor=None, fields=None):
         body = {
             "query": {
                 "bool": {
@@ -130,75 +253,154 @@ class Elasticsearch:
                 }
             }
                                   )
-        response = self.es.search(index=self.index, body=body)
-        read_points = list(map(Point.from_dict, response['hits']['hits']))
-        out_points = [point.to_dict(with_id=True) for point in read_points]
-        return {'points': out_points}
-
-    def get_nearest(self, location):
-        body_transport = {'query': {'bool': {'must': [{'term': {'type': 'transport'}},
-                                            {'geo_distance': {'distance': '1000km',
-                                                              'location': {'lat': float(location['lat']),
-                                                                           'lon': float(location['lon'])}}}]}},
-                'size': 1,
-                'sort': [{'_geo_distance': {'location': {'lat': float(location['lat']),
-                                                                           'lon': float(location['lon'])},
-                                            'order': 'asc',
-                                            'unit': 'km'}}]}
-
-        response_transport = self.es.search(index=self.index, body=body_transport)
-        nearest_transport = Point.from_dict(response_transport['hits']['hits'][0])
-
-        body_hospital = {'query': {'bool': {'must': [{'term': {'type': 'hospital'}},
-                                                      {'geo_distance': {'distance': '1000km',
-                                                                        'location': {'lat': float(location['lat']),
-                                                                                     'lon': float(
-                                                                                         location['lon'])}}}]}},
-                          'size': 1,
-                          'sort': [{'_geo_distance': {'location': {'lat': float(location['lat']),
-                                                                   'lon': float(location['lon'])},
-                                                      'order': 'asc',
-                                                      'unit': 'km'}}]}
-        response_hospital = self.es.search(index=self.index, body=body_hospital)
-        nearest_hospital = Point.from_dict(response_hospital['hits']['hits'][0])
-        return {'hospital': nearest_hospital.to_dict(with_id=True),
-                'transport': nearest_transport.to_dict(with_id=True)}
-
-    def get_points(self, top_right, bottom_left):
-        body = '''{
-        "query": {
-            "bool" : {
-                "must" : {
-                    "match_all" : {}
+        body['sort'] = [{"_score": "desc"}, {POINT_ID_FIELD: "asc"}]
+        return self._page(body, size, cursor, fields)
+
+    def _page(self, body, size, cursor, fields):
+        """Runs a sorted search one page at a time, `cursor` being the `next` value of the previous page."""
+        body['size'] = size
+        if cursor is not None:
+            body['search_after'] = decode_cursor(cursor)
+        if fields is not None:
+            body['_source'] = fields
+        hits = self.es.search(index=self.index, body=body)['hits']['hits']
+        if fields is None:
+            out_points = [hit_to_dict(hit) for hit in hits]
+        else:
+            out_points = [dict({field: hit['_source'].get(field) for field in fields}, id=hit['_id']) for hit in hits]
+        next_cursor = encode_cursor(hits[-1]['sort']) if len(hits) == size else None
+        return {'points': out_points, 'next': next_cursor}
+
+    def get_nearest(self, location, point_types=('hospital', 'transport'), k=None):
+        """Returns the nearest point of every type together with its distance in km, in one round trip.
+
+        Without `k` each type maps to a single point (or None), with `k` to a list of up to k points.
+        """
+        origin = {'lat': float(location['lat']), 'lon': float(location['lon'])}
+        searches = []
+        for point_type in point_types:
+            searches.append({'index': self.index})
+            searches.append({'query': {'bool': {'filter': [{'term': {'type': point_type}},
+                                                           {'geo_distance': {'distance': '1000km',
+                                                                             'location': origin}}]}},
+                             'size': k or 1,
+                             'sort': [{'_geo_distance': {'location': origin,
+                                                         'order': 'asc',
+                                                         'unit': 'km'}}]})
+        response = self.es.msearch(body=searches)
+        nearest = {}
+        for point_type, result in zip(point_types, response['responses']):
+            if 'error' in result:
+                raise Exception(result['error'])
+            points = []
+            for hit in result['hits']['hits']:
+                point = hit_to_dict(hit)
+                point['distance'] = hit['sort'][0]
+                points.append(point)
+            nearest[point_type] = points if k is not None else next(iter(points), None)
+        return nearest
+
+    def get_points(self, top_right, bottom_left, zoom=None, cluster_threshold=300, cluster_precision_offset=2,
+                   size=9000, projection='full', columns=False):
+        """Returns up to `size` points inside the bounding box, sampled by type priority when it holds more.
+
+        The `marker` projection only returns MARKER_FIELDS and `columns` returns the markers as
+        parallel arrays. When `zoom` is given and the box holds more than `cluster_threshold`
+        points, geotile clusters with counts, centroids and a per type breakdown are returned instead,
+        in the same shape whatever the projection and `columns` are. The clusters are only
+        aggregated, with a second request, once the points turned out to be too many.
+        """
+        box = {
+            "bool": {
+                "must": {
+                    "match_all": {}
                 },
-                "filter" : {
-                    "geo_bounding_box" : {
+                "filter": {
+                    "geo_bounding_box": {
                         "validation_method": "COERCE",
-                        "location" : {
-                            "top_left" : {
-                                "lat" : ''' + str(top_right['lat']) + ''',
-                                "lon" : ''' + str(bottom_left['lon']) + '''
+                        "location": {
+                            "top_left": {
+                                "lat": float(top_right['lat']),
+                                "lon": float(bottom_left['lon'])
                             },
-                            "bottom_right" : {
-                                "lat" : ''' + str(bottom_left['lat']) + ''',
-                                "lon" : ''' + str(top_right['lon']) + '''
+                            "bottom_right": {
+                                "lat": float(bottom_left['lat']),
+                                "lon": float(top_right['lon'])
                             }
                         }
                     }
                 }
             }
-        },
-      	"size": 9000
-    	}'''
-        response = self.es.search(index=self.index, body=body)
-        read_points = list(map(Point.from_dict, response['hits']['hits']))
-        out_points = [point.to_dict(with_id=True) for point in read_points]
-        return {'points': out_points}
+        }
+        body = {"query": sampled(box), "size": size if zoom is None else min(size, cluster_threshold)}
+        if projection == 'marker' or columns:
+            body['_source'] = MARKER_FIELDS
+        response = self.es.search(index=self.index, body=body, filter_path=HITS_FILTER_PATH)
+        if zoom is not None and response['hits']['total']['value'] > cluster_threshold:
+            return {'clusters': self.get_clusters(box, min(int(zoom) + cluster_precision_offset, 29)),
+                    'total': response['hits']['total']['value']}
+        hits = response['hits'].get('hits', [])
+        result = {'total': response['hits']['total']['value']}
+        result['truncated'] = result['total'] > len(hits)
+        if columns:
+            result['columns'] = hits_to_columns(hits)
+        elif projection == 'marker':
+            result['points'] = [hit_to_marker(hit) for hit in hits]
+        else:
+            result['points'] = [hit_to_dict(hit) for hit in hits]
+        return result
+
+    def get_clusters(self, query, precision):
+        """Geotile clusters of the query's points with counts, centroids and a per type breakdown."""
+        body = {
+            "query": query,
+            "size": 0,
+            "aggs": {
+                "clusters": {
+                    "geotile_grid": {
+                        "field": "location",
+                        "precision": precision,
+                        "size": 10000
+                    },
+                    "aggs": {
+                        "centroid": {"geo_centroid": {"field": "location"}},
+                        "types": {"terms": {"field": "type.keyword"}}
+                    }
+                }
+            }
+        }
+        response = self.es.search(index=self.index, body=body, filter_path=['aggregations'])
+        return [{'key': bucket['key'],
+                 'count': bucket['doc_count'],
+                 'location': bucket['centroid']['location'],
+                 'types': {t['key']: t['doc_count'] for t in bucket['types']['buckets']}}
+                for bucket in response['aggregations']['clusters']['buckets']]
+
+    def get_tile_points(self, top_left, bottom_right, size):
+        """Markers of up to `size` points inside the tile, the same seeded sample every time it holds more."""
+        body = {
+            "query": sampled({
+                "bool": {
+                    "filter": {
+                        "geo_bounding_box": {
+                            "location": {
+                                "top_left": top_left,
+                                "bottom_right": bottom_right
+                            }
+                        }
+                    }
+                }
+            }),
+            "_source": MARKER_FIELDS,
+            "size": size
+        }
+        response = self.es.search(index=self.index, body=body, filter_path=HITS_FILTER_PATH)
+        return {'points': [hit_to_marker(hit) for hit in response['hits'].get('hits', [])],
+                'total': response['hits']['total']['value']}
 
     def get_point(self, point_id):
         response = self.es.get(index=self.index, id=point_id)
-        point = Point.from_dict(body=response)
-        return point.to_dict(with_id=True)
+        return hit_to_dict(response)
 
     def delete_point(self, point_id):
         res = self.es.delete(index=self.index, id=point_id)
@@ -206,7 +408,12 @@ class Elasticsearch:
             return
         raise Exception("Can't delete point")
 
-    def get_my_points(self, sub):
+    def scan_points(self, query=None, size=1000):
+        """Yields raw hits of every point matching the query, scrolling through the index."""
+        body = {"query": query or {"match_all": {}}}
+        return helpers.scan(self.es, index=self.index, query=body, size=size)
+
+    def get_my_points(self, sub, size=10, cursor=None, fields=None):
         body = {
             "query": {
                 "bool": {
@@ -216,49 +423,172 @@ class Elasticsearch:
                         }
                     }
                 }
-            }
+            },
+            "sort": [{POINT_ID_FIELD: "asc"}]
         }
-        response = self.es.search(index=self.index, body=body)
-        read_points = list(map(Point.from_dict, response['hits']['hits']))
-        out_points = [point.to_dict(with_id=True) for point in read_points]
-        return {'points': out_points}
+        return self._page(body, size, cursor, fields)
 
     def get_full_point(self, point_id):
         response = self.es.get(index=self.index, id=point_id)
         point = Point.from_dict(body=response)
         return point.to_index(with_id=True)
 
-    def get_logs(self, point_id=None, size=25, offset=0):
-        body = {"sort": [{"timestamp": {"order": "desc"}}], "from": offset, "size": size}
+    def get_logs(self, point_id=None, size=25, offset=0, start=None, end=None, cursor=None, track_total=True):
+        """Newest first log entries, optionally for one point and between the `start` and `end` datetimes (UTC).
+
+        Only the monthly indices overlapping the range are searched, an empty range (`start`
+        after `end`) doesn't search at all. Deep pages should be fetched with the `next` cursor
+        of the previous page rather than `offset`.
+        """
+        indices = self.log_indices(start, end)
+        if not indices:
+            # An empty index list would be dropped from the path and search the whole cluster.
+            return {"logs": [], "total": 0 if track_total else None, "next": None}
+        body = {"sort": [{"timestamp": {"order": "desc"}}, {LOG_ID_FIELD: "desc"}], "size": size,
+                "track_total_hits": track_total}
+        if cursor is not None:
+            body['search_after'] = decode_cursor(cursor)
+        elif offset:
+            body['from'] = offset
+        filters = []
         if point_id is not None:
-            body['query'] = {'term': {'doc_id.keyword': {'value': point_id}}}
-        response = self.es.search(index=self.index + '_*', body=body)
-        return {"logs": response['hits']['hits'], "total": response['hits']['total']['value']}
+            filters.append({'term': {'doc_id.keyword': {'value': point_id}}})
+        if start is not None or end is not None:
+            bounds = {"format": "yyyy/MM/dd HH:mm:ss"}
+            if start is not None:
+                bounds['gte'] = start.strftime(LOG_TIMESTAMP_FORMAT)
+            if end is not None:
+                bounds['lte'] = end.strftime(LOG_TIMESTAMP_FORMAT)
+            filters.append({'range': {'timestamp': bounds}})
+        if filters:
+            body['query'] = {'bool': {'filter': filters}}
+        response = self.es.search(index=indices, body=body, ignore_unavailable=True,
+                                  allow_no_indices=True)
+        hits = response['hits']['hits']
+        return {"logs": hits, "total": response['hits']['total']['value'] if track_total else None,
+                "next": encode_cursor(hits[-1]['sort']) if len(hits) == size else None}
 
     def modify_point(self, point_id, user_sub, name, operator, address, lat, lon,
-                     point_type, opening_hours, phone, prepare_instruction, waiting_time, owned_by):
-        body = self.es.get(index=self.index, id=point_id)
-        point = Point.from_dict(body=body)
-        changes = point.modify(name=name, operator=operator, address=address, lat=lat, lon=lon,
-                               point_type=point_type, opening_hours=opening_hours, phone=phone,
-                               prepare_instruction=prepare_instruction, waiting_time=waiting_time, owned_by=owned_by)
-        res = self.es.index(index=self.index, id=point_id, body=point.to_index())
+                     point_type, opening_hours, phone, prepare_instruction, waiting_time, owned_by, retries=3,
+                     document=None, owner=None):
+        """Applies the changes with a partial update that only succeeds if nobody modified the point
+        since it was read, re-reading and re-applying them on conflict.
+
+        `document` is the point as already read for this request (e.g. to authorize it), saving
+        the first read. With `owner`, a point re-read after a conflict must still belong to them,
+        NotOwnerError is raised otherwise.
+        """
+        for attempt in range(retries + 1):
+            body = document if attempt == 0 and document is not None else self.es.get(index=self.index, id=point_id)
+            if attempt and owner is not None and body['_source']['owned_by'] != owner:
+                raise NotOwnerError("Point {} was handed over to another user".format(point_id))
+            point = Point.from_dict(body=body)
+            changes = point.modify(name=name, operator=operator, address=address, lat=lat, lon=lon,
+                                   point_type=point_type, opening_hours=opening_hours, phone=phone,
+                                   prepare_instruction=prepare_instruction, waiting_time=waiting_time,
+                                   owned_by=owned_by)
+            try:
+                res = self.es.update(index=self.index, id=point_id, body={'doc': point.to_partial(changes)},
+                                     if_seq_no=body['_seq_no'], if_primary_term=body['_primary_term'], _source=True)
+                break
+            except ConflictError:
+                if attempt == retries:
+                    raise
         if res['result'] == 'updated':
             self.save_log(user_sub=user_sub, doc_id=point_id, name=point.name, changed=changes)
-            return self.get_full_point(point_id=point_id)
-        return res
+        # A noop returns the point as well, the response doesn't depend on whether anything changed.
+        if 'get' in res:
+            point = Point.from_dict(body={'_id': point_id, '_source': res['get']['_source']})
+        return point.to_index(with_id=True)
 
     def add_point(self, name, operator, address, opening_hours, lat, lon, point_type, phone, prepare_instruction,
                   waiting_time, user_sub):
         point = Point.new_point(name=name, operator=operator, address=address, opening_hours=opening_hours, lat=lat,
                                 lon=lon, point_type=point_type, phone=phone,
                                 prepare_instruction=prepare_instruction, waiting_time=waiting_time, user_sub=user_sub)
-        res = self.es.index(index=self.index, body=point.to_index())
+        point_id = new_id()
+        res = self.es.index(index=self.index, id=point_id, body=dict(point.to_index(), **{POINT_ID_FIELD: point_id}))
         if res['result'] == 'created':
             return self.get_point(point_id=res['_id'])
         return res
 
+    def add_image(self, point_id, filename, user_sub):
+        image = {"name": filename, "created_timestamp": datetime.utcnow().strftime("%s"), "created_by": user_sub}
+        body = {
+            "script": {
+                "source": "if (ctx._source.images == null) { ctx._source.images = [params.image] } "
+                          "else if (!ctx._source.images.stream().anyMatch(i -> i.name == params.image.name)) "
+                          "{ ctx._source.images.add(params.image) } else { ctx.op = 'noop' }",
+                "params": {"image": image}
+            }
+        }
+        res = self.es.update(index=self.index, id=point_id, body=body, _source=True)
+        if res['result'] == 'updated':
+            self.save_log(user_sub=user_sub, doc_id=point_id, name=res['get']['_source']['name'],
+                          changed={'images': {'new_value': filename}})
+        return hit_to_dict({'_id': point_id, '_source': res['get']['_source']})
+
+    def set_waiting_times(self, waiting_times, user_sub, reports=None):
+        """Sets the waiting time of many points with one mget and one bulk request, logging every change.
+
+        Only updates that succeeded are logged. Returns the errors of the failed ones by point id.
+        """
+        if not waiting_times:
+            return {}
+        found = self.es.mget(index=self.index, body={'ids': list(waiting_times)},
+                             _source_includes=['name', 'waiting_time'])
+        timestamp = datetime.utcnow().strftime("%s")
+        actions = []
+        documents = {}
+        for doc in found['docs']:
+            if not doc.get('found'):
+                continue
+            old_value = doc['_source'].get('waiting_time')
+            new_value = waiting_times[doc['_id']]
+            if old_value == new_value:
+                continue
+            actions.append({'_op_type': 'update', '_index': self.index, '_id': doc['_id'], 'retry_on_conflict': 3,
+                            'doc': {'waiting_time': new_value, 'last_modified_timestamp': timestamp}})
+            changed = {'waiting_time': {'old_value': old_value, 'new_value': new_value}}
+            if reports is not None:
+                changed['waiting_time']['reports'] = reports.get(doc['_id'])
+            documents[doc['_id']] = log_document(user_sub=user_sub, doc_id=doc['_id'],
+                                                 name=doc['_source'].get('name'), changed=changed)
+        if not actions:
+            return {}
+        _, errors = helpers.bulk(self.es, actions, raise_on_error=False)
+        failed = {}
+        for error in errors:
+            item = next(iter(error.values()))
+            failed[item['_id']] = item.get('error', item.get('status'))
+        if failed:
+            logger.warning("Setting the waiting time of %d points failed: %s", len(failed), failed)
+        documents = [document for point_id, document in documents.items() if point_id not in failed]
+        if self.audit is not None:
+            for document in documents:
+                self.audit.submit(self.log_index(), document)
+        elif documents:
+            helpers.bulk(self.es, [{'_op_type': 'index', '_index': self.log_index(), '_source': document}
+                                   for document in documents])
+        return failed
+
+    def log_index(self, when=None):
+        return ''.join((self.index, (when or datetime.utcnow()).strftime('_%m_%Y')))
+
+    def log_indices(self, start=None, end=None):
+        """Names of the monthly log indices between start and end, all of them without a start."""
+        if start is None:
+            return self.index + '_*'
+        end = end or datetime.utcnow()
+        names, year, month = [], start.year, start.month
+        while (year, month) <= (end.year, end.month):
+            names.append(self.log_index(datetime(year, month, 1)))
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        return ','.join(names)
+
     def save_log(self, user_sub, doc_id, name, changed):
-        document = {"modified_by": user_sub, "doc_id": doc_id, "changes": changed,
-                    "timestamp": datetime.utcnow().strftime("%Y/%m/%d %H:%M:%S"), "name": name}
-        self.es.index(index=''.join((self.index, datetime.today().strftime('_%m_%Y'))), body=document)
+        document = log_document(user_sub=user_sub, doc_id=doc_id, name=name, changed=changed)
+        if self.audit is not None:
+            self.audit.submit(self.log_index(), document)
+        else:
+            self.es.index(index=self.log_index(), body=document)
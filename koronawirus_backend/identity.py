@@ -0,0 +1,166 @@
+import asyncio
+import base64
+import hashlib
+import json
+import threading
+import time
+from collections import Counter
+
+import requests
+from auth0.v3.authentication import Users
+from authlib.jose import JsonWebKey, JsonWebToken
+from authlib.jose.errors import JoseError
+
+from .cache import create_cache
+from .tracing import span
+
+
+APP_METADATA_KEY = 'https://koronapoints.netlify.com/app_metadata'
+# Forged key ids must not be able to make us hammer the JWKS endpoint.
+JWKS_MIN_REFRESH_INTERVAL = 60
+# Outlives any access token Auth0 issues, so a ban outlasts the tokens handed out before it.
+BAN_TTL = 86400
+
+jwt = JsonWebToken(['RS256'])
+
+
+class IdentityError(Exception):
+    pass
+
+
+def token_expiry(token):
+    """Returns the `exp` claim of a JWT without verifying it, or None for opaque tokens."""
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        return int(json.loads(base64.urlsafe_b64decode(payload))['exp'])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+def user_from_claims(claims):
+    """The role comes from the namespaced app_metadata claim. Auth0 only puts it into access
+    tokens when a rule adds it, without one every user in `jwt` mode resolves without a role."""
+    user = {'sub': claims.get('sub')}
+    if claims.get(APP_METADATA_KEY):
+        user['role'] = claims.get(APP_METADATA_KEY).get('role')
+    return user
+
+
+class IdentityResolver:
+    """Resolves access tokens to users, caching the result until the token expires.
+
+    In `userinfo` mode a cache miss costs a round trip to Auth0. In `jwt` mode the
+    token signature is verified locally against the tenant's cached JWKS, so only
+    key rotation requires network I/O.
+
+    Auth0 blocking a user doesn't reach tokens that are already cached, and in `jwt` mode it
+    isn't checked at all since nothing asks Auth0 about the token. `ban` records the user in
+    the cache so their tokens are refused until they would have expired. With the in-process
+    cache that only holds for the process that handled the ban, set CACHE_REDIS_URL to share
+    it between workers.
+    """
+    def __init__(self, domain, audience=None, mode='userinfo', cache=None, ttl=300, jwks_ttl=3600,
+                 protocol='https'):
+        self.domain = domain
+        self.protocol = protocol
+        self.audience = audience
+        self.mode = mode
+        self.cache = cache if cache is not None else create_cache()
+        self.ttl = ttl
+        self.jwks_ttl = jwks_ttl
+        self.counters = Counter()
+        self._jwks = None
+        self._jwks_fetched_at = 0
+        self._jwks_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        cache = create_cache(config['CACHE_REDIS_URL'], maxsize=config['AUTH_CACHE_SIZE'], prefix='identity:')
+        return cls(config['AUTH0_DOMAIN'], audience=config['AUTH0_AUDIENCE'], mode=config['AUTH_MODE'],
+                   cache=cache, ttl=config['AUTH_CACHE_TTL'], jwks_ttl=config['AUTH_JWKS_TTL'])
+
+    def resolve(self, token):
+        key = hashlib.sha256(token.encode()).hexdigest()
+        user = self._cached(key)
+        if user is None:
+            if self.mode == 'jwt':
+                user = self._verify(token)
+            else:
+                user = self._userinfo(token)
+            self._store(key, token, user)
+        return self._check_banned(user)
+
+    async def resolve_async(self, token, runtime):
+        """`resolve` for the async runtime, fetching userinfo without blocking its loop."""
+        key = hashlib.sha256(token.encode()).hexdigest()
+        user = self._cached(key)
+        if user is not None:
+            return self._check_banned(user)
+        if self.mode == 'jwt':
+            # Local verification, only a JWKS refresh does (blocking) I/O so keep it off the loop.
+            user = await asyncio.get_running_loop().run_in_executor(None, self._verify, token)
+        else:
+            self.counters['refresh'] += 1
+            user = await runtime.userinfo(token)
+        return self._check_banned(self._store(key, token, user))
+
+    def ban(self, sub):
+        self.cache.set('banned:' + sub, True, BAN_TTL)
+
+    def _check_banned(self, user):
+        if self.cache.get('banned:{}'.format(user.get('sub'))):
+            raise IdentityError("User {} is banned".format(user.get('sub')))
+        return user
+
+    def _cached(self, key):
+        user = self.cache.get(key)
+        self.counters['hit' if user is not None else 'miss'] += 1
+        return user
+
+    def _store(self, key, token, user):
+        ttl = self.ttl
+        expires_at = token_expiry(token)
+        if expires_at is not None:
+            ttl = min(ttl, expires_at - time.time())
+        self.cache.set(key, user, ttl)
+        return user
+
+    def stats(self):
+        return dict(self.counters)
+
+    def _userinfo(self, token):
+        self.counters['refresh'] += 1
+        with span('auth0.userinfo'):
+            return user_from_claims(Users(self.domain, protocol=self.protocol).userinfo(token))
+
+    def _key_set(self, force=False):
+        with self._jwks_lock:
+            age = time.monotonic() - self._jwks_fetched_at
+            if self._jwks is None or age > self.jwks_ttl or (force and age > JWKS_MIN_REFRESH_INTERVAL):
+                self.counters['refresh'] += 1
+                with span('auth0.jwks'):
+                    response = requests.get('https://{}/.well-known/jwks.json'.format(self.domain), timeout=5)
+                    response.raise_for_status()
+                self._jwks = JsonWebKey.import_key_set(response.json())
+                self._jwks_fetched_at = time.monotonic()
+            return self._jwks
+
+    def _verify(self, token):
+        claims_options = {'iss': {'essential': True, 'value': 'https://{}/'.format(self.domain)}}
+        if self.audience:
+            claims_options['aud'] = {'essential': True, 'value': self.audience}
+        try:
+            try:
+                claims = jwt.decode(token, self._key_set(), claims_options=claims_options)
+            except ValueError:
+                # Unknown key id, the tenant has most likely rotated its signing keys.
+                claims = jwt.decode(token, self._key_set(force=True), claims_options=claims_options)
+            claims.validate()
+        except (JoseError, ValueError) as e:
+            raise IdentityError(str(e))
+        return user_from_claims(claims)
+
+
+def init_app(app):
+    app.extensions['identity'] = IdentityResolver.from_config(app.config)
@@ -1,27 +1,33 @@
-import boto3
-from botocore.exceptions import ClientError
-import datetime
-import hashlib
 import os
 from werkzeug.utils import secure_filename
 
-from flask import Blueprint, current_app, Flask, jsonify, redirect, render_template, request
+from flask import abort, Blueprint, current_app, Flask, jsonify, redirect, render_template, request
 
-from .auth import requires_auth
-from .elastic import Elasticsearch
-
-from rabbit_queue import RabbitQueue
+from .auth import check_rights, requires_auth
+from .cache import create_cache
+from .connections import get_elastic
+from .image_pipeline import ImagePipeline
+from .storage import content_file_name, hash_file
+from .tracing import span
 
 
+IMAGE_MIMETYPES = {'image/jpeg': 'jpg', 'image/png': 'png'}
 
 images = Blueprint('images', __name__)
 
 
 @images.route('/add_image/<point_id>', methods=['POST'])
 @requires_auth
+@check_rights
 def add_image(point_id, user):
     sub = user['sub']
     point_id = secure_filename(point_id)
+    if request.mimetype in IMAGE_MIMETYPES:
+        # Raw body upload, piped straight into the store without Werkzeug spooling it first.
+        filename = request.args.get('filename', 'image.' + IMAGE_MIMETYPES[request.mimetype])
+        if not allowed_file(filename):
+            abort(400)
+        return upload_image(point_id, request.stream, filename, request.mimetype, sub)
     # check if the post request has the file part
     if 'file' not in request.files:
         return redirect(request.url)
@@ -31,14 +37,66 @@ def add_image(point_id, user):
     if file.filename == '':
         return redirect(request.url)
     if file and allowed_file(file.filename):
-        filename = get_new_file_name(file)
+        return upload_image(point_id, file.stream, file.filename, file.mimetype, sub)
+
+
+@images.route('/image_status/<job_id>', methods=['GET'])
+@requires_auth
+def image_status(job_id, user):
+    pipeline = current_app.extensions.get('image_pipeline')
+    job = pipeline.status(job_id) if pipeline is not None else None
+    if job is None or job['user_sub'] != user['sub']:
+        abort(404)
+    job = dict(job)
+    job.pop('user_sub')
+    return job
+
+
+def upload_image(point_id, image_file, original_filename, mimetype, user_sub):
+    """Stores the upload right away, or queues it when the image pipeline is enabled."""
+    pipeline = current_app.extensions.get('image_pipeline')
+    if pipeline is None:
+        return store_image(point_id, image_file, original_filename, mimetype, user_sub)
+    with span('image.spool'):
+        job_id = pipeline.submit(point_id, image_file, original_filename, mimetype, user_sub)
+    if job_id is None:
+        abort(503)
+    return {'job_id': job_id, 'status': 'queued'}, 202
+
+
+def store_image(point_id, image_file, original_filename, mimetype, user_sub, digest=None):
+    """Stores the image under its content hash, hands it over to the resizer and attaches it to the point.
+
+    Content that is already stored for the point is neither uploaded nor resized again, a
+    duplicate only costs the existence check.
+    """
+    storage = current_app.extensions['storage']
+    extension = original_filename.rsplit('.', 1)[1].lower()
+    if digest is None and image_file.seekable():
+        digest = hash_file(image_file)
+    if digest is not None:
+        filename = content_file_name(digest, extension)
+        with span('storage.exists'):
+            is_new = not storage.exists(os.path.join(point_id, filename))
+        if is_new:
+            create_image_directory(point_id)
+            with span('storage.upload'):
+                storage.store(image_file, os.path.join(point_id, filename), mimetype)
+    else:
+        # The content is staged in the directory before it's known whether it's new.
         create_image_directory(point_id)
-        upload_file(file, os.path.join(point_id, filename))
-        image_queue = RabbitQueue(current_app.config['QUEUE_NAME'])
-        image_queue.publish(body=os.path.join(point_id, filename))
-        es = Elasticsearch(current_app.config['ES_CONNECTION_STRING'], index=current_app.config['INDEX_NAME'])
-        res = es.add_image(point_id, filename, sub)
-        return res
+        with span('storage.upload'):
+            filename, is_new = storage.store_stream(image_file, point_id, extension, mimetype)
+    if is_new:
+        with span('queue.publish'):
+            current_app.extensions['image_queue'].publish(os.path.join(point_id, filename))
+    es = get_elastic()
+    return es.add_image(point_id, filename, user_sub)
+
+
+def store_spooled_image(point_id, spool_path, original_filename, mimetype, user_sub, digest):
+    with open(spool_path, 'rb') as image_file:
+        return store_image(point_id, image_file, original_filename, mimetype, user_sub, digest=digest)
 
 
 def allowed_file(filename):
@@ -46,37 +104,12 @@ def allowed_file(filename):
 
 
 def create_image_directory(path):
-    store_property = current_app.config['STORE_PROPERTY'].split('//', 1)[1]
-
-    if current_app.config['STORE_PROPERTY'].startswith('file://'):
-        try:
-            os.mkdir(os.path.join(store_property, path))
-        except FileExistsError:
-            pass
-    elif current_app.config['STORE_PROPERTY'].startswith('s3://'):
-        try:
-            s3_client = boto3.client('s3')
-            s3_client.put_object(Bucket=store_property, Key=(path + '/'))
-        except ClientError as e:
-            raise
-
-
-def upload_file(file_object, filename):
-    store_property = current_app.config['STORE_PROPERTY'].split('//', 1)[1]
-
-    if current_app.config['STORE_PROPERTY'].startswith('file://'):
-        file_object.save(os.path.join(store_property, filename))
-    elif current_app.config['STORE_PROPERTY'].startswith('s3://'):
-        try:
-            s3_client = boto3.client('s3')
-            s3_client.upload_fileobj(file_object, store_property, filename,
-                                     ExtraArgs={'ACL': 'public-read', 'ContentType': file_object.mimetype})
-        except ClientError as e:
-            raise
-
-
-def get_new_file_name(image_file):
-    timestamp = datetime.datetime.utcnow().strftime("%s.%f")
-    timestamped_filename = hashlib.md5(os.path.join(timestamp + '_' + image_file.filename).encode()).hexdigest() + '.'\
-                           + image_file.filename.rsplit('.', 1)[1].lower()
-    return secure_filename(timestamped_filename)
+    current_app.extensions['storage'].create_directory(path)
+
+
+def init_app(app):
+    if app.config['IMAGE_ASYNC']:
+        jobs = create_cache(app.config['CACHE_REDIS_URL'], prefix='image-job:')
+        app.extensions['image_pipeline'] = ImagePipeline(
+            app, store_spooled_image, app.config['IMAGE_SPOOL_DIR'], workers=app.config['IMAGE_WORKERS'],
+            max_pending=app.config['IMAGE_MAX_PENDING'], jobs=jobs)
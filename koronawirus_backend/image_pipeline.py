@@ -0,0 +1,133 @@
+import glob
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from .audit import pid_alive
+from .cache import create_cache
+from .storage import HashingReader
+
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+
+class ImagePipeline:
+    """Takes image uploads off the request thread.
+
+    The request only spools the upload to `spool_dir` and gets a job id back. A pool of
+    `workers` threads stores the image, publishes it to the resizer queue and attaches it
+    to the point. At most `max_pending` jobs may be queued or running per process. Job
+    states live in the cache backend so any worker can answer status requests.
+
+    Every spooled upload has a `<job id>.<pid>.json` file next to it describing the job.
+    Jobs of a process that died are re-queued by the next process starting its workers,
+    and spool files without a job are removed once they are older than `job_ttl`.
+    """
+    def __init__(self, app, process, spool_dir, workers=4, max_pending=32, job_ttl=3600, jobs=None):
+        self.app = app
+        self.process = process
+        self.spool_dir = spool_dir
+        self.workers = workers
+        self.max_pending = max_pending
+        self.job_ttl = job_ttl
+        self.jobs = jobs if jobs is not None else create_cache()
+        self._executor = None
+        self._pending = None
+        self._pid = None
+        self._lock = threading.Lock()
+        os.makedirs(spool_dir, exist_ok=True)
+
+    def _ensure_executor(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='images')
+                    self._pending = threading.BoundedSemaphore(self.max_pending)
+                    self._pid = os.getpid()
+                    self._recover()
+
+    def _set_status(self, job_id, **job):
+        self.jobs.set(job_id, job, self.job_ttl)
+
+    def status(self, job_id):
+        return self.jobs.get(job_id)
+
+    def _job_path(self, job_id, pid=None):
+        return os.path.join(self.spool_dir, '{}.{}.json'.format(job_id, pid or os.getpid()))
+
+    def submit(self, point_id, stream, filename, mimetype, user_sub):
+        """Spools the upload and queues it, returns the job id or None when the pipeline is saturated."""
+        self._ensure_executor()
+        if not self._pending.acquire(blocking=False):
+            return None
+        job_id = uuid.uuid4().hex
+        spool_path = os.path.join(self.spool_dir, job_id)
+        reader = HashingReader(stream)
+        job = {'job_id': job_id, 'point_id': point_id, 'original_filename': filename, 'mimetype': mimetype,
+               'user_sub': user_sub}
+        try:
+            with open(spool_path, 'wb') as spool:
+                shutil.copyfileobj(reader, spool, CHUNK_SIZE)
+            job['digest'] = reader.hexdigest()
+            with open(self._job_path(job_id) + '.tmp', 'w') as job_file:
+                json.dump(job, job_file)
+            os.replace(self._job_path(job_id) + '.tmp', self._job_path(job_id))
+        except Exception:
+            self._pending.release()
+            raise
+        self._queue(job)
+        return job_id
+
+    def _queue(self, job):
+        self._set_status(job['job_id'], status='queued', point_id=job['point_id'], user_sub=job['user_sub'])
+        self._executor.submit(self._run, **job)
+
+    def _recover(self):
+        """Re-queues the jobs of dead processes and removes spool files no job refers to."""
+        for path in glob.glob(os.path.join(self.spool_dir, '*.*.json')):
+            job_id, pid = os.path.basename(path)[:-len('.json')].split('.', 1)
+            if int(pid) != os.getpid() and pid_alive(int(pid)):
+                continue
+            if not self._pending.acquire(blocking=False):
+                return
+            try:
+                # Whoever renames the job first owns it.
+                os.rename(path, self._job_path(job_id))
+                with open(self._job_path(job_id)) as job_file:
+                    job = json.load(job_file)
+            except (OSError, ValueError):
+                self._pending.release()
+                continue
+            logger.info("Re-queuing image job %s of process %s", job_id, pid)
+            self._queue(job)
+        jobs = {os.path.basename(path).split('.', 1)[0]
+                for path in glob.glob(os.path.join(self.spool_dir, '*.json'))}
+        for path in glob.glob(os.path.join(self.spool_dir, '*')):
+            name = os.path.basename(path)
+            if '.' not in name and name not in jobs and time.time() - os.path.getmtime(path) > self.job_ttl:
+                os.remove(path)
+
+    def _run(self, job_id, point_id, original_filename, mimetype, user_sub, digest):
+        spool_path = os.path.join(self.spool_dir, job_id)
+        try:
+            self._set_status(job_id, status='processing', point_id=point_id, user_sub=user_sub)
+            with self.app.app_context():
+                result = self.process(point_id, spool_path, original_filename, mimetype, user_sub, digest)
+            self._set_status(job_id, status='done', point_id=point_id, user_sub=user_sub, result=result)
+        except Exception as e:
+            logger.exception("Processing image job %s failed", job_id)
+            self._set_status(job_id, status='failed', point_id=point_id, user_sub=user_sub, error=str(e))
+        finally:
+            self._pending.release()
+            for path in (spool_path, self._job_path(job_id)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
@@ -10,10 +10,12 @@ from flask import Flask, jsonify, redirect, render_template, request
 from flask_cors import CORS
 from flask_gzip import Gzip
 
-from . import constants
+from . import (aio, audit, availability, connections, constants, identity, image, publisher, response_cache,
+               serialization, spatial, storage, tracing)
 from .image import images
 from .logs import logs
 from .points import points
+from .tiles import tiles
 from .user_management import user_mgmt
 
 
@@ -22,7 +24,7 @@ def configure_blueprints(app):
     """Configure blueprints in views."""
 
     with app.app_context():
-        for bp in [images, logs, points, user_mgmt]:
+        for bp in [images, logs, points, tiles, user_mgmt]:
             app.register_blueprint(bp)
 
 
@@ -34,11 +36,64 @@ def configure_dashboard(app):
     dashboard.config.init_from(file=env.get(constants.DASHBOARD_CONFIG_FILE_PATH))
     dashboard.bind(app)
 
+    resolver = app.extensions['identity']
+    for counter in ['hit', 'miss', 'refresh']:
+        dashboard.add_graph('Identity cache {}'.format(counter),
+                            lambda counter=counter: resolver.counters[counter], 'interval', minutes=1)
+
+    cache = app.extensions.get('response_cache')
+    if cache is not None:
+        for endpoint in ['get_point', 'get_points', 'get_nearest', 'search_points']:
+            dashboard.add_graph('Response cache hit rate {}'.format(endpoint),
+                                lambda endpoint=endpoint: cache.hit_rate(endpoint), 'interval', minutes=1)
+
 
 def configure_app(app, config):
     app.config.from_object(config)
 
 
+def configure_json(app):
+    app.json = serialization.JSONProvider(app)
+
+
+def configure_tracing(app):
+    tracing.init_app(app)
+
+
+def configure_elasticsearch(app):
+    connections.init_app(app)
+
+
+def configure_async(app):
+    aio.init_app(app)
+
+
+def configure_audit(app):
+    audit.init_app(app)
+
+
+def configure_nearest_index(app):
+    spatial.init_app(app)
+
+
+def configure_response_cache(app):
+    response_cache.init_app(app)
+
+
+def configure_image_pipeline(app):
+    storage.init_app(app)
+    publisher.init_app(app)
+    image.init_app(app)
+
+
+def configure_availability(app):
+    availability.init_app(app)
+
+
+def configure_auth(app):
+    identity.init_app(app)
+
+
 def configure_error_handlers(app):
     @app.errorhandler(Exception)
     def handle_auth_error(ex):
@@ -60,8 +115,20 @@ def configure_compression(app):
 def create_app(config):
     app = Flask(__name__, static_url_path='/public', static_folder='./public')
     configure_app(app, config)
+    configure_json(app)
+    configure_tracing(app)
+    configure_elasticsearch(app)
+    configure_async(app)
+    configure_audit(app)
+    configure_auth(app)
+    configure_nearest_index(app)
+    configure_response_cache(app)
+    configure_availability(app)
+    if app.config['IMAGES_ENABLED']:
+        configure_image_pipeline(app)
     configure_blueprints(app)
-    configure_dashboard(app)
+    if app.config['DASHBOARD_ENABLED']:
+        configure_dashboard(app)
     configure_home(app)
     configure_compression(app)
 
@@ -1,22 +1,38 @@
-from flask import Blueprint, current_app, request
-from .auth import requires_auth
-from .elastic import Elasticsearch
+from datetime import datetime, timezone
 
+from flask import abort, Blueprint, request
+from .auth import requires_auth
+from .connections import get_elastic
 
+MAX_LOGS_PAGE_SIZE = 500
 
 logs = Blueprint('logs', __name__, )
 
 
+def parse_datetime(value):
+    if value is None:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        abort(400)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
 @logs.route('/get_logs', methods=['POST'])
 @requires_auth
 def get_logs(user):
-    if user['role'] == 'moderator':
-        params = request.json
-        es = Elasticsearch(current_app.config['ES_CONNECTION_STRING'], index=current_app.config['INDEX_NAME'])
+    if user.get('role') == 'moderator':
+        params = request.get_json(silent=True) or {}
+        es = get_elastic()
+        offset = params.get('offset', 0)
         try:
-            size = params.get('size', 25)
-            offset = params.get('offset', 0)
-            return es.get_logs(point_id=params.get('id'), size=size, offset=offset)
-        except AttributeError:
-            return es.get_logs()
-    raise Exception("Not allowed")
+            size = min(int(params.get('size', 25)), MAX_LOGS_PAGE_SIZE)
+            return es.get_logs(point_id=params.get('id'), size=size, offset=offset,
+                               start=parse_datetime(params.get('from')), end=parse_datetime(params.get('to')),
+                               cursor=params.get('cursor'), track_total=params.get('track_total', True))
+        except ValueError:
+            abort(400)
+    abort(403)
@@ -0,0 +1,190 @@
+"""Index templates for the points and log indices and alias based reindexing.
+
+The points index is addressed through an alias named INDEX_NAME pointing at a versioned
+index `<INDEX_NAME>-v<n>`, so a mapping change is a reindex into the next version and an
+atomic alias swap. Monthly log indices `<INDEX_NAME>_<mm>_<yyyy>` pick their mapping up
+from a template when they're first written to.
+"""
+import re
+import time
+
+from elasticsearch.exceptions import NotFoundError
+
+
+# Kept as a keyword subfield where the code still queries `<field>.keyword`, as the dynamic mapping did.
+KEYWORD_SUBFIELD = {"keyword": {"type": "keyword", "ignore_above": 256}}
+
+POINT_PROPERTIES = {
+    # Copy of the document id, listings sort on it to break ties.
+    "point_id": {"type": "keyword"},
+    "name": {"type": "text"},
+    "operator": {"type": "text"},
+    "address": {"type": "text"},
+    "location": {"type": "geo_point"},
+    "type": {"type": "keyword", "fields": KEYWORD_SUBFIELD},
+    "waiting_time": {"type": "keyword"},
+    "owned_by": {"type": "keyword"},
+    "opening_hours": {"type": "text", "index": False},
+    "phone": {"type": "keyword", "index": False, "doc_values": False},
+    "prepare_instruction": {"type": "text", "index": False},
+    "last_modified_timestamp": {"type": "date", "format": "epoch_second", "fields": KEYWORD_SUBFIELD},
+    "images": {
+        "properties": {
+            "name": {"type": "keyword"},
+            "created_timestamp": {"type": "date", "format": "epoch_second"},
+            "created_by": {"type": "keyword"}
+        }
+    }
+}
+
+LOG_PROPERTIES = {
+    # Copy of the document id, the log listing sorts on it to break ties.
+    "log_id": {"type": "keyword"},
+    "doc_id": {"type": "keyword", "fields": KEYWORD_SUBFIELD},
+    "name": {"type": "text"},
+    "modified_by": {"type": "keyword"},
+    "timestamp": {"type": "date", "format": "yyyy/MM/dd HH:mm:ss"},
+    # Old and new values have different types per field, they're only ever returned, never queried.
+    "changes": {"type": "object", "enabled": False}
+}
+
+
+class ReindexError(Exception):
+    pass
+
+
+def check_reindexed(response):
+    """Raises ReindexError unless every document the reindex read was written to the target."""
+    if response.get('failures'):
+        raise ReindexError("{} documents failed to reindex, first: {}".format(
+            len(response['failures']), response['failures'][0]))
+    written = response.get('created', 0) + response.get('updated', 0) + response.get('noops', 0)
+    if written != response.get('total', 0):
+        raise ReindexError("Reindexed {} of {} documents".format(written, response.get('total', 0)))
+
+
+def points_template(index, refresh_interval='1s', replicas=1):
+    return {
+        "index_patterns": [index + '-v*'],
+        "order": 1,
+        "settings": {"number_of_shards": 1, "number_of_replicas": replicas, "refresh_interval": refresh_interval},
+        "mappings": {"properties": POINT_PROPERTIES}
+    }
+
+
+def logs_template(index, refresh_interval='30s', replicas=1):
+    return {
+        "index_patterns": [index + '_*'],
+        "order": 1,
+        "settings": {"number_of_shards": 1, "number_of_replicas": replicas, "refresh_interval": refresh_interval,
+                     "codec": "best_compression"},
+        "mappings": {"properties": LOG_PROPERTIES}
+    }
+
+
+def add_id_field(es, index, field, properties, request_timeout=3600):
+    """Maps `field` in the existing `index` and copies the document id into it where it's missing.
+
+    Index templates only reach indices created after them, this brings the older ones
+    up to date. Run it before deploying code that sorts on the field.
+    """
+    es.indices.put_mapping(index=index, body={"properties": {field: properties[field]}})
+    es.update_by_query(index=index, body={
+        "query": {"bool": {"must_not": {"exists": {"field": field}}}},
+        "script": {"source": "ctx._source[params.field] = ctx._id", "params": {"field": field}}
+    }, conflicts='proceed', refresh=True, wait_for_completion=True, request_timeout=request_timeout)
+
+
+def put_templates(es, index, points_refresh_interval='1s', logs_refresh_interval='30s', replicas=1):
+    es.indices.put_template(name=index + '-points', body=points_template(index, points_refresh_interval, replicas))
+    es.indices.put_template(name=index + '-logs', body=logs_template(index, logs_refresh_interval, replicas))
+
+
+def versioned_index(alias, version):
+    return '{}-v{}'.format(alias, version)
+
+
+def index_version(alias, name):
+    match = re.fullmatch(re.escape(alias) + r'-v(\d+)', name)
+    return int(match.group(1)) if match else None
+
+
+def aliased_indices(es, alias):
+    try:
+        return sorted(es.indices.get_alias(name=alias))
+    except NotFoundError:
+        return []
+
+
+def next_version(es, alias):
+    versions = [index_version(alias, name) for name in es.indices.get(index=alias + '-v*')]
+    return max([version for version in versions if version is not None], default=0) + 1
+
+
+def create(es, alias):
+    """Creates the first versioned index behind the alias, unless the alias already exists."""
+    if aliased_indices(es, alias) or es.indices.exists(index=alias):
+        return None
+    index = versioned_index(alias, next_version(es, alias))
+    es.indices.create(index=index, body={"aliases": {alias: {}}})
+    return index
+
+
+def template_settings(es, alias):
+    """Refresh interval and replica count the points template would give a new index."""
+    try:
+        template = es.indices.get_template(name=alias + '-points')[alias + '-points']
+    except NotFoundError:
+        template = {}
+    settings = template.get('settings', {}).get('index', {})
+    return {"refresh_interval": settings.get('refresh_interval', '1s'),
+            "number_of_replicas": settings.get('number_of_replicas', 1)}
+
+
+def reindex(es, alias, delete_old=False, request_timeout=3600):
+    """Copies the documents behind `alias` into a new versioned index and swaps the alias.
+
+    Reads are served by the old index until the atomic alias swap. Writes keep going to the
+    old index while the bulk of the copy runs and are only rejected during the short final
+    pass copying documents modified since the copy started. The old index is left read
+    only for a rollback unless `delete_old` is set. Only changes that bump
+    last_modified_timestamp are caught by the final pass, deletions and image uploads made
+    during the copy are not, so run it at a quiet time. A concrete index named like the alias
+    (created before aliases were used) is migrated the same way and removed in the swap.
+
+    Documents the new mapping rejects fail the reindex with a ReindexError before the alias is
+    swapped, leaving the old index in place and writable.
+    """
+    sources = aliased_indices(es, alias)
+    concrete = not sources and es.indices.exists(index=alias)
+    if concrete:
+        sources = [alias]
+    if not sources:
+        raise ValueError("No index behind {}".format(alias))
+    target = versioned_index(alias, next_version(es, alias))
+    es.indices.create(index=target, body={"settings": {"refresh_interval": "-1", "number_of_replicas": 0}})
+    started = str(int(time.time()) - 1)
+    check_reindexed(es.reindex(body={"source": {"index": sources}, "dest": {"index": target}},
+                               wait_for_completion=True, request_timeout=request_timeout))
+    es.indices.put_settings(index=sources, body={"index": {"blocks": {"write": True}}})
+    try:
+        modified = {"range": {"last_modified_timestamp.keyword": {"gte": started}}}
+        check_reindexed(es.reindex(body={"source": {"index": sources, "query": modified}, "dest": {"index": target}},
+                                   refresh=True, wait_for_completion=True, request_timeout=request_timeout))
+        # Deletions made during the copy can only leave the target with more documents, never fewer.
+        expected, copied = es.count(index=sources)['count'], es.count(index=target)['count']
+        if copied < expected:
+            raise ReindexError("{} holds {} of the {} documents".format(target, copied, expected))
+        es.indices.put_settings(index=target, body={"index": template_settings(es, alias)})
+        actions = [{"add": {"index": target, "alias": alias}}]
+        if concrete:
+            actions.append({"remove_index": {"index": alias}})
+        else:
+            actions.extend({"remove": {"index": source, "alias": alias}} for source in sources)
+        es.indices.update_aliases(body={"actions": actions})
+    except Exception:
+        es.indices.put_settings(index=sources, body={"index": {"blocks": {"write": False}}})
+        raise
+    if delete_old and not concrete:
+        es.indices.delete(index=sources)
+    return target
@@ -1,21 +1,64 @@
 from flask import abort, Blueprint, current_app, request
 from .auth import requires_auth, moderator, check_rights
-from .elastic import Elasticsearch, NotDefined
+from .connections import get_document, get_elastic
+from .elastic import decode_cursor, NotDefined, NotOwnerError, POINT_FIELDS
+from .response_cache import cached, invalidate, invalidates_cache
+
+MAX_NEAREST = 50
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 100
+POINT_PROJECTIONS = ('full', 'marker')
+POINT_FORMATS = ('objects', 'columns')
+# Highest precision a geotile_grid aggregation accepts.
+MAX_ZOOM = 29
 
 points = Blueprint('points', __name__, )
 
 
+def page_params(params):
+    """Validated (size, cursor, fields) of a paginated listing request."""
+    try:
+        size = min(int(params.get('size', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        cursor = params.get('cursor')
+        if cursor is not None:
+            decode_cursor(cursor)
+    except (TypeError, ValueError):
+        abort(400)
+    fields = params.get('fields')
+    if size < 1 or fields is not None and (not isinstance(fields, list) or not set(fields) <= set(POINT_FIELDS)):
+        abort(400)
+    return size, cursor, fields
+
+
 @points.route('/get_points', methods=['POST'])
+@cached('get_points')
 def get_points():
     boundaries = request.json
-    es = Elasticsearch(current_app.config['ES_CONNECTION_STRING'], index=current_app.config['INDEX_NAME'])
-    return es.get_points(boundaries['top_right'], boundaries['bottom_left'])
+    budget = current_app.config['POINTS_BUDGET']
+    try:
+        size = min(int(boundaries.get('limit', budget)), budget)
+    except (TypeError, ValueError):
+        abort(400)
+    projection = boundaries.get('projection', 'full')
+    response_format = boundaries.get('format', 'objects')
+    if size < 1 or projection not in POINT_PROJECTIONS or response_format not in POINT_FORMATS:
+        abort(400)
+    zoom = boundaries.get('zoom')
+    if zoom is not None and (type(zoom) is not int or not 0 <= zoom <= MAX_ZOOM):
+        abort(400)
+    es = get_elastic()
+    # Clusters come back in one shape, the projection and format only apply when points are returned.
+    return es.get_points(boundaries['top_right'], boundaries['bottom_left'], zoom=zoom,
+                         cluster_threshold=current_app.config['CLUSTER_MAX_POINTS'],
+                         cluster_precision_offset=current_app.config['CLUSTER_PRECISION_OFFSET'],
+                         size=size, projection=projection, columns=response_format == 'columns')
 
 
 @points.route('/get_point', methods=['POST'])
+@cached('get_point')
 def get_point():
     params = request.json
-    es = Elasticsearch(current_app.config['ES_CONNECTION_STRING'], index=current_app.config['INDEX_NAME'])
+    es = get_elastic()
     return es.get_point(point_id=params['id'])
 
 
@@ -23,32 +66,47 @@ def get_point():
 @requires_auth
 def get_full_point(user):
     params = request.json
-    es = Elasticsearch(current_app.config['ES_CONNECTION_STRING'], index=current_app.config['INDEX_NAME'])
+    es = get_elastic()
     return es.get_full_point(point_id=params['id'])
 
 
 @points.route('/delete_point', methods=['POST'])
-def delete_point():
+@invalidates_cache
+@requires_auth
+@check_rights
+def delete_point(user):
     params = request.json
-    es = Elasticsearch(current_app.config['ES_CONNECTION_STRING'], index=current_app.config['INDEX_NAME'])
-    return es.delete_point(point_id=params['id'])
+    es = get_elastic()
+    res = es.delete_point(point_id=params['id'])
+    if 'nearest_index' in current_app.extensions:
+        current_app.extensions['nearest_index'].discard(params['id'])
+    return res
 
 
 @points.route('/get_nearest', methods=['POST'])
+@cached('get_nearest')
 def get_nearest():
     params = request.json
     location = params['location']
-    es = Elasticsearch(current_app.config['ES_CONNECTION_STRING'], index=current_app.config['INDEX_NAME'])
-    return es.get_nearest(location=location)
+    point_types = params.get('types', ['hospital', 'transport'])
+    k = params.get('k')
+    if k is not None and (type(k) is not int or k < 1):
+        abort(400)
+    if not isinstance(point_types, list) or not all(isinstance(point_type, str) for point_type in point_types):
+        abort(400)
+    es = current_app.extensions.get('nearest_index') or get_elastic()
+    return es.get_nearest(location=location, point_types=point_types,
+                          k=min(k, MAX_NEAREST) if k is not None else None)
 
 
 @points.route('/add_point', methods=['POST'])
+@invalidates_cache
 @requires_auth
 @moderator
 def add_point(user):
     req_json = request.json
     sub = user['sub']
-    es = Elasticsearch(current_app.config['ES_CONNECTION_STRING'], index=current_app.config['INDEX_NAME'])
+    es = get_elastic()
     return es.add_point(name=req_json['name'], operator=req_json['operator'], address=req_json['address'],
                         lat=req_json['lat'], lon=req_json['lon'], point_type=req_json['type'],
                         opening_hours=req_json['opening_hours'], phone=req_json.get('phone'),
@@ -60,31 +118,38 @@ def add_point(user):
 @requires_auth
 def get_my_points(user):
     sub = user['sub']
-    es = Elasticsearch(current_app.config['ES_CONNECTION_STRING'], index=current_app.config['INDEX_NAME'])
-    return es.get_my_points(sub)
+    size, cursor, fields = page_params(request.get_json(silent=True) or {})
+    es = get_elastic()
+    return es.get_my_points(sub, size=size, cursor=cursor, fields=fields)
 
 
 @points.route('/modify_point', methods=['POST'])
+@invalidates_cache
 @requires_auth
 @check_rights
 def modify_point(user):
     req_json = request.json
     sub = user['sub']
-    es = Elasticsearch(current_app.config['ES_CONNECTION_STRING'], index=current_app.config['INDEX_NAME'])
-    return es.modify_point(point_id=req_json['id'], name=req_json.get('name', NotDefined()),
-                           operator=req_json.get('operator', NotDefined()),
-                           address=req_json.get('address', NotDefined()),
-                           lat=str(req_json['lat']) if type(req_json.get('lat', NotDefined())) is not NotDefined \
-                               else NotDefined(),
-                           lon=str(req_json['lon']) if type(req_json.get('lon', NotDefined())) is not NotDefined \
-                               else NotDefined(),
-                           point_type=req_json.get('type', NotDefined()),
-                           opening_hours=req_json.get('opening_hours', NotDefined()),
-                           phone=req_json.get('phone', NotDefined()),
-                           prepare_instruction=req_json.get('prepare_instruction', NotDefined()),
-                           owned_by=req_json.get('owned_by', NotDefined()),
-                           waiting_time=req_json.get('waiting_time', NotDefined()),
-                           user_sub=sub)
+    es = get_elastic()
+    try:
+        return es.modify_point(point_id=req_json['id'], name=req_json.get('name', NotDefined()),
+                               operator=req_json.get('operator', NotDefined()),
+                               address=req_json.get('address', NotDefined()),
+                               lat=str(req_json['lat']) if type(req_json.get('lat', NotDefined())) is not NotDefined \
+                                   else NotDefined(),
+                               lon=str(req_json['lon']) if type(req_json.get('lon', NotDefined())) is not NotDefined \
+                                   else NotDefined(),
+                               point_type=req_json.get('type', NotDefined()),
+                               opening_hours=req_json.get('opening_hours', NotDefined()),
+                               phone=req_json.get('phone', NotDefined()),
+                               prepare_instruction=req_json.get('prepare_instruction', NotDefined()),
+                               owned_by=req_json.get('owned_by', NotDefined()),
+                               waiting_time=req_json.get('waiting_time', NotDefined()),
+                               user_sub=sub, document=get_document(req_json['id']),
+                               owner=None if user.get('role') == 'moderator' else sub)
+    except NotOwnerError:
+        # Handed over to someone else while the edit was being retried.
+        abort(403)
 
 
 @points.route('/set_availability', methods=['POST'])
@@ -93,27 +158,34 @@ def set_availability():
     availability = params['availability']
     if availability not in ['short', 'moderate', 'long']:
         abort(500)
-    es = Elasticsearch(current_app.config['ES_CONNECTION_STRING'], index=current_app.config['INDEX_NAME'])
-    return es.modify_point(point_id=params['id'], waiting_time=params['availability'], user_sub='anonymous',
-                           name=NotDefined(),
-                           operator=NotDefined(),
-                           address=NotDefined(),
-                           lat=NotDefined(),
-                           lon=NotDefined(),
-                           point_type=NotDefined(),
-                           opening_hours=NotDefined(),
-                           phone=NotDefined(),
-                           prepare_instruction=NotDefined(),
-                           owned_by=NotDefined())
+    if 'availability' in current_app.extensions:
+        current_app.extensions['availability'].report(point_id=params['id'], availability=availability)
+        return {'status': 'accepted'}, 202
+    es = get_elastic()
+    res = es.modify_point(point_id=params['id'], waiting_time=params['availability'], user_sub='anonymous',
+                          name=NotDefined(),
+                          operator=NotDefined(),
+                          address=NotDefined(),
+                          lat=NotDefined(),
+                          lon=NotDefined(),
+                          point_type=NotDefined(),
+                          opening_hours=NotDefined(),
+                          phone=NotDefined(),
+                          prepare_instruction=NotDefined(),
+                          owned_by=NotDefined())
+    invalidate()
+    return res
 
 
 @points.route('/search_points', methods=['POST'])
+@cached('search_points')
 def search_points():
     params = request.json
     phrase = params['phrase']
     point_type = params.get('point_type', None)
     top_right = params.get('top_right', None)
     bottom_left = params.get('bottom_left', None)
+    size, cursor, fields = page_params(params)
 
-    es = Elasticsearch(current_app.config['ES_CONNECTION_STRING'], index=current_app.config['INDEX_NAME'])
-    return es.search_points(phrase, point_type, top_right, bottom_left)
+    es = get_elastic()
+    return es.search_points(phrase, point_type, top_right, bottom_left, size=size, cursor=cursor, fields=fields)
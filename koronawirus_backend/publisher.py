@@ -0,0 +1,140 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import pika
+
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxFull(Exception):
+    pass
+
+
+class PikaChannel:
+    """Transactional channel on a blocking pika connection.
+
+    Messages published since the last `commit` are confirmed by the broker together in
+    one round trip, or not at all. The queue is owned by the resizer, it's only checked to
+    exist so its durability and arguments are kept as they were declared.
+    """
+    def __init__(self, url, queue_name):
+        self.queue_name = queue_name
+        self.connection = pika.BlockingConnection(pika.URLParameters(url))
+        self.channel = self.connection.channel()
+        self.channel.queue_declare(queue=queue_name, passive=True)
+        self.channel.tx_select()
+
+    def publish(self, body):
+        self.channel.basic_publish(exchange='', routing_key=self.queue_name, body=body,
+                                   properties=pika.BasicProperties(delivery_mode=2))
+
+    def commit(self):
+        self.channel.tx_commit()
+
+    def close(self):
+        try:
+            self.connection.close()
+        except Exception:
+            pass
+
+
+class QueuePublisher:
+    """Long-lived per-process publisher.
+
+    `publish` only appends to a bounded local outbox. A background thread owning the single
+    broker connection sends the outbox in batches of up to `batch_size` messages and drops
+    them from the outbox once the broker has committed the batch. While the broker is down
+    messages accumulate in the outbox and the thread reconnects with exponential backoff.
+    """
+    def __init__(self, channel_factory, outbox_size=10000, batch_size=100, reconnect_delay=0.5,
+                 max_reconnect_delay=30):
+        self.channel_factory = channel_factory
+        self.outbox_size = outbox_size
+        self.batch_size = batch_size
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self._outbox = deque()
+        self._condition = threading.Condition()
+        self._channel = None
+        self._pid = None
+        self._stopped = False
+
+    def _ensure_worker(self):
+        if self._pid != os.getpid():
+            with self._condition:
+                if self._pid != os.getpid():
+                    # The parent's connection must not be used after fork.
+                    self._channel = None
+                    self._outbox = deque()
+                    self._pid = os.getpid()
+                    threading.Thread(target=self._run, daemon=True).start()
+                    atexit.register(self.close)
+
+    def publish(self, body):
+        self._ensure_worker()
+        with self._condition:
+            if len(self._outbox) >= self.outbox_size:
+                raise OutboxFull("Queue outbox is full")
+            self._outbox.append(body)
+            self._condition.notify()
+
+    def pending(self):
+        return len(self._outbox)
+
+    def _run(self):
+        delay = self.reconnect_delay
+        while not self._stopped:
+            with self._condition:
+                while not self._outbox and not self._stopped:
+                    self._condition.wait()
+            try:
+                self._flush()
+                delay = self.reconnect_delay
+            except Exception:
+                logger.exception("Publishing to the queue failed, reconnecting in %.1fs", delay)
+                self._disconnect()
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+
+    def _flush(self):
+        with self._condition:
+            batch = [self._outbox[i] for i in range(min(self.batch_size, len(self._outbox)))]
+        if not batch:
+            return
+        if self._channel is None:
+            self._channel = self.channel_factory()
+        for body in batch:
+            self._channel.publish(body)
+        self._channel.commit()
+        with self._condition:
+            for _ in batch:
+                self._outbox.popleft()
+
+    def _disconnect(self):
+        if self._channel is not None:
+            self._channel.close()
+            self._channel = None
+
+    def close(self, timeout=5):
+        """Gives the outbox a chance to drain, then stops the publisher thread."""
+        deadline = time.monotonic() + timeout
+        while self._outbox and time.monotonic() < deadline:
+            time.sleep(0.05)
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._disconnect()
+
+
+def init_app(app):
+    url, queue_name = app.config['RABBITMQ_URL'], app.config['QUEUE_NAME']
+    if not url:
+        raise RuntimeError("RABBITMQ_URL must be set to publish to the image resizer queue")
+    app.extensions['image_queue'] = QueuePublisher(
+        lambda: PikaChannel(url, queue_name), outbox_size=app.config['QUEUE_OUTBOX_SIZE'],
+        batch_size=app.config['QUEUE_BATCH_SIZE'])
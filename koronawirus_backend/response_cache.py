@@ -0,0 +1,97 @@
+import hashlib
+import json
+import logging
+from collections import Counter, defaultdict
+from functools import wraps
+
+from flask import current_app, request
+
+from .cache import create_cache
+
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """Caches JSON responses of public read endpoints keyed on their normalised parameters.
+
+    Every key embeds a generation number. Writes bump it, which invalidates all cached
+    responses at once. With Redis (CACHE_REDIS_URL) the generation is shared by every
+    worker. With the in-process default it is per worker, so the other workers keep
+    serving what they cached for up to the TTL after a write.
+    """
+    def __init__(self, backend, ttl=30):
+        self.backend = backend
+        self.ttl = ttl
+        self.counters = defaultdict(Counter)
+
+    @classmethod
+    def from_config(cls, config):
+        backend = create_cache(config['CACHE_REDIS_URL'], maxsize=config['RESPONSE_CACHE_SIZE'], prefix='response:')
+        return cls(backend, ttl=config['RESPONSE_CACHE_TTL'])
+
+    def key(self, endpoint, params):
+        normalised = json.dumps(params, sort_keys=True, separators=(',', ':'))
+        return '{}:{}:{}'.format(endpoint, self.backend.get_counter('generation'),
+                                 hashlib.sha1(normalised.encode()).hexdigest())
+
+    def get(self, endpoint, key):
+        value = self.backend.get(key)
+        self.counters[endpoint]['hit' if value is not None else 'miss'] += 1
+        return value
+
+    def set(self, key, value):
+        self.backend.set(key, value, self.ttl)
+
+    def invalidate(self):
+        self.backend.incr('generation')
+
+    def hit_rate(self, endpoint):
+        counters = self.counters[endpoint]
+        total = counters['hit'] + counters['miss']
+        return counters['hit'] / total if total else 0.0
+
+
+def cached(endpoint):
+    """Serves the view from the response cache when one is configured."""
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            cache = current_app.extensions.get('response_cache')
+            if cache is None:
+                return f(*args, **kwargs)
+            key = cache.key(endpoint, request.get_json(silent=True))
+            response = cache.get(endpoint, key)
+            if response is None:
+                response = f(*args, **kwargs)
+                if isinstance(response, dict):
+                    cache.set(key, response)
+            return response
+
+        return decorated
+
+    return decorator
+
+
+def invalidate():
+    cache = current_app.extensions.get('response_cache')
+    if cache is not None:
+        cache.invalidate()
+
+
+def invalidates_cache(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        response = f(*args, **kwargs)
+        invalidate()
+        return response
+
+    return decorated
+
+
+def init_app(app):
+    if app.config['RESPONSE_CACHE_TTL'] > 0:
+        if not app.config['CACHE_REDIS_URL']:
+            logger.warning("Response cache is per process without CACHE_REDIS_URL, other workers serve responses "
+                           "up to %ss stale after a write", app.config['RESPONSE_CACHE_TTL'])
+        app.extensions['response_cache'] = ResponseCache.from_config(app.config)
@@ -0,0 +1,81 @@
+"""JSON encoding for API responses, the Elasticsearch client and the shared cache.
+
+orjson is used when it's installed and the standard library otherwise, producing the
+same documents either way.
+"""
+import json
+
+from elasticsearch.exceptions import SerializationError
+from elasticsearch.serializer import JSONSerializer
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+if orjson is not None:
+    # Dates and dataclasses are left to the `default` hooks so the output matches the stdlib encoders.
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+
+def dumps(obj):
+    if orjson is None:
+        return json.dumps(obj, separators=(',', ':'))
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+def loads(s):
+    if orjson is None:
+        return json.loads(s)
+    return orjson.loads(s)
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Flask JSON provider encoding with orjson, falling back to Flask's own for anything orjson can't take."""
+    def _options(self, indent=False):
+        options = ORJSON_OPTIONS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._options()).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        # Bytes go into the response as they are, without a round trip through str.
+        data = orjson.dumps(obj, default=self.default, option=self._options(indent))
+        return self._app.response_class(data + b'\n', mimetype=self.mimetype)
+
+
+class ElasticsearchSerializer(JSONSerializer):
+    """Request bodies and responses of the Elasticsearch client, encoded and parsed with orjson."""
+    def loads(self, s):
+        if orjson is None:
+            return super().loads(s)
+        try:
+            return orjson.loads(s)
+        except ValueError as e:
+            raise SerializationError(s, e)
+
+    def dumps(self, data):
+        if orjson is None or isinstance(data, str):
+            return super().dumps(data)
+        try:
+            return orjson.dumps(data, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode()
+        except TypeError as e:
+            raise SerializationError(data, e)
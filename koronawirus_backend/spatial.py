@@ -0,0 +1,155 @@
+import heapq
+import itertools
+import math
+import threading
+import time
+
+from .connections import get_elastic
+from .elastic import hit_to_dict
+
+
+# Same mean radius Elasticsearch uses for arc distances.
+EARTH_RADIUS_KM = 6371.0087714
+
+
+def to_xyz(lat, lon):
+    lat, lon = math.radians(float(lat)), math.radians(float(lon))
+    return math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat)
+
+
+def chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+
+def km_to_chord(km):
+    return 2 * math.sin(min(math.pi, km / EARTH_RADIUS_KM) / 2)
+
+
+class KDTree:
+    """Static k-d tree over points on the unit sphere.
+
+    Straight-line (chord) distance between unit vectors grows monotonically with the
+    great-circle distance, so nearest neighbours by chord are nearest by haversine too.
+    """
+    def __init__(self, items):
+        self.root = self._build(list(items), 0)
+
+    def _build(self, items, depth):
+        if not items:
+            return None
+        axis = depth % 3
+        items.sort(key=lambda item: item[0][axis])
+        middle = len(items) // 2
+        return (items[middle], axis, self._build(items[:middle], depth + 1),
+                self._build(items[middle + 1:], depth + 1))
+
+    def nearest(self, xyz, k=1, max_chord=2.0):
+        """Returns up to k (chord, payload) pairs closer than max_chord, nearest first."""
+        heap = []
+        counter = itertools.count()
+        max_squared = max_chord * max_chord
+
+        def visit(node):
+            if node is None:
+                return
+            (point, payload), axis, left, right = node
+            squared = (xyz[0] - point[0]) ** 2 + (xyz[1] - point[1]) ** 2 + (xyz[2] - point[2]) ** 2
+            if squared <= max_squared:
+                if len(heap) < k:
+                    heapq.heappush(heap, (-squared, next(counter), payload))
+                elif squared < -heap[0][0]:
+                    heapq.heapreplace(heap, (-squared, next(counter), payload))
+            diff = xyz[axis] - point[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            visit(near)
+            bound = max_squared if len(heap) < k else min(max_squared, -heap[0][0])
+            if diff * diff <= bound:
+                visit(far)
+
+        visit(self.root)
+        return [(math.sqrt(-squared), payload) for squared, _, payload in sorted(heap, reverse=True)]
+
+
+class NearestIndex:
+    """In-memory replacement for Elasticsearch.get_nearest.
+
+    The index is loaded with a full scan on first use and afterwards refreshed with the
+    points whose last_modified_timestamp moved, whenever it is older than `max_staleness`
+    seconds. Deletions only propagate on the full rescan done every `full_refresh` seconds,
+    or immediately through `discard` for deletions made by this process.
+    """
+    def __init__(self, es_factory, max_staleness=30, full_refresh=600, max_distance_km=1000):
+        self.es_factory = es_factory
+        self.max_staleness = max_staleness
+        self.full_refresh = full_refresh
+        self.max_distance_km = max_distance_km
+        self._points = {}
+        self._trees = {}
+        self._last_seen = None
+        self._refreshed_at = 0
+        self._full_refreshed_at = 0
+        self._lock = threading.Lock()
+
+    def _apply(self, hit):
+        source = hit['_source']
+        point = hit_to_dict(hit)
+        self._points[hit['_id']] = (source['type'], to_xyz(source['location']['lat'], source['location']['lon']),
+                                    point)
+        timestamp = source.get('last_modified_timestamp')
+        if timestamp is not None and (self._last_seen is None or str(timestamp) > self._last_seen):
+            self._last_seen = str(timestamp)
+
+    def _rebuild(self):
+        by_type = {}
+        for point_type, xyz, point in self._points.values():
+            by_type.setdefault(point_type, []).append((xyz, point))
+        self._trees = {point_type: KDTree(items) for point_type, items in by_type.items()}
+
+    def refresh(self, full=False):
+        es = self.es_factory()
+        now = time.monotonic()
+        if full or self._last_seen is None or now - self._full_refreshed_at > self.full_refresh:
+            self._points = {}
+            self._last_seen = None
+            for hit in es.scan_points():
+                self._apply(hit)
+            self._full_refreshed_at = now
+        else:
+            # Lexicographic comparison is fine, epoch seconds have had 10 digits since 2001.
+            query = {'range': {'last_modified_timestamp.keyword': {'gte': self._last_seen}}}
+            for hit in es.scan_points(query=query):
+                self._apply(hit)
+        self._rebuild()
+        self._refreshed_at = now
+
+    def ensure_fresh(self):
+        if time.monotonic() - self._refreshed_at > self.max_staleness:
+            with self._lock:
+                if time.monotonic() - self._refreshed_at > self.max_staleness:
+                    self.refresh()
+
+    def discard(self, point_id):
+        with self._lock:
+            if self._points.pop(point_id, None) is not None:
+                self._rebuild()
+
+    def get_nearest(self, location, point_types=('hospital', 'transport'), k=None):
+        """Same contract as Elasticsearch.get_nearest."""
+        self.ensure_fresh()
+        trees = self._trees
+        xyz = to_xyz(location['lat'], location['lon'])
+        max_chord = km_to_chord(self.max_distance_km)
+        nearest = {}
+        for point_type in point_types:
+            tree = trees.get(point_type)
+            found = tree.nearest(xyz, k=k or 1, max_chord=max_chord) if tree is not None else []
+            points = [dict(point, distance=chord_to_km(chord)) for chord, point in found]
+            nearest[point_type] = points if k is not None else next(iter(points), None)
+        return nearest
+
+
+def init_app(app):
+    if app.config['NEAREST_INDEX_ENABLED']:
+        app.extensions['nearest_index'] = NearestIndex(
+            lambda: get_elastic(app), max_staleness=app.config['NEAREST_INDEX_MAX_STALENESS'],
+            full_refresh=app.config['NEAREST_INDEX_FULL_REFRESH'])
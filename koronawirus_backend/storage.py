@@ -0,0 +1,222 @@
+import hashlib
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+class HashingReader:
+    """File-like wrapper hashing the bytes as they are read.
+
+    It deliberately has no seek/tell, so boto3 treats it as a non-seekable stream and
+    reads it sequentially one part at a time instead of buffering it whole.
+    """
+    def __init__(self, stream, algorithm='sha256'):
+        self.stream = stream
+        self.hash = hashlib.new(algorithm)
+        self.size = 0
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.hash.update(data)
+        self.size += len(data)
+        return data
+
+    def hexdigest(self):
+        return self.hash.hexdigest()
+
+
+def content_file_name(digest, extension):
+    return '{}.{}'.format(digest, extension.lower())
+
+
+def hash_file(file_object):
+    """Hashes a seekable file and rewinds it."""
+    reader = HashingReader(file_object)
+    while reader.read(CHUNK_SIZE):
+        pass
+    file_object.seek(0)
+    return reader.hexdigest()
+
+
+class KnownObjects:
+    """Bounded set of keys known to exist in the store.
+
+    Entries are appended to `path` (when given) so worker processes on the same host
+    see each other's uploads; the file is compacted once it holds twice `maxsize` keys.
+    A missing entry only costs a redundant, idempotent upload of identical content.
+    """
+    def __init__(self, path=None, maxsize=100000):
+        self.path = path
+        self.maxsize = maxsize
+        self._keys = OrderedDict()
+        self._offset = 0
+        self._lines = 0
+        self._lock = threading.Lock()
+
+    def _add(self, key):
+        self._keys[key] = True
+        self._keys.move_to_end(key)
+        while len(self._keys) > self.maxsize:
+            self._keys.popitem(last=False)
+
+    def _read_new(self):
+        try:
+            with open(self.path) as known:
+                if os.fstat(known.fileno()).st_size < self._offset:
+                    # Compacted by another process.
+                    self._offset = 0
+                known.seek(self._offset)
+                for line in known:
+                    if line.endswith('\n'):
+                        self._add(line[:-1])
+                        self._lines += 1
+                self._offset = known.tell()
+        except FileNotFoundError:
+            pass
+
+    def __contains__(self, key):
+        with self._lock:
+            if key in self._keys:
+                return True
+            if self.path:
+                self._read_new()
+            return key in self._keys
+
+    def add(self, key):
+        with self._lock:
+            self._add(key)
+            if not self.path:
+                return
+            with open(self.path, 'a') as known:
+                known.write(key + '\n')
+            self._lines += 1
+            if self._lines > 2 * self.maxsize:
+                compacted = '{}.{}'.format(self.path, os.getpid())
+                with open(compacted, 'w') as known:
+                    known.writelines(key + '\n' for key in self._keys)
+                os.replace(compacted, self.path)
+                self._offset = os.path.getsize(self.path)
+                self._lines = len(self._keys)
+
+
+class Storage:
+    """Image store behind STORE_PROPERTY, either a `file://` directory or an `s3://` bucket.
+
+    One boto3 client per process is reused by every upload, multipart part size and
+    concurrency come from the TransferConfig.
+    """
+    def __init__(self, store_property, part_size=8 * 1024 * 1024, max_concurrency=4, max_pool_connections=10,
+                 known=None):
+        self.scheme, self.location = store_property.split('://', 1)
+        self.known = known if known is not None else KnownObjects()
+        self.transfer_config = TransferConfig(multipart_threshold=part_size, multipart_chunksize=part_size,
+                                              max_concurrency=max_concurrency)
+        self.max_pool_connections = max_pool_connections
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config['STORE_PROPERTY'], part_size=config['S3_PART_SIZE'],
+                   max_concurrency=config['S3_MAX_CONCURRENCY'],
+                   max_pool_connections=config['S3_MAX_POOL_CONNECTIONS'],
+                   known=KnownObjects(config['IMAGE_KNOWN_HASHES_FILE']))
+
+    def client(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._client = boto3.client('s3', config=Config(max_pool_connections=self.max_pool_connections))
+                    self._pid = os.getpid()
+        return self._client
+
+    def create_directory(self, path):
+        if self.scheme == 'file':
+            os.makedirs(os.path.join(self.location, path), exist_ok=True)
+        elif self.scheme == 's3':
+            self.client().put_object(Bucket=self.location, Key=(path + '/'))
+
+    def upload(self, file_object, key, content_type):
+        """Streams file_object to the store under key and returns the sha256 of its content."""
+        reader = HashingReader(file_object)
+        if self.scheme == 'file':
+            with open(os.path.join(self.location, key), 'wb') as stored:
+                shutil.copyfileobj(reader, stored, CHUNK_SIZE)
+        elif self.scheme == 's3':
+            self.client().upload_fileobj(reader, self.location, key,
+                                         ExtraArgs={'ACL': 'public-read', 'ContentType': content_type},
+                                         Config=self.transfer_config)
+        return reader.hexdigest()
+
+    def exists(self, key):
+        """Whether key is stored, asking the store itself when no process on this host has seen it."""
+        if key in self.known:
+            return True
+        if self.scheme == 'file':
+            found = os.path.exists(os.path.join(self.location, key))
+        elif self.scheme == 's3':
+            try:
+                self.client().head_object(Bucket=self.location, Key=key)
+                found = True
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') not in ('404', 'NoSuchKey', 'NotFound'):
+                    raise
+                found = False
+        else:
+            found = False
+        if found:
+            self.known.add(key)
+        return found
+
+    def store(self, file_object, key, content_type):
+        """Uploads content whose key is already known to be content addressed."""
+        digest = self.upload(file_object, key, content_type)
+        self.known.add(key)
+        return digest
+
+    def store_stream(self, stream, directory, extension, content_type):
+        """Stores a non-seekable stream under its content hash.
+
+        The hash is only known once the stream is consumed, so the upload goes to a staging
+        key first and is then moved, or dropped when the content is already stored.
+        Returns (file name, whether the content is new).
+        """
+        staging = os.path.join(directory, '.upload-{}.{}'.format(uuid.uuid4().hex, extension))
+        filename = content_file_name(self.upload(stream, staging, content_type), extension)
+        key = os.path.join(directory, filename)
+        if self.exists(key):
+            self._delete(staging)
+            return filename, False
+        self._move(staging, key)
+        self.known.add(key)
+        return filename, True
+
+    def _delete(self, key):
+        if self.scheme == 'file':
+            os.remove(os.path.join(self.location, key))
+        elif self.scheme == 's3':
+            self.client().delete_object(Bucket=self.location, Key=key)
+
+    def _move(self, source, destination):
+        if self.scheme == 'file':
+            os.replace(os.path.join(self.location, source), os.path.join(self.location, destination))
+        elif self.scheme == 's3':
+            self.client().copy_object(Bucket=self.location, Key=destination, ACL='public-read',
+                                      CopySource={'Bucket': self.location, 'Key': source})
+            self._delete(source)
+
+
+def init_app(app):
+    if app.config['STORE_PROPERTY']:
+        app.extensions['storage'] = Storage.from_config(app.config)
@@ -0,0 +1,52 @@
+import hashlib
+import math
+from datetime import datetime
+
+from flask import abort, Blueprint, current_app, jsonify, request
+
+from .connections import get_elastic
+
+
+MAX_ZOOM = 22
+
+tiles = Blueprint('tiles', __name__, )
+
+
+def tile_to_lat_lon(z, x, y):
+    """North-west corner of a slippy map (web mercator) tile."""
+    n = 2 ** z
+    lon = x / n * 360.0 - 180.0
+    lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    return {'lat': lat, 'lon': lon}
+
+
+def tile_bounds(z, x, y):
+    return tile_to_lat_lon(z, x, y), tile_to_lat_lon(z, x + 1, y + 1)
+
+
+def tile_version(points):
+    """Returns (ETag, Last-Modified) for the markers of a tile."""
+    timestamps = [int(point['last_modified_timestamp']) for point in points
+                  if point.get('last_modified_timestamp')]
+    last_modified = max(timestamps, default=0)
+    # Deleting a point doesn't touch any timestamp, hence the count.
+    etag = hashlib.md5('{}:{}'.format(len(points), last_modified).encode()).hexdigest()
+    return etag, datetime.utcfromtimestamp(last_modified)
+
+
+@tiles.route('/tiles/<int:z>/<int:x>/<int:y>', methods=['GET'])
+def get_tile(z, x, y):
+    if z > MAX_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        abort(404)
+    top_left, bottom_right = tile_bounds(z, x, y)
+    es = get_elastic()
+    result = es.get_tile_points(top_left=top_left, bottom_right=bottom_right,
+                                size=current_app.config['TILE_MAX_POINTS'])
+    points = result['points']
+    etag, last_modified = tile_version(points)
+    response = jsonify(points=points, truncated=result['total'] > len(points))
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config['TILE_MAX_AGE']
+    return response.make_conditional(request)
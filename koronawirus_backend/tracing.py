@@ -0,0 +1,162 @@
+"""Per-request spans around external calls.
+
+Spans are collected on flask.g, summed up per name into a Server-Timing header and
+optionally exported as OTLP/JSON, one ExportTraceServiceRequest per line, which the
+OpenTelemetry collector's `otlpjsonfile` receiver reads as is. Outside a traced request
+`span` returns a shared no-op context manager.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+
+from flask import current_app, g, has_request_context, request
+
+
+NULL_SPAN = nullcontext()
+# Set once any app enables tracing, so untraced processes skip the context lookups entirely.
+_enabled = False
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+
+
+class Trace:
+    def __init__(self):
+        self.trace_id = os.urandom(16).hex()
+        self.spans = []
+        self._stack = []
+
+    def open(self, name, attributes, kind=SPAN_KIND_CLIENT):
+        span = {'traceId': self.trace_id, 'spanId': os.urandom(8).hex(), 'name': name, 'kind': kind,
+                'startTimeUnixNano': time.time_ns(), 'attributes': attributes}
+        if self._stack:
+            span['parentSpanId'] = self._stack[-1]['spanId']
+        self._stack.append(span)
+        return span
+
+    def close(self, span, error=None):
+        span['endTimeUnixNano'] = time.time_ns()
+        if error is not None:
+            span['status'] = {'code': 2, 'message': str(error)}
+        self._stack.remove(span)
+        self.spans.append(span)
+
+    @contextmanager
+    def span(self, name, attributes):
+        span = self.open(name, attributes)
+        try:
+            yield span
+        except BaseException as e:
+            self.close(span, error=e)
+            raise
+        self.close(span)
+
+
+def span(name, **attributes):
+    """Times the block as a child of the current request's span, a no-op when it isn't traced."""
+    if _enabled and has_request_context():
+        trace = g.get('trace')
+        if trace is not None:
+            return trace.span(name, attributes)
+    return NULL_SPAN
+
+
+class TracedClient:
+    """Proxy putting a span around every method call of the wrapped client."""
+    def __init__(self, client, prefix):
+        self._client = client
+        self._prefix = prefix
+
+    def __getattr__(self, name):
+        attribute = getattr(self._client, name)
+        if not callable(attribute):
+            return attribute
+        span_name = '{}.{}'.format(self._prefix, name)
+
+        def traced(*args, **kwargs):
+            with span(span_name):
+                return attribute(*args, **kwargs)
+        return traced
+
+
+def otlp_attributes(attributes):
+    return [{'key': key, 'value': {'stringValue': str(value)}} for key, value in attributes.items()]
+
+
+def server_timing(spans, root):
+    durations = OrderedDict()
+    for span in spans:
+        if span is not root:
+            duration = (span['endTimeUnixNano'] - span['startTimeUnixNano']) / 1e6
+            total, count = durations.get(span['name'], (0, 0))
+            durations[span['name']] = (total + duration, count + 1)
+    entries = ['{};dur={:.2f};desc="{}x"'.format(name, total, count) for name, (total, count) in durations.items()]
+    entries.append('total;dur={:.2f}'.format((root['endTimeUnixNano'] - root['startTimeUnixNano']) / 1e6))
+    return ', '.join(entries)
+
+
+class FileExporter:
+    """Appends OTLP/JSON lines to `path`, `-` meaning stdout."""
+    def __init__(self, path, service_name='koronawirus_backend'):
+        self.path = path
+        self.resource = {'attributes': otlp_attributes({'service.name': service_name})}
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        line = json.dumps({'resourceSpans': [{
+            'resource': self.resource,
+            'scopeSpans': [{'scope': {'name': 'koronawirus_backend'},
+                            'spans': [dict(span, attributes=otlp_attributes(span['attributes']))
+                                      for span in spans]}]}]})
+        with self._lock:
+            if self.path == '-':
+                sys.stdout.write(line + '\n')
+                sys.stdout.flush()
+            else:
+                with open(self.path, 'a') as export:
+                    export.write(line + '\n')
+
+
+class Tracer:
+    def __init__(self, exporter=None, server_timing=True):
+        self.exporter = exporter
+        self.server_timing = server_timing
+
+    def start(self):
+        g.trace = Trace()
+        g.trace_root = g.trace.open('{} {}'.format(request.method, request.url_rule or request.path),
+                                    {'http.method': request.method, 'http.target': request.path},
+                                    kind=SPAN_KIND_SERVER)
+
+    def finish(self, response):
+        trace, root = g.pop('trace', None), g.pop('trace_root', None)
+        if trace is None:
+            return response
+        root['attributes']['http.status_code'] = response.status_code
+        trace.close(root)
+        if self.server_timing:
+            response.headers['Server-Timing'] = server_timing(trace.spans, root)
+        if self.exporter is not None:
+            self.exporter.export(trace.spans)
+        return response
+
+
+def trace_client(client, prefix, app=None):
+    """Wraps the client in a TracedClient when tracing is enabled for the app."""
+    if 'tracer' in (app or current_app).extensions:
+        return TracedClient(client, prefix)
+    return client
+
+
+def init_app(app):
+    global _enabled
+    if app.config['TRACING_ENABLED']:
+        _enabled = True
+        path = app.config['TRACING_EXPORT_PATH']
+        tracer = Tracer(exporter=FileExporter(path) if path else None)
+        app.extensions['tracer'] = tracer
+        app.before_request(tracer.start)
+        app.after_request(tracer.finish)
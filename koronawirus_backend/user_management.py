@@ -28,4 +28,5 @@ def ban_user(user):
     auth0 = Auth0(current_app.config['AUTH0_DOMAIN'], mgmt_api_token)
     body = {"blocked": True}
     auth0.users.update(ban_user_id, body)
+    current_app.extensions['identity'].ban(ban_user_id)
     return {"status": "success"}
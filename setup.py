@@ -28,6 +28,11 @@ setup(
         'Programming Language :: Python :: 3.8',
     ],
     description="Koronawirus map backend API.",
+    entry_points={
+        'console_scripts': [
+            'koronawirus_backend=koronawirus_backend.cli:main',
+        ],
+    },
     install_requires=requirements,
     license="MIT license",
     long_description=readme + '\n\n' + history,
@@ -0,0 +1,79 @@
+import threading
+
+from benchmarks import stub_auth0, stub_es
+import pytest
+
+from koronawirus_backend.aio import AsyncRuntime
+from koronawirus_backend.identity import IdentityError, IdentityResolver
+
+
+class InFlight:
+    """Counts the stub requests being served at once.
+
+    A request is held until `expected` of them were in flight together, or for `timeout`
+    seconds when they don't arrive, as they wouldn't if the client ran them one by one.
+    """
+    def __init__(self, expected=3, timeout=1):
+        self.expected = expected
+        self.timeout = timeout
+        self.current = 0
+        self.peak = 0
+        self.condition = threading.Condition()
+
+    def serve(self):
+        with self.condition:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+            self.condition.notify_all()
+            self.condition.wait_for(lambda: self.peak >= self.expected, timeout=self.timeout)
+            self.current -= 1
+
+
+IN_FLIGHT = InFlight()
+
+
+class SlowStore(stub_es.Store):
+    def get(self, index, doc_id):
+        IN_FLIGHT.serve()
+        return super().get(index, doc_id)
+
+
+class SlowUserinfo(stub_auth0.Handler):
+    def do_GET(self):
+        IN_FLIGHT.serve()
+        super().do_GET()
+
+
+@pytest.fixture(scope='module')
+def runtime():
+    store = SlowStore()
+    store.index('points', 'p1', {'name': 'Szpital', 'owned_by': 'alice'})
+    es_server, connection_string = stub_es.serve(store)
+    auth0_server, domain = stub_auth0.serve()
+    auth0_server.RequestHandlerClass = SlowUserinfo
+    runtime = AsyncRuntime(connection_string, 'points', auth0_domain=domain, auth0_protocol='http')
+    yield runtime
+    runtime.close()
+    es_server.shutdown()
+    auth0_server.shutdown()
+
+
+def test_resolveOverlapsPointReads(runtime):
+    identity = IdentityResolver(runtime.auth0_domain)
+    # The first request also runs the client's product check.
+    runtime.run(runtime.get_document('p1'))
+    IN_FLIGHT.peak = 0
+    user, documents = runtime.run(runtime.resolve_with_documents(identity, 'alice:moderator', ['p1', 'missing']))
+    # The userinfo request and both point reads were in flight together.
+    assert IN_FLIGHT.peak == 3
+    assert user == {'sub': 'alice', 'role': 'moderator'}
+    assert documents['p1']['_source']['owned_by'] == 'alice'
+    assert 'missing' not in documents
+    assert identity.resolve('alice:moderator') == user
+    assert identity.counters['hit'] == 1
+
+
+def test_rejectedTokenRaisesIdentityError(runtime):
+    identity = IdentityResolver(runtime.auth0_domain)
+    with pytest.raises(IdentityError):
+        runtime.run(identity.resolve_async('', runtime))
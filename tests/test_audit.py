@@ -0,0 +1,94 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.stub_es import serve, Store
+from elasticsearch import Elasticsearch as ES
+import pytest
+
+from koronawirus_backend.audit import AuditLogPipeline
+
+
+DOCUMENTS = [('logs', {'doc_id': 'p{}'.format(i), 'modified_by': 'alice'}) for i in range(3)]
+
+
+@pytest.fixture
+def store():
+    store = Store()
+    server, url = serve(store)
+    store.client = ES([url])
+    yield store
+    server.shutdown()
+
+
+def unreachable():
+    return ES(['http://127.0.0.1:1'], max_retries=0)
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def make_pipeline(client_factory, spill_dir, **kwargs):
+    return AuditLogPipeline(client_factory, spill_dir=str(spill_dir), max_retries=0, backoff=0, **kwargs)
+
+
+def test_submittedDocumentsAreShipped(store, tmp_path):
+    pipeline = make_pipeline(lambda: store.client, tmp_path, flush_interval=0.05)
+    for index, document in DOCUMENTS:
+        pipeline.submit(index, document)
+    deadline = time.monotonic() + 5
+    while len(store.indices.get('logs', {})) < 3 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert sorted(doc['doc_id'] for doc in store.indices['logs'].values()) == ['p0', 'p1', 'p2']
+
+
+def test_resentBatchOverwrites(store, tmp_path):
+    pipeline = make_pipeline(lambda: store.client, tmp_path)
+    assert pipeline._ship(DOCUMENTS)
+    assert pipeline._ship(DOCUMENTS)
+    assert len(store.indices['logs']) == 3
+
+
+def test_failedBatchIsSpilledAndReplayed(store, tmp_path):
+    clients = [unreachable()]
+    pipeline = make_pipeline(lambda: clients[0], tmp_path)
+    assert not pipeline._ship(DOCUMENTS)
+    assert os.listdir(str(tmp_path)) == ['audit-{}.ndjson'.format(os.getpid())]
+
+    clients[0] = store.client
+    pipeline._replay()
+    assert len(store.indices['logs']) == 3
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_fullQueueSpills(store, tmp_path):
+    pipeline = make_pipeline(lambda: store.client, tmp_path, max_queue=1)
+    # No worker draining the queue.
+    pipeline._pid = os.getpid()
+    for index, document in DOCUMENTS:
+        pipeline.submit(index, document)
+    with open(str(tmp_path / 'audit-{}.ndjson'.format(os.getpid()))) as spill:
+        assert [json.loads(line)['document']['doc_id'] for line in spill] == ['p1', 'p2']
+
+
+def test_replayCutShortByACrashIsResumed(store, tmp_path):
+    orphan = tmp_path / 'audit-{}.ndjson.replaying-{}'.format(dead_pid(), dead_pid())
+    orphan.write_text(''.join(json.dumps({'index': index, 'document': document}) + '\n'
+                              for index, document in DOCUMENTS))
+    pipeline = make_pipeline(lambda: store.client, tmp_path)
+    pipeline._replay()
+    assert len(store.indices['logs']) == 3
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_spillFileOfALiveProcessIsLeftAlone(store, tmp_path):
+    spill = tmp_path / 'audit-{}.ndjson'.format(os.getppid())
+    spill.write_text(json.dumps({'index': 'logs', 'document': {'doc_id': 'p0'}}) + '\n')
+    make_pipeline(lambda: store.client, tmp_path)._replay()
+    assert spill.exists()
+    assert 'logs' not in store.indices
@@ -0,0 +1,40 @@
+from benchmarks import stub_es
+import pytest
+
+from koronawirus_backend.logs import logs
+from koronawirus_backend.points import points
+
+
+class CountingStore(stub_es.Store):
+    def __init__(self):
+        super().__init__()
+        self.gets = 0
+
+    def get(self, index, doc_id):
+        self.gets += 1
+        return super().get(index, doc_id)
+
+
+@pytest.fixture
+def client(make_app):
+    return make_app(points, logs).test_client()
+
+
+@pytest.mark.parametrize('store', [CountingStore], indirect=True)
+def test_ownerEditReadsPointOnce(client, store):
+    response = client.post('/modify_point', json={'id': 'p1', 'waiting_time': 'long'},
+                           headers={'Authorization': 'Bearer alice'})
+    assert response.status_code == 200
+    assert response.json['waiting_time'] == 'long'
+    assert store.gets == 1
+
+
+def test_deletePointRequiresOwner(client, store):
+    response = client.post('/delete_point', json={'id': 'p1'}, headers={'Authorization': 'Bearer mallory'})
+    assert response.status_code == 403
+    assert 'p1' in store.indices['points']
+
+
+@pytest.mark.parametrize('path, body', [('/add_point', {'name': 'Szpital'}), ('/get_logs', {})])
+def test_userWithoutRoleIsForbidden(client, path, body):
+    assert client.post(path, json=body, headers={'Authorization': 'Bearer mallory'}).status_code == 403
@@ -0,0 +1,101 @@
+import time
+
+from benchmarks.data import seed
+from benchmarks.stub_es import serve, Store
+from elasticsearch import Elasticsearch as ES
+import pytest
+
+from koronawirus_backend.availability import AvailabilityBuffer
+from koronawirus_backend.elastic import Elasticsearch
+
+
+class Recorder:
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+
+    def set_waiting_times(self, waiting_times, user_sub, reports=None):
+        if self.fail:
+            raise ConnectionError("Elasticsearch is down")
+        self.calls.append((waiting_times, reports))
+
+
+class FailingStore(Store):
+    """Rejects updates of the points in `failing`."""
+    failing = set()
+
+    def update(self, index, doc_id, body, if_seq_no=None):
+        if doc_id in self.failing:
+            return None
+        return super().update(index, doc_id, body, if_seq_no)
+
+
+class Audit:
+    def __init__(self):
+        self.documents = []
+
+    def submit(self, index, document):
+        self.documents.append(document)
+
+
+def make_buffer(es, **kwargs):
+    return AvailabilityBuffer(lambda: es, **dict({'window': 60}, **kwargs))
+
+
+def test_reportsAreCoalesced():
+    es = Recorder()
+    buffer = make_buffer(es)
+    for point_id, availability in [('p1', 'short'), ('p1', 'long'), ('p1', 'long'), ('p2', 'short'),
+                                   ('p2', 'long')]:
+        buffer.report(point_id, availability)
+    buffer.flush()
+    # p2 is a tie, the latest report wins.
+    assert es.calls == [({'p1': 'long', 'p2': 'long'},
+                         {'p1': {'short': 1, 'long': 2}, 'p2': {'short': 1, 'long': 1}})]
+
+
+def test_fullBufferFlushes():
+    es = Recorder()
+    buffer = make_buffer(es, max_points=2)
+    for point_id in ('p1', 'p2', 'p2', 'p3'):
+        buffer.report(point_id, 'short')
+    assert [waiting_times for waiting_times, _ in es.calls] == [{'p1': 'short', 'p2': 'short'}]
+
+
+def test_bufferFlushesEveryWindow():
+    es = Recorder()
+    buffer = make_buffer(es, window=0.05)
+    buffer.report('p1', 'moderate')
+    deadline = time.monotonic() + 5
+    while not es.calls and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert es.calls[0][0] == {'p1': 'moderate'}
+
+
+def test_failedFlushDropsReports():
+    es = Recorder(fail=True)
+    buffer = make_buffer(es)
+    buffer.report('p1', 'short')
+    with pytest.raises(ConnectionError):
+        buffer.flush()
+    es.fail = False
+    buffer.flush()
+    assert es.calls == []
+
+
+def test_onlySuccessfulUpdatesAreAudited():
+    store = FailingStore()
+    store.failing = {'point-1'}
+    seed(store, 'points', 3)
+    server, url = serve(store)
+    audit = Audit()
+    try:
+        es = Elasticsearch(es=ES([url]), index='points', audit=audit)
+        waiting_times = {point_id: 'long' if source['waiting_time'] != 'long' else 'short'
+                         for point_id, source in store.indices['points'].items()}
+        failed = es.set_waiting_times(waiting_times, user_sub='anonymous')
+    finally:
+        server.shutdown()
+    assert list(failed) == ['point-1']
+    assert sorted(document['doc_id'] for document in audit.documents) == ['point-0', 'point-2']
+    assert store.indices['points']['point-2']['waiting_time'] == waiting_times['point-2']
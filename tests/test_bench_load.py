@@ -0,0 +1,31 @@
+import random
+
+from benchmarks import bench_load, data, stub_es
+
+
+def result(p95_ms, throughput, errors=0):
+    return {'p95_ms': p95_ms, 'throughput': throughput, 'errors': errors}
+
+
+def test_compareFlagsRegressions():
+    baseline = {'get_points': result(100, 50), 'modify_point': result(100, 50), 'get_nearest': result(100, 50)}
+    results = {'get_points': result(120, 45), 'modify_point': result(130, 30, errors=2),
+               'search_points': result(1000, 1)}
+    regressions = bench_load.compare(results, baseline, tolerance=0.25)
+    assert len(regressions) == 3
+    assert all(regression.startswith('modify_point') for regression in regressions)
+
+
+def test_stubNearestMatchesFullScan():
+    store = stub_es.Store()
+    data.seed(store, 'points', 3000)
+    rnd = random.Random(1)
+    for _ in range(20):
+        location = bench_load.random_location(rnd)
+        body = {'query': {'bool': {'filter': [{'term': {'type': 'hospital'}},
+                                              {'geo_distance': {'distance': '1000km', 'location': location}}]}},
+                'size': 3, 'sort': [{'_geo_distance': {'location': location, 'order': 'asc', 'unit': 'km'}}]}
+        # A second sort key takes the full scan path.
+        full_scan = dict(body, sort=body['sort'] + [{'_id': 'asc'}])
+        assert [hit['_id'] for hit in store.search('points', body)['hits']['hits']] == \
+            [hit['_id'] for hit in store.search('points', full_scan)['hits']['hits']]
@@ -0,0 +1,110 @@
+import base64
+import json
+import time
+from unittest import mock
+
+from authlib.jose import JsonWebKey
+import pytest
+
+from koronawirus_backend.cache import LocalCache
+from koronawirus_backend.identity import IdentityError, IdentityResolver, jwt, token_expiry
+
+
+def make_token(payload):
+    encoded = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+    return 'header.' + encoded + '.signature'
+
+
+def test_localCacheEvictsLeastRecentlyUsed():
+    cache = LocalCache(maxsize=2)
+    cache.set('a', 1, ttl=60)
+    cache.set('b', 2, ttl=60)
+    cache.get('a')
+    cache.set('c', 3, ttl=60)
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+
+
+def test_localCacheSkipsExpiredEntries():
+    cache = LocalCache()
+    cache.set('a', 1, ttl=0)
+    assert cache.get('a') is None
+
+
+def test_tokenExpiry():
+    assert token_expiry(make_token({'exp': 1585000000})) == 1585000000
+    assert token_expiry('opaque-token') is None
+
+
+def test_resolverCachesUserinfo(mocker):
+    users_mock = mocker.patch('koronawirus_backend.identity.Users', autospec=True)
+    users_mock.return_value.userinfo.return_value = {
+        'sub': 'some sub', 'https://koronapoints.netlify.com/app_metadata': {'role': 'moderator'}}
+    resolver = IdentityResolver('some_domain')
+    assert resolver.resolve('opaque-token') == {'sub': 'some sub', 'role': 'moderator'}
+    assert resolver.resolve('opaque-token') == {'sub': 'some sub', 'role': 'moderator'}
+    assert users_mock.return_value.userinfo.call_count == 1
+    assert resolver.stats() == {'hit': 1, 'miss': 1, 'refresh': 1}
+
+
+class Tenant:
+    """Signs tokens and serves the key set the way an Auth0 tenant does."""
+    def __init__(self):
+        self.keys = [JsonWebKey.generate_key('RSA', 2048, {'kid': 'k1'}, is_private=True)]
+
+    def rotate(self):
+        self.keys.append(JsonWebKey.generate_key('RSA', 2048, {'kid': 'k2'}, is_private=True))
+
+    def jwks(self, *args, **kwargs):
+        response = mock.MagicMock()
+        response.json.return_value = {'keys': [key.as_dict(is_private=False) for key in self.keys]}
+        return response
+
+    def token(self, expires_in=3600):
+        key = self.keys[-1]
+        claims = {'iss': 'https://some_domain/', 'sub': 'alice', 'exp': int(time.time()) + expires_in,
+                  'https://koronapoints.netlify.com/app_metadata': {'role': 'moderator'}}
+        return jwt.encode({'alg': 'RS256', 'kid': key.kid}, claims, key).decode()
+
+
+@pytest.fixture
+def tenant(mocker):
+    tenant = Tenant()
+    tenant.get = mocker.patch('koronawirus_backend.identity.requests.get', side_effect=tenant.jwks)
+    return tenant
+
+
+def test_verifyRefetchesKeysForUnknownKid(tenant, mocker):
+    resolver = IdentityResolver('some_domain', mode='jwt')
+    resolver._key_set()
+    tenant.rotate()
+    mocker.patch('koronawirus_backend.identity.time.monotonic', return_value=time.monotonic() + 61)
+    assert resolver.resolve(tenant.token()) == {'sub': 'alice', 'role': 'moderator'}
+    assert tenant.get.call_count == 2
+
+
+def test_verifyRefetchesKeysAtMostOncePerInterval(tenant):
+    resolver = IdentityResolver('some_domain', mode='jwt')
+    resolver._key_set()
+    tenant.rotate()
+    with pytest.raises(IdentityError):
+        resolver.resolve(tenant.token())
+    assert tenant.get.call_count == 1
+
+
+def test_resolverCachesUntilTokenExpiry(tenant):
+    cache = mock.MagicMock(wraps=LocalCache())
+    resolver = IdentityResolver('some_domain', mode='jwt', cache=cache, ttl=300)
+    resolver.resolve(tenant.token(expires_in=30))
+    ttl = cache.set.call_args[0][2]
+    assert 0 < ttl <= 30
+
+
+def test_bannedUserIsRefusedDespiteCachedIdentity(tenant):
+    resolver = IdentityResolver('some_domain', mode='jwt')
+    token = tenant.token()
+    resolver.resolve(token)
+    resolver.ban('alice')
+    with pytest.raises(IdentityError):
+        resolver.resolve(token)
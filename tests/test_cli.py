@@ -0,0 +1,54 @@
+import io
+import json
+from unittest import mock
+
+from benchmarks.data import generate_points
+from benchmarks.stub_es import serve, Store
+from click.testing import CliRunner
+from koronawirus_backend.cli import bulk_load, cli, read_geojson, to_document
+
+
+def test_toDocumentAcceptsFlatRecords():
+    doc_id, body = to_document({'id': 'p1', 'name': 'Szpital', 'lat': '52.1', 'lon': '21.0', 'type': 'hospital',
+                                'last_modified_timestamp': '1585000000'})
+    assert doc_id == 'p1'
+    assert body['location'] == {'lat': '52.1', 'lon': '21.0'}
+    assert body['type'] == 'hospital'
+    assert body['last_modified_timestamp'] == '1585000000'
+
+
+def test_readGeojson():
+    collection = {"type": "FeatureCollection", "features": [
+        {"type": "Feature", "id": "p1", "properties": {"name": "Szpital"},
+         "geometry": {"type": "Point", "coordinates": [21.0, 52.1]}}]}
+    records = list(read_geojson(io.StringIO(json.dumps(collection))))
+    assert records == [{'name': 'Szpital', 'lat': 52.1, 'lon': 21.0, 'id': 'p1'}]
+
+
+def test_importExportRoundTrip(tmp_path):
+    store = Store()
+    server, url = serve(store)
+    source = tmp_path / 'points.ndjson'
+    with open(source, 'w') as points:
+        for doc_id, body in generate_points(250):
+            points.write(json.dumps(dict(body, id=doc_id)) + '\n')
+    runner = CliRunner()
+    result = runner.invoke(cli, ['--es', url, '--index', 'points', 'import', str(source), '--chunk-size', '50'])
+    assert result.exit_code == 0, result.output
+    assert len(store.indices['points']) == 250
+    assert all(source['point_id'] == doc_id for doc_id, source in store.indices['points'].items())
+    assert store.settings['points']['refresh_interval'] is None
+
+    result = runner.invoke(cli, ['--es', url, '--index', 'points', 'export', '--format', 'ndjson'])
+    assert result.exit_code == 0, result.output
+    exported = [json.loads(line) for line in result.stdout.splitlines()]
+    assert sorted(point['id'] for point in exported) == sorted(store.indices['points'])
+    server.shutdown()
+
+
+def test_bulkLoadRestoresRefreshIntervalBehindAlias():
+    es = mock.MagicMock()
+    es.indices.get_settings.return_value = {"points-v2": {"settings": {"index": {"refresh_interval": "5s"}}}}
+    with mock.patch('koronawirus_backend.cli.helpers.parallel_bulk', return_value=iter([])):
+        list(bulk_load(es, 'points', []))
+    es.indices.put_settings.assert_called_with(index='points', body={"index": {"refresh_interval": "5s"}})
@@ -0,0 +1,39 @@
+from benchmarks.data import seed
+from benchmarks.stub_es import Store
+import pytest
+
+from koronawirus_backend.points import MAX_NEAREST, points
+
+
+LOCATION = {'lat': 52.23, 'lon': 21.01}
+
+
+@pytest.fixture
+def store():
+    store = Store()
+    seed(store, 'points', 200)
+    return store
+
+
+@pytest.fixture
+def client(make_app):
+    return make_app(points).test_client()
+
+
+def test_nearestOfEveryType(client):
+    response = client.post('/get_nearest', json={'location': LOCATION, 'types': ['hospital'], 'k': 3})
+    assert response.status_code == 200
+    nearest = response.json['hospital']
+    assert len(nearest) == 3
+    assert [point['distance'] for point in nearest] == sorted(point['distance'] for point in nearest)
+
+
+def test_kIsCapped(client):
+    response = client.post('/get_nearest', json={'location': LOCATION, 'types': ['hospital'], 'k': 1000})
+    assert len(response.json['hospital']) == MAX_NEAREST
+
+
+@pytest.mark.parametrize('params', [{'k': 0}, {'k': -1}, {'k': 'abc'}, {'k': 2.5}, {'k': True},
+                                    {'types': 'hospital'}, {'types': [1]}])
+def test_invalidParamsAreRejected(client, params):
+    assert client.post('/get_nearest', json=dict({'location': LOCATION}, **params)).status_code == 400
@@ -0,0 +1,89 @@
+from benchmarks.data import POLAND, seed
+from benchmarks.stub_es import serve, Store
+from elasticsearch import Elasticsearch as ES
+import pytest
+
+from koronawirus_backend.elastic import Elasticsearch, MARKER_FIELDS, sampled, SAMPLE_SEED
+from koronawirus_backend.points import MAX_ZOOM, points
+
+
+class RecordingStore(Store):
+    def __init__(self):
+        super().__init__()
+        self.bodies = []
+
+    def search(self, index, body, scroll=False):
+        self.bodies.append(body)
+        return super().search(index, body, scroll)
+
+
+@pytest.fixture(scope='module')
+def store():
+    store = RecordingStore()
+    seed(store, 'points', 500)
+    return store
+
+
+@pytest.fixture(scope='module')
+def es(store):
+    server, url = serve(store)
+    yield Elasticsearch(es=ES([url]), index='points')
+    server.shutdown()
+
+
+def get_points(es, **kwargs):
+    return es.get_points(POLAND['top_right'], POLAND['bottom_left'], **kwargs)
+
+
+def test_markerProjection(es):
+    result = get_points(es, projection='marker')
+    assert len(result['points']) == result['total'] == 500
+    assert not result['truncated']
+    assert all(set(point) == set(MARKER_FIELDS) | {'id'} for point in result['points'])
+
+
+def test_columnsMatchMarkers(es):
+    markers = get_points(es, projection='marker', size=100)['points']
+    columns = get_points(es, columns=True, size=100)['columns']
+    assert columns['ids'] == [marker['id'] for marker in markers]
+    assert columns['lats'] == [float(marker['location']['lat']) for marker in markers]
+    assert columns['types'] == [marker['type'] for marker in markers]
+    assert len(columns['lons']) == len(columns['waiting_times']) == 100
+
+
+def test_budgetSamplesByPriority(es):
+    result = get_points(es, projection='marker', size=50)
+    assert result['total'] == 500 and result['truncated']
+    assert sum(point['type'] == 'hospital' for point in result['points']) > 40
+    # The sample is seeded, panning the map doesn't reshuffle the markers.
+    assert get_points(es, projection='marker', size=50)['points'] == result['points']
+
+
+def test_fewPointsAreReturnedWithoutAggregating(es, store):
+    del store.bodies[:]
+    result = get_points(es, zoom=6, cluster_threshold=500, projection='marker')
+    assert len(result['points']) == result['total'] == 500
+    assert len(store.bodies) == 1 and 'aggs' not in store.bodies[0]
+
+
+def test_manyPointsAreClustered(es, store):
+    del store.bodies[:]
+    result = get_points(es, zoom=6, cluster_threshold=100)
+    assert result['total'] == 500 and 'points' not in result
+    assert sum(cluster['count'] for cluster in result['clusters']) == 500
+    assert all(sum(cluster['types'].values()) == cluster['count'] for cluster in result['clusters'])
+    assert all(cluster['key'].startswith('8/') for cluster in result['clusters'])
+    # The hits of the first request are capped at the threshold, the aggregation fetches none.
+    assert [body['size'] for body in store.bodies] == [100, 0]
+
+
+def test_sampleIsSeededOnStableId():
+    # _seq_no changes with every write and repeats across shards.
+    assert sampled({})['function_score']['functions'][0] == {'random_score': {'seed': SAMPLE_SEED,
+                                                                              'field': 'point_id'}}
+
+
+@pytest.mark.parametrize('zoom', [-1, MAX_ZOOM + 1, 2.5, '6', True])
+def test_invalidZoomIsRejected(make_app, zoom):
+    client = make_app(points, POINTS_BUDGET=100).test_client()
+    assert client.post('/get_points', json=dict(POLAND, zoom=zoom)).status_code == 400
@@ -0,0 +1,143 @@
+import hashlib
+import io
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from unittest import mock
+
+from flask import Flask
+import pytest
+
+from koronawirus_backend.cache import LocalCache
+from koronawirus_backend.image import images, store_image
+from koronawirus_backend.image_pipeline import ImagePipeline
+
+
+CONTENT = b'\x89PNG fake image' * 1000
+
+
+class Processor:
+    """Records the jobs it is given, holding each one until `release` is set."""
+    def __init__(self):
+        self.jobs = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, point_id, spool_path, original_filename, mimetype, user_sub, digest):
+        self.release.wait(5)
+        with open(spool_path, 'rb') as spool:
+            self.jobs.append((point_id, spool.read(), original_filename, mimetype, user_sub, digest))
+        return {'id': point_id}
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def wait_for(pipeline, job_id, status='done'):
+    deadline = time.monotonic() + 5
+    while (pipeline.status(job_id) or {}).get('status') != status and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return pipeline.status(job_id)
+
+
+@pytest.fixture
+def processor():
+    return Processor()
+
+
+@pytest.fixture
+def pipeline(processor, tmp_path):
+    return ImagePipeline(Flask(__name__), processor, str(tmp_path), workers=1, max_pending=1, jobs=LocalCache())
+
+
+@pytest.fixture
+def client(make_app, pipeline):
+    app = make_app(images, ALLOWED_EXTENSIONS={'png', 'jpg'})
+    app.extensions['image_pipeline'] = pipeline
+    return app.test_client()
+
+
+def upload(client, user='alice'):
+    return client.post('/add_image/p1', data={'file': (io.BytesIO(CONTENT), 'image.png', 'image/png')},
+                       headers={'Authorization': 'Bearer ' + user})
+
+
+def test_spooledUploadIsProcessed(pipeline, processor, tmp_path):
+    job_id = pipeline.submit('p1', io.BytesIO(CONTENT), 'image.png', 'image/png', 'alice')
+    assert wait_for(pipeline, job_id) == {'status': 'done', 'point_id': 'p1', 'user_sub': 'alice',
+                                          'result': {'id': 'p1'}}
+    assert processor.jobs == [('p1', CONTENT, 'image.png', 'image/png', 'alice', hashlib.sha256(CONTENT).hexdigest())]
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_imageStatusIsOnlyShownToTheUploader(client, pipeline):
+    response = upload(client)
+    assert response.status_code == 202
+    job_id = response.json['job_id']
+    wait_for(pipeline, job_id)
+    status = client.get('/image_status/' + job_id, headers={'Authorization': 'Bearer alice'})
+    assert status.json == {'status': 'done', 'point_id': 'p1', 'result': {'id': 'p1'}}
+    assert client.get('/image_status/' + job_id, headers={'Authorization': 'Bearer bob'}).status_code == 404
+
+
+def test_fullPipelineAnswers503(client, pipeline, processor):
+    processor.release.clear()
+    first = upload(client)
+    assert first.status_code == 202
+    assert upload(client).status_code == 503
+    processor.release.set()
+    assert wait_for(pipeline, first.json['job_id'])['status'] == 'done'
+
+
+def test_jobOfADeadWorkerIsRequeued(pipeline, processor, tmp_path):
+    (tmp_path / 'job1').write_bytes(CONTENT)
+    (tmp_path / 'job1.{}.json'.format(dead_pid())).write_text(json.dumps(
+        {'job_id': 'job1', 'point_id': 'p1', 'original_filename': 'image.png', 'mimetype': 'image/png',
+         'user_sub': 'alice', 'digest': 'abc'}))
+    pipeline._ensure_executor()
+    assert wait_for(pipeline, 'job1')['status'] == 'done'
+    assert processor.jobs == [('p1', CONTENT, 'image.png', 'image/png', 'alice', 'abc')]
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_jobOfALiveWorkerIsLeftAlone(pipeline, processor, tmp_path):
+    job = tmp_path / 'job1.{}.json'.format(os.getppid())
+    job.write_text('{}')
+    pipeline._ensure_executor()
+    assert job.exists() and pipeline.status('job1') is None
+
+
+def test_staleSpoolFileIsRemoved(pipeline, tmp_path):
+    stale, fresh = tmp_path / 'stale', tmp_path / 'fresh'
+    stale.write_bytes(CONTENT)
+    fresh.write_bytes(CONTENT)
+    old = time.time() - pipeline.job_ttl - 1
+    os.utime(str(stale), (old, old))
+    pipeline._ensure_executor()
+    assert os.listdir(str(tmp_path)) == ['fresh']
+
+
+def test_rawBodyUploadGoesThroughThePipeline(client, pipeline, processor):
+    response = client.post('/add_image/p1?filename=photo.png', data=CONTENT, content_type='image/png',
+                           headers={'Authorization': 'Bearer alice'})
+    assert response.status_code == 202
+    assert wait_for(pipeline, response.json['job_id'])['status'] == 'done'
+    assert processor.jobs[0][1:4] == (CONTENT, 'photo.png', 'image/png')
+
+
+def test_duplicateUploadOnlyChecksTheStore(make_app):
+    app = make_app()
+    storage = app.extensions['storage'] = mock.MagicMock()
+    storage.exists.return_value = True
+    app.extensions['image_queue'] = mock.MagicMock()
+    with app.test_request_context():
+        store_image('p1', io.BytesIO(CONTENT), 'image.png', 'image/png', 'alice')
+    storage.create_directory.assert_not_called()
+    storage.store.assert_not_called()
+    app.extensions['image_queue'].publish.assert_not_called()
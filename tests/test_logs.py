@@ -0,0 +1,71 @@
+from datetime import datetime
+from unittest import mock
+
+from benchmarks.stub_es import serve, Store
+from elasticsearch import Elasticsearch as ES
+import pytest
+
+from koronawirus_backend.elastic import Elasticsearch
+
+
+@pytest.fixture(scope='module')
+def es():
+    store = Store()
+    for month in (1, 2, 3):
+        for day in range(1, 11):
+            store.index('points_{:02d}_2020'.format(month), '{}-{}'.format(month, day), {
+                "doc_id": 'point-{}'.format(day % 2), "modified_by": "user", "changes": {}, "name": "Punkt",
+                "timestamp": "2020/{:02d}/{:02d} 12:00:00".format(month, day), "log_id": '{}-{}'.format(month, day)})
+    # Changes made within the same second.
+    for i in range(6):
+        store.index('points_04_2020', 'tie-{}'.format(i), {
+            "doc_id": 'point-2', "modified_by": "user", "changes": {}, "name": "Punkt",
+            "timestamp": "2020/04/01 12:00:00", "log_id": 'tie-{}'.format(i)})
+    server, url = serve(store)
+    yield Elasticsearch(es=ES([url]), index='points')
+    server.shutdown()
+
+
+def test_logIndicesCoverMonthsInRange(es):
+    assert es.log_indices() == 'points_*'
+    assert es.log_indices(datetime(2019, 11, 20), datetime(2020, 2, 1)) == \
+        'points_11_2019,points_12_2019,points_01_2020,points_02_2020'
+
+
+def test_getLogsWithinRange(es):
+    logs = es.get_logs(start=datetime(2020, 2, 5), end=datetime(2020, 3, 3, 23, 59), size=100)
+    timestamps = [log['_source']['timestamp'] for log in logs['logs']]
+    assert timestamps == sorted(timestamps, reverse=True)
+    assert timestamps[0] == '2020/03/03 12:00:00' and timestamps[-1] == '2020/02/05 12:00:00'
+    assert logs['total'] == 9
+    assert logs['next'] is None
+
+
+def test_getLogsPagesWithCursor(es):
+    seen, cursor = [], None
+    while True:
+        page = es.get_logs(point_id='point-1', size=4, cursor=cursor, track_total=False)
+        assert page['total'] is None
+        seen.extend(log['_id'] for log in page['logs'])
+        cursor = page['next']
+        if cursor is None:
+            break
+    assert len(seen) == len(set(seen)) == 15
+
+
+def test_getLogsPagesThroughEntriesOfTheSameSecond(es):
+    seen, cursor = [], None
+    while True:
+        page = es.get_logs(point_id='point-2', size=4, cursor=cursor, track_total=False)
+        seen.extend(log['_id'] for log in page['logs'])
+        cursor = page['next']
+        if cursor is None:
+            break
+    assert seen == ['tie-{}'.format(i) for i in range(5, -1, -1)]
+
+
+def test_reversedRangeSearchesNothing():
+    client = mock.MagicMock()
+    es = Elasticsearch(es=client, index='points')
+    assert es.get_logs(start=datetime(2021, 5, 1), end=datetime(2021, 3, 1)) == {'logs': [], 'total': 0, 'next': None}
+    client.search.assert_not_called()
@@ -0,0 +1,86 @@
+from unittest import mock
+
+from elasticsearch.exceptions import NotFoundError
+import pytest
+
+from koronawirus_backend import mappings
+
+
+def make_es(aliased=(), existing=()):
+    es = mock.MagicMock()
+    if aliased:
+        es.indices.get_alias.return_value = {name: {"aliases": {"points": {}}} for name in aliased}
+    else:
+        es.indices.get_alias.side_effect = NotFoundError(404, 'alias_missing')
+    es.indices.get.return_value = {name: {} for name in existing}
+    es.indices.exists.return_value = 'points' in existing
+    es.indices.get_template.return_value = {
+        'points-points': {"settings": {"index": {"refresh_interval": "5s", "number_of_replicas": "2"}}}}
+    es.reindex.return_value = {"total": 3, "created": 3, "updated": 0, "failures": []}
+    es.count.return_value = {"count": 3}
+    return es
+
+
+def test_templatesMatchIndexNames():
+    assert mappings.points_template('points')['index_patterns'] == ['points-v*']
+    assert mappings.logs_template('points')['index_patterns'] == ['points_*']
+    assert mappings.index_version('points', 'points-v12') == 12
+    assert mappings.index_version('points', 'points_03_2020') is None
+
+
+def test_reindexSwapsAliasToNextVersion():
+    es = make_es(aliased=['points-v1', 'points-v2'], existing=['points-v1', 'points-v2'])
+    assert mappings.reindex(es, 'points') == 'points-v3'
+    es.indices.update_aliases.assert_called_once_with(body={"actions": [
+        {"add": {"index": "points-v3", "alias": "points"}},
+        {"remove": {"index": "points-v1", "alias": "points"}},
+        {"remove": {"index": "points-v2", "alias": "points"}}]})
+    es.indices.put_settings.assert_any_call(index='points-v3', body={"index": {
+        "refresh_interval": "5s", "number_of_replicas": "2"}})
+
+
+def test_reindexMigratesConcreteIndex():
+    es = make_es(existing=['points'])
+    assert mappings.reindex(es, 'points') == 'points-v1'
+    es.indices.update_aliases.assert_called_once_with(body={"actions": [
+        {"add": {"index": "points-v1", "alias": "points"}},
+        {"remove_index": {"index": "points"}}]})
+
+
+def test_reindexUnblocksWritesOnFailure():
+    es = make_es(aliased=['points-v1'], existing=['points-v1'])
+    es.indices.update_aliases.side_effect = Exception("boom")
+    try:
+        mappings.reindex(es, 'points')
+    except Exception:
+        pass
+    es.indices.put_settings.assert_called_with(index=['points-v1'], body={"index": {"blocks": {"write": False}}})
+
+
+def test_reindexFailuresKeepTheOldIndex():
+    es = make_es(aliased=['points-v1'], existing=['points-v1'])
+    es.reindex.side_effect = [{"total": 3, "created": 3, "updated": 0, "failures": []},
+                              {"total": 1, "created": 0, "updated": 0, "failures": [{"id": "p1"}]}]
+    with pytest.raises(mappings.ReindexError):
+        mappings.reindex(es, 'points')
+    es.indices.update_aliases.assert_not_called()
+    es.indices.put_settings.assert_called_with(index=['points-v1'], body={"index": {"blocks": {"write": False}}})
+
+
+def test_reindexMissingDocumentsKeepTheOldIndex():
+    es = make_es(aliased=['points-v1'], existing=['points-v1'])
+    es.count.side_effect = [{"count": 3}, {"count": 2}]
+    with pytest.raises(mappings.ReindexError):
+        mappings.reindex(es, 'points')
+    es.indices.update_aliases.assert_not_called()
+    es.indices.put_settings.assert_called_with(index=['points-v1'], body={"index": {"blocks": {"write": False}}})
+
+
+def test_addIdFieldBackfillsOnlyMissingIds():
+    es = mock.MagicMock()
+    mappings.add_id_field(es, 'points', 'point_id', mappings.POINT_PROPERTIES)
+    es.indices.put_mapping.assert_called_once_with(index='points', body={"properties": {
+        "point_id": {"type": "keyword"}}})
+    body = es.update_by_query.call_args[1]['body']
+    assert body['query'] == {"bool": {"must_not": {"exists": {"field": "point_id"}}}}
+    assert body['script']['params'] == {"field": "point_id"}
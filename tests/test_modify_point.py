@@ -0,0 +1,84 @@
+from benchmarks.stub_es import Store
+from elasticsearch import Elasticsearch as ES
+from elasticsearch.exceptions import ConflictError
+import pytest
+
+from koronawirus_backend.elastic import Elasticsearch, NotDefined, NotOwnerError
+from koronawirus_backend.points import points
+
+
+class ConcurrentStore(Store):
+    """Has another client modify the point right before each of the first `conflicts` conditional updates."""
+    conflicts = 0
+
+    def update(self, index, doc_id, body, if_seq_no=None):
+        if if_seq_no is not None and self.conflicts:
+            self.conflicts -= 1
+            super().update(index, doc_id, {'doc': {'phone': '+48 22 {}'.format(self.conflicts)}})
+        return super().update(index, doc_id, body, if_seq_no)
+
+
+class HandedOverStore(Store):
+    """Has the point handed over to another user right before the first conditional update."""
+    def update(self, index, doc_id, body, if_seq_no=None):
+        if if_seq_no is not None and self.indices[index][doc_id]['owned_by'] == 'alice':
+            super().update(index, doc_id, {'doc': {'owned_by': 'bob'}})
+        return super().update(index, doc_id, body, if_seq_no)
+
+
+class NoopStore(Store):
+    def update(self, index, doc_id, body, if_seq_no=None):
+        return {"_index": index, "_id": doc_id, "result": "noop", "_seq_no": self.seq_nos[(index, doc_id)],
+                "_primary_term": 1, "get": {"found": True, "_source": self.indices[index][doc_id]}}
+
+
+def modify(es, retries=3, owner=None, **changes):
+    fields = dict.fromkeys(['name', 'operator', 'address', 'lat', 'lon', 'point_type', 'opening_hours', 'phone',
+                            'prepare_instruction', 'waiting_time', 'owned_by'], NotDefined())
+    fields.update(changes)
+    return es.modify_point(point_id='p1', user_sub='alice', retries=retries, owner=owner, **fields)
+
+
+@pytest.fixture
+def es(connection_string):
+    return Elasticsearch(es=ES([connection_string]), index='points')
+
+
+@pytest.mark.parametrize('store', [ConcurrentStore], indirect=True)
+def test_conflictIsRetriedOnFreshDocument(store, es):
+    store.conflicts = 2
+    point = modify(es, waiting_time='long')
+    assert point['waiting_time'] == 'long'
+    # The concurrent change survives, it wasn't overwritten with the stale read.
+    assert point['phone'] == '+48 22 0'
+    assert store.conflicts == 0
+
+
+@pytest.mark.parametrize('store', [ConcurrentStore], indirect=True)
+def test_exhaustedRetriesRaiseConflict(store, es):
+    store.conflicts = 10
+    with pytest.raises(ConflictError):
+        modify(es, retries=2, waiting_time='long')
+    assert store.conflicts == 7
+    assert store.indices['points']['p1']['waiting_time'] == 'short'
+
+
+@pytest.mark.parametrize('store', [HandedOverStore], indirect=True)
+def test_retryOfAPointHandedOverIsForbidden(store, es):
+    with pytest.raises(NotOwnerError):
+        modify(es, owner='alice', waiting_time='long')
+    assert store.indices['points']['p1']['waiting_time'] == 'short'
+
+
+@pytest.mark.parametrize('store', [HandedOverStore], indirect=True)
+def test_editOfAPointHandedOverIsForbidden(store, make_app):
+    response = make_app(points).test_client().post('/modify_point', json={'id': 'p1', 'waiting_time': 'long'},
+                                                   headers={'Authorization': 'Bearer alice'})
+    assert response.status_code == 403
+    assert store.indices['points']['p1']['waiting_time'] == 'short'
+
+
+@pytest.mark.parametrize('store', [NoopStore], indirect=True)
+def test_noopReturnsThePoint(es, point):
+    modified = modify(es, waiting_time='short')
+    assert modified == dict(point, id='p1')
@@ -0,0 +1,60 @@
+from benchmarks.data import generate_points, seed
+from benchmarks.stub_es import serve, Store
+from elasticsearch import Elasticsearch as ES
+import pytest
+
+from koronawirus_backend.elastic import decode_cursor, Elasticsearch
+
+
+class RecordingStore(Store):
+    def __init__(self):
+        super().__init__()
+        self.sorts = []
+
+    def search(self, index, body, scroll=False):
+        self.sorts.append(body.get('sort'))
+        return super().search(index, body, scroll)
+
+
+@pytest.fixture(scope='module')
+def store():
+    store = RecordingStore()
+    seed(store, 'points', 120)
+    return store
+
+
+@pytest.fixture(scope='module')
+def es(store):
+    server, url = serve(store)
+    yield Elasticsearch(es=ES([url]), index='points')
+    server.shutdown()
+
+
+def test_searchPointsPagesThroughEveryHit(es):
+    seen, cursor = [], None
+    while True:
+        page = es.search_points('punkt', size=25, cursor=cursor)
+        seen.extend(point['id'] for point in page['points'])
+        cursor = page['next']
+        if cursor is None:
+            break
+    assert len(seen) == len(set(seen)) == 120
+
+
+def test_getMyPointsProjectsFields(es):
+    owner = next(generate_points(1))[1]['owned_by']
+    page = es.get_my_points(owner, size=100, fields=['name', 'location'])
+    assert page['points']
+    assert all(set(point) == {'id', 'name', 'location'} for point in page['points'])
+    assert page['next'] is None
+
+
+def test_tiesAreBrokenOnPointIdCopy(es, store):
+    es.search_points('punkt', size=5)
+    es.get_my_points('user-1', size=5)
+    assert [sort[-1] for sort in store.sorts[-2:]] == [{'point_id': 'asc'}] * 2
+
+
+def test_decodeCursorRejectsGarbage():
+    with pytest.raises(ValueError):
+        decode_cursor('not a cursor')
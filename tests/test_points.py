@@ -5,7 +5,7 @@ import pytest
 
 @pytest.fixture
 def elastic_mock(mocker):
-    return mocker.patch('koronawirus_backend.points.Elasticsearch', autospec=True)
+    return mocker.patch('koronawirus_backend.points.get_elastic', autospec=True)
 
 
 def test_get_get_point(client, elastic_mock):
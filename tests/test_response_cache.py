@@ -0,0 +1,47 @@
+from flask import Flask, request
+import pytest
+
+from koronawirus_backend.cache import LocalCache
+from koronawirus_backend.response_cache import cached, invalidates_cache, ResponseCache
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.extensions['response_cache'] = ResponseCache(LocalCache(), ttl=60)
+    app.calls = 0
+
+    @app.route('/read', methods=['POST'])
+    @cached('read')
+    def read():
+        app.calls += 1
+        return {'calls': app.calls, 'params': request.json}
+
+    @app.route('/write', methods=['POST'])
+    @invalidates_cache
+    def write():
+        return {'status': 'ok'}
+
+    client = app.test_client()
+    client.application = app
+    return client
+
+
+def test_repeatedReadIsServedFromCache(client):
+    first = client.post('/read', json={'id': 'p1'}).json
+    assert client.post('/read', json={'id': 'p1'}).json == first
+    assert client.application.calls == 1
+    assert client.application.extensions['response_cache'].hit_rate('read') == 0.5
+
+
+def test_keyIgnoresParameterOrder():
+    cache = ResponseCache(LocalCache())
+    assert cache.key('read', {'a': 1, 'b': {'c': 2, 'd': 3}}) == cache.key('read', {'b': {'d': 3, 'c': 2}, 'a': 1})
+    assert cache.key('read', {'a': 1}) != cache.key('read', {'a': 2})
+    assert cache.key('read', {'a': 1}) != cache.key('other', {'a': 1})
+
+
+def test_writeInvalidates(client):
+    client.post('/read', json={'id': 'p1'})
+    client.post('/write', json={'id': 'p1'})
+    assert client.post('/read', json={'id': 'p1'}).json['calls'] == 2
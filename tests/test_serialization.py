@@ -0,0 +1,32 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from elasticsearch.exceptions import SerializationError
+from elasticsearch.serializer import JSONSerializer
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+import pytest
+
+from koronawirus_backend.serialization import ElasticsearchSerializer, JSONProvider
+
+
+PAYLOAD = {'points': [{'name': 'Szpital Wojewódzki', 'location': {'lat': '52.1', 'lon': '21.0'}, 'id': 'p1'}],
+           'clusters': {1: 2}, 'when': datetime(2020, 3, 25, 12, 0), 'price': Decimal('1.5')}
+
+
+def test_providerMatchesFlaskOutput():
+    app = Flask(__name__)
+    with app.app_context():
+        expected = DefaultJSONProvider(app).response(PAYLOAD)
+        response = JSONProvider(app).response(PAYLOAD)
+    assert response.mimetype == 'application/json'
+    assert json.loads(response.get_data()) == json.loads(expected.get_data())
+
+
+def test_elasticsearchSerializerMatchesDefault():
+    body = {'query': {'term': {'owned_by': 'żółw'}}, 'when': datetime(2020, 3, 25), 'size': 10}
+    assert json.loads(ElasticsearchSerializer().dumps(body)) == json.loads(JSONSerializer().dumps(body))
+    assert ElasticsearchSerializer().loads('{"hits": {"hits": []}}') == {'hits': {'hits': []}}
+    with pytest.raises(SerializationError):
+        ElasticsearchSerializer().loads('{not json')
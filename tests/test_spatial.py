@@ -0,0 +1,26 @@
+import random
+
+import pytest
+from koronawirus_backend.spatial import chord_to_km, KDTree, km_to_chord, to_xyz
+
+
+def test_chordDistance():
+    warsaw, krakow = to_xyz(52.2297, 21.0122), to_xyz(50.0647, 19.9450)
+    chord = sum((a - b) ** 2 for a, b in zip(warsaw, krakow)) ** 0.5
+    assert chord_to_km(chord) == pytest.approx(252, abs=1)
+    assert chord_to_km(km_to_chord(1000)) == pytest.approx(1000)
+
+
+def test_kdTreeMatchesBruteForce():
+    rnd = random.Random(0)
+    items = [(to_xyz(rnd.uniform(49, 55), rnd.uniform(14, 24)), i) for i in range(500)]
+    tree = KDTree(items)
+    for _ in range(20):
+        xyz = to_xyz(rnd.uniform(49, 55), rnd.uniform(14, 24))
+        expected = sorted(items, key=lambda item: sum((a - b) ** 2 for a, b in zip(item[0], xyz)))[:5]
+        assert [payload for _, payload in tree.nearest(xyz, k=5)] == [payload for _, payload in expected]
+
+
+def test_kdTreeRespectsMaxDistance():
+    tree = KDTree([(to_xyz(52.23, 21.01), 'warsaw')])
+    assert tree.nearest(to_xyz(50.06, 19.94), max_chord=km_to_chord(100)) == []
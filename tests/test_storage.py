@@ -0,0 +1,88 @@
+import hashlib
+import io
+import os
+
+from botocore.exceptions import ClientError
+import pytest
+
+from koronawirus_backend.storage import content_file_name, hash_file, HashingReader, KnownObjects, Storage
+
+
+CONTENT = b'\x89PNG fake image' * 1000
+DIGEST = hashlib.sha256(CONTENT).hexdigest()
+
+
+class NonSeekable:
+    def __init__(self, data):
+        self.stream = io.BytesIO(data)
+
+    def read(self, size=-1):
+        return self.stream.read(size)
+
+    def seekable(self):
+        return False
+
+
+class HeadOnlyClient:
+    def __init__(self, keys):
+        self.keys = keys
+        self.heads = 0
+
+    def head_object(self, Bucket, Key):
+        self.heads += 1
+        if Key not in self.keys:
+            raise ClientError({'Error': {'Code': '404'}}, 'HeadObject')
+        return {}
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = Storage('file://' + str(tmp_path), known=KnownObjects(str(tmp_path / 'known')))
+    storage.create_directory('p1')
+    return storage
+
+
+def test_hashingReaderHashesWhatIsRead():
+    reader = HashingReader(io.BytesIO(CONTENT))
+    assert reader.read() == CONTENT
+    assert reader.hexdigest() == DIGEST and reader.size == len(CONTENT)
+    assert not hasattr(reader, 'seek')
+
+
+def test_hashFileRewinds():
+    file_object = io.BytesIO(CONTENT)
+    assert hash_file(file_object) == DIGEST
+    assert file_object.tell() == 0
+
+
+def test_storeStreamNamesByContent(storage, tmp_path):
+    filename, is_new = storage.store_stream(NonSeekable(CONTENT), 'p1', 'PNG', 'image/png')
+    assert (filename, is_new) == (content_file_name(DIGEST, 'png'), True)
+    # The staging upload was moved, not copied.
+    assert os.listdir(str(tmp_path / 'p1')) == [filename]
+    assert (tmp_path / 'p1' / filename).read_bytes() == CONTENT
+
+
+def test_storeStreamDropsDuplicates(storage, tmp_path):
+    filename, _ = storage.store_stream(NonSeekable(CONTENT), 'p1', 'png', 'image/png')
+    assert storage.store_stream(NonSeekable(CONTENT), 'p1', 'png', 'image/png') == (filename, False)
+    assert os.listdir(str(tmp_path / 'p1')) == [filename]
+
+
+def test_existsChecksTheStoreWhenNotKnown(storage, tmp_path):
+    filename, _ = storage.store_stream(NonSeekable(CONTENT), 'p1', 'png', 'image/png')
+    # A process on another host starts with nothing known.
+    fresh = Storage('file://' + str(tmp_path))
+    assert fresh.exists(os.path.join('p1', filename))
+    assert os.path.join('p1', filename) in fresh.known
+    assert not fresh.exists(os.path.join('p1', 'missing.png'))
+
+
+def test_existsFallsBackToHeadObject():
+    storage = Storage('s3://bucket')
+    client = HeadOnlyClient({'p1/a.png'})
+    storage.client = lambda: client
+    assert storage.exists('p1/a.png')
+    assert storage.exists('p1/a.png')
+    assert client.heads == 1
+    assert not storage.exists('p1/b.png')
@@ -0,0 +1,50 @@
+import random
+from datetime import datetime
+
+import pytest
+
+from benchmarks.data import seed
+from benchmarks.stub_es import serve, Store
+from elasticsearch import Elasticsearch as ES
+from koronawirus_backend.elastic import Elasticsearch
+from koronawirus_backend.tiles import tile_bounds, tile_version
+
+
+def test_tileBoundsWholeWorld():
+    top_left, bottom_right = tile_bounds(0, 0, 0)
+    assert top_left['lon'] == -180.0
+    assert bottom_right['lon'] == 180.0
+    assert top_left['lat'] == pytest.approx(85.0511287798066)
+    assert bottom_right['lat'] == pytest.approx(-85.0511287798066)
+
+
+def test_tileVersionChangesWhenPointRemoved():
+    points = [{'last_modified_timestamp': '1585000000'}, {'last_modified_timestamp': '1584000000'}]
+    etag, last_modified = tile_version(points)
+    assert last_modified == datetime(2020, 3, 23, 21, 46, 40)
+    assert tile_version(points[:1])[0] != etag
+
+
+class ShuffledStore(Store):
+    """Matches documents in a different order every time, as segment merges and replicas do."""
+    def _candidates(self, index, query):
+        candidates = super()._candidates(index, query)
+        candidates = list(self.indices[index]) if candidates is None else candidates
+        random.shuffle(candidates)
+        return candidates
+
+
+def test_truncatedTileIsAStableSample():
+    store = ShuffledStore()
+    seed(store, 'points', 300)
+    server, url = serve(store)
+    try:
+        es = Elasticsearch(es=ES([url]), index='points')
+        top_left, bottom_right = tile_bounds(5, 17, 10)
+        first = es.get_tile_points(top_left, bottom_right, size=20)
+        second = es.get_tile_points(top_left, bottom_right, size=20)
+    finally:
+        server.shutdown()
+    assert first['total'] > 20
+    assert second['points'] == first['points']
+    assert tile_version(second['points']) == tile_version(first['points'])
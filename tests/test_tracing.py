@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+from koronawirus_backend import tracing
+from koronawirus_backend.connections import get_elastic
+from koronawirus_backend.points import points
+
+
+@pytest.fixture
+def make_client(make_app):
+    def make_client(enabled=False, export_path=None):
+        app = make_app(points, TRACING_ENABLED=enabled, TRACING_EXPORT_PATH=export_path)
+        tracing.init_app(app)
+        return app.test_client()
+    return make_client
+
+
+def test_serverTimingBreakdown(make_client, tmp_path):
+    export_path = str(tmp_path / 'spans.json')
+    client = make_client(enabled=True, export_path=export_path)
+    response = client.post('/modify_point', json={'id': 'p1', 'waiting_time': 'long'},
+                           headers={'Authorization': 'Bearer alice'})
+    assert response.status_code == 200
+    names = [entry.split(';')[0] for entry in response.headers['Server-Timing'].split(', ')]
+    assert names[:3] == ['auth0.userinfo', 'auth', 'es.get']
+    assert 'es.update' in names
+    assert names[-1] == 'total'
+
+    with open(export_path) as export:
+        spans = json.loads(export.readline())['resourceSpans'][0]['scopeSpans'][0]['spans']
+    by_name = {span['name']: span for span in spans}
+    root = by_name['POST /modify_point']
+    assert 'parentSpanId' not in root
+    assert by_name['auth']['parentSpanId'] == root['spanId']
+    assert by_name['auth0.userinfo']['parentSpanId'] == by_name['auth']['spanId']
+    assert {span['traceId'] for span in spans} == {root['traceId']}
+    assert {'key': 'http.status_code', 'value': {'stringValue': '200'}} in root['attributes']
+
+
+def test_disabledTracingAddsNothing(make_client):
+    client = make_client()
+    response = client.post('/get_point', json={'id': 'p1'})
+    assert response.status_code == 200
+    assert 'Server-Timing' not in response.headers
+    with client.application.test_request_context('/get_point', method='POST'):
+        client.application.preprocess_request()
+        assert tracing.span('es.get') is tracing.NULL_SPAN
+        assert not isinstance(get_elastic().es, tracing.TracedClient)